@@ -0,0 +1,354 @@
+# the asyncio counterparts of the query processors, whose methods can be awaited without blocking the event loop
+# AsyncGenericQueryProcessor, AsyncRelationalQueryProcessor, AsyncTriplestoreQueryProcessor
+
+import asyncio
+import threading
+import weakref
+from functools import wraps
+from typing import List
+
+import pandas as pd
+
+from generic import ANNOTATION_COLUMNS, CANVAS_COLUMNS, ENTITY_COLUMNS, ENTITY_TYPE_COLUMNS, METADATA_COLUMNS, GenericQueryProcessor
+from instrumentation import traced
+from model import EntityWithMetadata
+from rdf import TriplestoreQueryProcessor
+from relational import RelationalQueryProcessor
+
+
+all = [
+    "AsyncGenericQueryProcessor",
+    "AsyncQueryProcessor",
+    "AsyncRelationalQueryProcessor",
+    "AsyncTriplestoreQueryProcessor",
+]
+
+
+def awaitable(method):
+    """it returns a coroutine function running the input method of a query processor in a thread
+    (see AsyncQueryProcessor.run)."""
+    @wraps(method)
+    async def query(self, *args):
+        return await self.run(method, *args)
+    return query
+
+
+class AsyncQueryProcessor():
+    """
+        The base class of the asynchronous query processors. Their get methods are coroutines, which run
+        the corresponding method of the synchronous query processor in a thread, so that the event loop is free
+        while the database answers. At most maxConcurrentQueries queries of the processor run at the same time,
+        the others waiting their turn without blocking the event loop.
+        """
+    maxConcurrentQueries = 8
+    semaphores = None
+
+    def setMaxConcurrentQueries(self, max_queries: int) -> bool:
+        """it sets how many queries of the processor can run at the same time."""
+        if max_queries < 1:
+            return False
+        self.maxConcurrentQueries = max_queries
+        self.semaphores = None
+        return True
+
+    def getSemaphore(self) -> asyncio.Semaphore:
+        """it returns the semaphore limiting the queries of the processor run by the current event loop."""
+        if self.semaphores is None:
+            self.semaphores = weakref.WeakKeyDictionary()
+        loop = asyncio.get_running_loop()
+        if loop not in self.semaphores:
+            self.semaphores[loop] = asyncio.Semaphore(self.maxConcurrentQueries)
+        return self.semaphores[loop]
+
+    async def run(self, method, *args):
+        """it runs the input method of the synchronous query processor in a thread, once there is
+        a free slot among the maxConcurrentQueries of the processor, and returns its result."""
+        async with self.getSemaphore():
+            return await asyncio.to_thread(method, self, *args)
+
+
+class AsyncRelationalQueryProcessor(AsyncQueryProcessor, RelationalQueryProcessor):
+    """
+        The asynchronous processor querying the relational database.
+        When one of its coroutines is cancelled, the query running in SQLite is interrupted.
+        """
+
+    async def run(self, method, *args):
+        # the connection of the thread is shared with the other queries it runs, so it is only interrupted
+        # while it is running this query
+        lock = threading.Lock()
+        state = {"connection": None, "cancelled": False}
+
+        def query(self, *args):
+            with lock:
+                if state["cancelled"]:
+                    raise asyncio.CancelledError()
+                state["connection"] = self.getConnection()
+            try:
+                return method(self, *args)
+            finally:
+                with lock:
+                    state["connection"] = None
+
+        try:
+            return await super().run(query, *args)
+        except asyncio.CancelledError:
+            # the thread would otherwise go on running the query, whose result nobody is waiting for
+            with lock:
+                state["cancelled"] = True
+                if state["connection"] is not None:
+                    state["connection"].interrupt()
+            raise
+
+    getEntityById = awaitable(RelationalQueryProcessor.getEntityById)
+    getEntitiesByIds = awaitable(RelationalQueryProcessor.getEntitiesByIds)
+    getAllAnnotations = awaitable(RelationalQueryProcessor.getAllAnnotations)
+    getAllImages = awaitable(RelationalQueryProcessor.getAllImages)
+    getAnnotationsWithBody = awaitable(RelationalQueryProcessor.getAnnotationsWithBody)
+    getAnnotationsWithTarget = awaitable(RelationalQueryProcessor.getAnnotationsWithTarget)
+    getAnnotationsWithBodyAndTarget = awaitable(RelationalQueryProcessor.getAnnotationsWithBodyAndTarget)
+    getEntitiesWithCreator = awaitable(RelationalQueryProcessor.getEntitiesWithCreator)
+    getAllCreators = awaitable(RelationalQueryProcessor.getAllCreators)
+    getEntitiesWithTitle = awaitable(RelationalQueryProcessor.getEntitiesWithTitle)
+
+
+class AsyncTriplestoreQueryProcessor(AsyncQueryProcessor, TriplestoreQueryProcessor):
+    """
+        The asynchronous processor querying the triplestore.
+        When one of its coroutines is cancelled, the request already sent to the SPARQL endpoint
+        is completed by its thread, and its result is discarded.
+        """
+
+    getEntityById = awaitable(TriplestoreQueryProcessor.getEntityById)
+    getEntitiesByIds = awaitable(TriplestoreQueryProcessor.getEntitiesByIds)
+    getAllCanvases = awaitable(TriplestoreQueryProcessor.getAllCanvases)
+    getAllCanvasesWithManifest = awaitable(TriplestoreQueryProcessor.getAllCanvasesWithManifest)
+    getAllManifestsWithCollection = awaitable(TriplestoreQueryProcessor.getAllManifestsWithCollection)
+    getAllCollections = awaitable(TriplestoreQueryProcessor.getAllCollections)
+    getAllManifests = awaitable(TriplestoreQueryProcessor.getAllManifests)
+    getCanvasesInCollection = awaitable(TriplestoreQueryProcessor.getCanvasesInCollection)
+    getCanvasesInManifest = awaitable(TriplestoreQueryProcessor.getCanvasesInManifest)
+    getManifestsInCollection = awaitable(TriplestoreQueryProcessor.getManifestsInCollection)
+    getEntitiesWithLabel = awaitable(TriplestoreQueryProcessor.getEntitiesWithLabel)
+    getAncestors = awaitable(TriplestoreQueryProcessor.getAncestors)
+
+
+class AsyncGenericQueryProcessor(GenericQueryProcessor):
+    """
+        The asynchronous counterpart of GenericQueryProcessor: it has the same get methods, which are coroutines
+        sending their independent sub-queries to the query processors at the same time.
+        The query processors can be asynchronous (e.g. AsyncRelationalQueryProcessor) or synchronous,
+        in which case their methods are run in a thread. Cancelling a get method cancels all its sub-queries.
+        The manifests and collections always include their items, since they cannot be retrieved later
+        without blocking the event loop, and the results are not cached.
+        """
+
+    async def query(self, query_processor, method: str, *args):
+        """It runs the input sub-query, i.e. the method of the query processor called with the input arguments."""
+        function = getattr(query_processor, method)
+        if asyncio.iscoroutinefunction(function):
+            return await function(*args)
+        return await asyncio.to_thread(self.run_query, query_processor, method, *args)
+
+    async def query_first(self, method: str, columns: list, *args) -> pd.DataFrame:
+        """It runs the input sub-query on the first query processor having the input method (see run_first)."""
+        query_processor = self.find_query_processor(method)
+        if query_processor is None:
+            return pd.DataFrame(columns=columns)
+        return await self.query(query_processor, method, *args)
+
+    async def query_all(self, method: str, *args) -> List[pd.DataFrame]:
+        """It runs the input method on all the query processors having it, at the same time."""
+        return await asyncio.gather(*[
+            self.query(qp, method, *args) for qp in self.queryProcessors if method in dir(qp)])
+
+    @traced
+    async def getEntityById(self, id: str, mode: str = None):
+        return self.build_entity(await self.query_all("getEntityById", id), mode)
+
+    @traced
+    async def getAllAnnotations(self, mode: str = None):
+        """it returns a list of objects having class Annotation included in the databases accessible via the query processors."""
+        annotations = await self.query_first("getAllAnnotations", ANNOTATION_COLUMNS)
+        return self.to_result(annotations, self.build_annotations, mode)
+
+    @traced
+    async def getAllCanvas(self, mode: str = None):
+        """it returns a list of objects having class Canvas included in the databases accessible via the query processors."""
+        canvases = await self.query_first("getAllCanvases", CANVAS_COLUMNS)
+        return self.to_result(canvases, self.build_canvases, mode)
+
+    @traced
+    async def getAllImages(self, mode: str = None):
+        """it returns a list of objects having class Image included in the databases accessible via the query processors."""
+        images = await self.query_first("getAllImages", ["body"])
+        return self.to_result(images, self.build_images, mode)
+
+    @traced
+    async def getAllManifests(self, mode: str = None):
+        """it returns a list of objects having class Manifest included in the databases accessible via the query processors."""
+        triple_qp = self.find_query_processor("getAllManifests")
+        relational_qp = self.find_query_processor("getEntitiesWithTitle")
+        if triple_qp is None:
+            return self.to_result(pd.DataFrame(columns=ENTITY_COLUMNS), self.build_manifests, mode)
+        manifests = self.with_metadata(self.query(triple_qp, "getAllManifests"), relational_qp)
+        if (mode or self.resultMode) != "objects":
+            return self.to_result(await manifests, None, mode)
+        manifests, canvases = await asyncio.gather(manifests, self.query(triple_qp, "getAllCanvasesWithManifest"))
+        return self.build_manifests(manifests, self.group_items(canvases, "manifest", self.build_canvases))
+
+    @traced
+    async def getAnnotationsToCanvas(self, canvas_id: str, mode: str = None):
+        """it returns a list of objects having class Annotation, included in the databases
+        accessible via the query processors, that have, as annotation target, the canvas specified by the input identifier."""
+        return await self.getAnnotationsWithTarget(canvas_id, mode)
+
+    @traced
+    async def getAnnotationsToCollection(self, collection_id: str, mode: str = None):
+        """it returns a list of objects having class Annotation, included in the databases accessible
+        via the query processors, that have, as annotation target, the collection specified by the input identifier."""
+        return await self.getAnnotationsWithTarget(collection_id, mode)
+
+    @traced
+    async def getAnnotationsToManifest(self, manifest_id: str, mode: str = None):
+        """it returns a list of objects having class Annotation, included in the databases accessible
+        via the query processors, that have, as annotation target, the manifest specified by the input identifier."""
+        return await self.getAnnotationsWithTarget(manifest_id, mode)
+
+    @traced
+    async def getAnnotationsWithBody(self, id: str, mode: str = None):
+        """it returns a list of objects having class Annotation, included in the databases accessible
+        via the query processors, that have, as annotation body, the entity specified by the input identifier."""
+        annotations = await self.query_all("getAnnotationsWithBody", id)
+        return self.to_result(self.concat(annotations), self.build_annotations, mode)
+
+    @traced
+    async def getAnnotationsWithTarget(self, id: str, mode: str = None):
+        """it returns a list of objects having class Annotation, included in the databases accessible
+        via the query processors, that have, as annotation target, the entity specified by the input identifier."""
+        annotations = await self.query_all("getAnnotationsWithTarget", id)
+        return self.to_result(self.concat(annotations), self.build_annotations, mode)
+
+    @traced
+    async def getAnnotationsWithBodyAndTarget(self, body: str, target: str, mode: str = None):
+        """it returns a list of objects having class Annotation, included in the databases accessible
+        via the query processors, that have, as annotation body and annotation target, the entities specified by the input identifiers."""
+        annotations = await self.query_all("getAnnotationsWithBodyAndTarget", body, target)
+        return self.to_result(self.concat(annotations), self.build_annotations, mode)
+
+    @traced
+    async def getCanvasesInCollection(self, collection_id: str, mode: str = None):
+        """it returns a list of objects having class Canvas, included in the databases accessible
+        via the query processors, that are contained in the collection identified by the input identifier."""
+        canvases = await self.query_first(
+            "getCanvasesInCollection", ["manifest", "id", "label", "type", "title"], collection_id)
+        return self.to_result(canvases, self.build_canvases, mode)
+
+    @traced
+    async def getCanvasesInManifest(self, manifest_id: str, mode: str = None):
+        """it returns a list of objects having class Canvas, included in the databases accessible
+        via the query processors, that are contained in the manifest identified by the input identifier."""
+        canvases = await self.query_first("getCanvasesInManifest", CANVAS_COLUMNS, manifest_id)
+        return self.to_result(canvases, self.build_canvases, mode)
+
+    @traced
+    async def getEntitiesWithCreator(self, creator_id: str, mode: str = None):
+        """it returns a list of objects having class EntityWithMetadata, included in the databases accessible
+        via the query processors, related to the entities having the input creator as one of their creators."""
+        relational_qp = self.find_query_processor("getEntitiesWithCreator")
+        triple_qp = self.find_query_processor("getEntitiesWithLabel")
+        if relational_qp is None:
+            return self.to_result(pd.DataFrame(columns=ENTITY_TYPE_COLUMNS), self.convert_dataframe_to_list, mode)
+        entities = await self.query_types_and_labels(triple_qp, await self.query(relational_qp, "getEntitiesWithCreator", creator_id))
+        return self.to_result(entities, self.convert_dataframe_to_list, mode)
+
+    @traced
+    async def getEntitiesWithLabel(self, label: str, mode: str = None):
+        """it returns a list of objects having class EntityWithMetadata, included in the databases accessible
+        via the query processors, related to the entities having, as label, the input label."""
+        relational_qp = self.find_query_processor("getEntitiesWithTitle")
+        triple_qp = self.find_query_processor("getEntitiesWithLabel")
+        if triple_qp is None:
+            return self.to_result(pd.DataFrame(columns=ENTITY_TYPE_COLUMNS), self.convert_dataframe_to_list, mode)
+        entities = await self.with_metadata(self.query(triple_qp, "getEntitiesWithLabel", label), relational_qp)
+        return self.to_result(entities, self.convert_dataframe_to_list, mode)
+
+    @traced
+    async def getEntitiesWithTitle(self, title: str, mode: str = None) -> List[EntityWithMetadata]:
+        """it returns a list of objects having class EntityWithMetadata, included in the databases accessible
+        via the query processors, related to the entities having, as title, the input title."""
+        relational_qp = self.find_query_processor("getEntitiesWithTitle")
+        triple_qp = self.find_query_processor("getEntitiesWithLabel")
+        if relational_qp is None:
+            return self.to_result(pd.DataFrame(columns=ENTITY_TYPE_COLUMNS), self.convert_dataframe_to_list, mode)
+        entities = await self.query_types_and_labels(triple_qp, await self.query(relational_qp, "getEntitiesWithTitle", title))
+        return self.to_result(entities, self.convert_dataframe_to_list, mode)
+
+    @traced
+    async def getImagesAnnotatingCanvas(self, canvas_id: str, mode: str = None):
+        """it returns a list of objects having class Image, included in the databases accessible
+        via the query processors, that are body of the annotations targetting the canvases specified by the input identifier."""
+        annotations = await self.query_first("getAnnotationsWithTarget", ANNOTATION_COLUMNS, canvas_id)
+        return self.to_result(annotations[["body"]], self.build_images, mode)
+
+    @traced
+    async def getManifestsInCollection(self, collection_id: str, mode: str = None):
+        """it returns a list of objects having class Manifest, included in the databases accessible
+        via the query processors, that are contained in the collection identified by the input identifier."""
+        triple_qp = self.find_query_processor("getManifestsInCollection")
+        relational_qp = self.find_query_processor("getEntitiesWithTitle")
+        if triple_qp is None:
+            return self.to_result(pd.DataFrame(columns=["id", "label", "type", "title", "creator"]), self.build_manifests, mode)
+        manifests = self.with_metadata(self.query(triple_qp, "getManifestsInCollection", collection_id), relational_qp)
+        if (mode or self.resultMode) != "objects":
+            return self.to_result(await manifests, None, mode)
+        manifests, canvases = await asyncio.gather(
+            manifests, self.query(triple_qp, "getCanvasesInCollection", collection_id))
+        return self.build_manifests(manifests, self.group_items(canvases, "manifest", self.build_canvases))
+
+    @traced
+    async def getAncestors(self, id: str, mode: str = None) -> List[EntityWithMetadata]:
+        """it returns a list of objects having class EntityWithMetadata, included in the databases accessible
+        via the query processors, that contain, directly or not, the entity specified by the input identifier
+        (e.g. the manifest and the collection containing a canvas)."""
+        triple_qp = self.find_query_processor("getAncestors")
+        relational_qp = self.find_query_processor("getEntitiesWithTitle")
+        if triple_qp is None:
+            return self.to_result(pd.DataFrame(columns=ENTITY_TYPE_COLUMNS), self.convert_dataframe_to_list, mode)
+        ancestors = await self.with_metadata(self.query(triple_qp, "getAncestors", id), relational_qp)
+        return self.to_result(ancestors, self.convert_dataframe_to_list, mode)
+
+    @traced
+    async def getAllCollections(self, mode: str = None):
+        """it returns a list of objects having class Collection included in the databases accessible via the query processors."""
+        triple_qp = self.find_query_processor("getAllCollections")
+        relational_qp = self.find_query_processor("getEntitiesWithTitle")
+        if triple_qp is None:
+            return self.to_result(pd.DataFrame(columns=ENTITY_COLUMNS), self.build_collections, mode)
+        if (mode or self.resultMode) != "objects":
+            collections = await self.with_metadata(self.query(triple_qp, "getAllCollections"), relational_qp)
+            return self.to_result(collections, None, mode)
+        collections, manifests, canvases = await asyncio.gather(
+            self.query(triple_qp, "getAllCollections"),
+            self.query(triple_qp, "getAllManifestsWithCollection"),
+            self.query(triple_qp, "getAllCanvasesWithManifest"),
+        )
+        metadata = await self.query_metadata(relational_qp, pd.concat([collections["id"], manifests["id"]]))
+        return self.build_collections(collections, metadata, manifests, canvases)
+
+    async def with_metadata(self, entities, relational_qp) -> pd.DataFrame:
+        """It awaits the input sub-query returning a dataframe of entities, and adds their metadata to it."""
+        entities = await entities
+        return self.add_metadata(entities, await self.query_metadata(relational_qp, entities["id"]))
+
+    async def query_metadata(self, relational_qp, ids) -> pd.DataFrame:
+        """It returns the metadata of the entities matching the input identifiers (see get_metadata)."""
+        if relational_qp is None or len(ids) == 0:
+            return pd.DataFrame(columns=METADATA_COLUMNS)
+        return await self.query(relational_qp, "getEntitiesByIds", ids)
+
+    async def query_types_and_labels(self, triple_qp, entities: pd.DataFrame) -> pd.DataFrame:
+        """It adds to the input dataframe of entities their type and label (see get_types_and_labels)."""
+        if triple_qp is None:
+            return entities.assign(type=None, label=None)
+        return self.add_types_and_labels(entities, await self.query(triple_qp, "getEntitiesByIds", entities["id"]))
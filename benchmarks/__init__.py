@@ -0,0 +1 @@
+# the benchmarks of the package, run from the root of the repository, e.g. python -m benchmarks.model_memory
@@ -0,0 +1,134 @@
+# the throughput of the decoding of the results of a SPARQL endpoint, shaped as the ones of getAllCanvases,
+# sent by a local stand-in of the endpoint (an HTTP server answering every query with the same results)
+# usage: python -m benchmarks.decode [--rows 5e5] [--repeat 3] [--output results.json]
+
+import argparse
+import csv
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO, StringIO
+
+import pandas as pd
+
+from benchmarks.synthetic import canvas_id
+from triplestore import SPARQLEndpoint
+
+QUERY = "SELECT ?id ?label ?title WHERE { ?manifest sc:hasItem ?id . ?id rdfs:label ?label . ?manifest rdfs:label ?title . }"
+
+
+def make_results(rows: int, canvases: int = 10) -> dict:
+    """it returns the results of the query of getAllCanvases for the input number of canvases,
+    serialized in the CSV and in the JSON formats of the SPARQL results."""
+    variables = ["id", "label", "title"]
+    values = [(canvas_id(r // canvases, r % canvases + 1), f"Page {r % canvases + 1}", f"Manifest {r // canvases}")
+              for r in range(rows)]
+    text = StringIO()
+    writer = csv.writer(text, lineterminator="\r\n")
+    writer.writerow(variables)
+    writer.writerows(values)
+    bindings = [{"id": {"type": "uri", "value": id},
+                 "label": {"type": "literal", "value": label},
+                 "title": {"type": "literal", "value": title}} for id, label, title in values]
+    return {
+        "text/csv": text.getvalue().encode("utf-8"),
+        "application/sparql-results+json": json.dumps(
+            {"head": {"vars": variables}, "results": {"bindings": bindings}}).encode("utf-8"),
+    }
+
+
+def serve(results: dict) -> ThreadingHTTPServer:
+    """it starts, in a thread, the stand-in of a SPARQL endpoint answering every query with the input results,
+    in the format asked by the Accept header, on persistent connections."""
+
+    class StandIn(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            accept = self.headers.get("Accept", "text/csv")
+            content = results.get(accept, results["text/csv"])
+            self.send_response(200)
+            self.send_header("Content-Type", accept)
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def decode_json_rows(endpoint: SPARQLEndpoint) -> pd.DataFrame:
+    """the decoding of the JSON results building a dictionary for every row, as sparql_dataframe does."""
+    content = endpoint.request(QUERY, {"Content-Type": "application/sparql-query",
+                                       "Accept": "application/sparql-results+json"})
+    results = json.loads(content)
+    return pd.DataFrame([{name: term["value"] for name, term in binding.items()}
+                         for binding in results["results"]["bindings"]], columns=results["head"]["vars"])
+
+
+def decode_csv_content(endpoint: SPARQLEndpoint) -> pd.DataFrame:
+    """the decoding of the CSV results read in full before being parsed, with the dtypes inferred by pandas."""
+    content = endpoint.request(QUERY, {"Content-Type": "application/sparql-query", "Accept": "text/csv"})
+    return pd.read_csv(BytesIO(content), sep=",")
+
+
+DECODERS = {
+    "json-rows": decode_json_rows,
+    "csv-read-all": decode_csv_content,
+    "csv-streamed": lambda endpoint: endpoint.query(QUERY),
+    "json-typed": lambda endpoint: endpoint.query(QUERY, typed=True),
+}
+
+
+def run(rows: int, repeat: int = 3) -> dict:
+    """it returns, for each decoder, the minimum of the seconds taken by a query returning the input number of rows,
+    and the rows and the megabytes of the response decoded per second."""
+    results = make_results(rows)
+    server = serve(results)
+    endpoint = SPARQLEndpoint(f"http://127.0.0.1:{server.server_address[1]}/sparql")
+    measures = {"parameters": {"rows": rows, "repeat": repeat}, "decoders": {}}
+    try:
+        expected = None
+        for name, decode in DECODERS.items():
+            seconds = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                dataframe = decode(endpoint)
+                seconds.append(time.perf_counter() - start)
+            if expected is None:
+                expected = dataframe
+            assert dataframe.astype(str).equals(expected.astype(str)), name
+            size = len(results["application/sparql-results+json" if name.startswith("json") else "text/csv"])
+            measures["decoders"][name] = {"seconds": min(seconds), "rows_per_second": rows / min(seconds),
+                                          "mib_per_second": size / 2 ** 20 / min(seconds), "bytes": size}
+            print(f"{name:<15}{min(seconds):>8.3f}s {rows / min(seconds):>12.0f} rows/s "
+                  f"{size / 2 ** 20 / min(seconds):>8.1f} MiB/s", file=sys.stderr)
+    finally:
+        endpoint.close()
+        server.shutdown()
+        server.server_close()
+    return measures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="the throughput of the decoding of the SPARQL results")
+    parser.add_argument("--rows", type=float, default=5 * 10 ** 5)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="the JSON file where the results are written")
+    args = parser.parse_args(argv)
+    results = run(int(args.rows), args.repeat)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+# the comparison of the memory used by the annotations returned by RelationalQueryProcessor, and of the speed
+# of merging them with the canvases they target, with the default dtypes (Python strings), with compact dtypes
+# (see compact_dataframe) and with the identifiers encoded as a dictionary of their prefixes (see encode_prefixes)
+# usage: python -m benchmarks.dtypes [--annotations 1e6] [--manifests 1e4] [--output results.json]
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+from benchmarks.synthetic import canvas_id, generate
+from compact import compact_dataframe, decode_prefixes, encode_prefixes
+from relational import AnnotationProcessor, RelationalQueryProcessor
+
+
+def frame_bytes(dataframe: pd.DataFrame) -> int:
+    """it returns the bytes used by the input data frame, including the Python strings it refers to."""
+    return int(dataframe.memory_usage(index=False, deep=True).sum())
+
+
+def read(processor: RelationalQueryProcessor, compact: bool) -> tuple:
+    """it returns all the annotations read by the input processor, with or without compact dtypes,
+    the seconds the read took and the peak of the memory it allocated."""
+    processor.setCompactResults(compact)
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        annotations = processor.getAllAnnotations()
+        seconds = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return annotations, seconds, peak
+
+
+def time_merge(annotations: pd.DataFrame, canvases: pd.DataFrame, repeat: int) -> float:
+    """it returns the minimum of the seconds taken by merging the input annotations with the canvases they target."""
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        annotations.merge(canvases, left_on="target", right_on="id", how="inner", suffixes=("", "_canvas"))
+        seconds.append(time.perf_counter() - start)
+    return min(seconds)
+
+
+def run(annotations: int, manifests: int, canvases: int = 10, repeat: int = 3, directory: str = None) -> dict:
+    """it uploads the input number of synthetic annotations and returns, for each kind of dtypes,
+    the bytes of the data frame of all of them, the seconds and the peak memory of reading it,
+    and the seconds of merging it with the data frame of all the canvases."""
+    directory = directory or tempfile.mkdtemp(prefix="benchmark-")
+    relational = os.path.join(directory, "relational.db")
+    files = generate(os.path.join(directory, "data"), annotations, manifests, canvases)
+    uploader = AnnotationProcessor()
+    uploader.setDbPathOrUrl(relational)
+    uploader.setBatchSize(100000)
+    uploader.uploadData(files["annotations"])
+    processor = RelationalQueryProcessor()
+    processor.setDbPathOrUrl(relational)
+
+    targets = pd.DataFrame({
+        "id": [canvas_id(m, p) for m in range(manifests) for p in range(1, canvases + 1)],
+        "label": [f"Page {p}" for _ in range(manifests) for p in range(1, canvases + 1)],
+    })
+    results = {"parameters": {"annotations": annotations, "manifests": manifests,
+                              "canvases_per_manifest": canvases, "repeat": repeat}}
+    for name, compact in (("object", False), ("compact", True)):
+        frame, seconds, peak = read(processor, compact)
+        canvases_frame = compact_dataframe(targets) if compact else targets
+        results[name] = {"bytes": frame_bytes(frame), "read_seconds": seconds, "read_peak_bytes": peak,
+                         "merge_seconds": time_merge(frame, canvases_frame, repeat)}
+        print(f"{name:<10}{results[name]['bytes'] / 2 ** 20:>10.1f} MiB {seconds:>8.3f}s read "
+              f"{peak / 2 ** 20:>8.1f} MiB peak {results[name]['merge_seconds']:>8.3f}s merge", file=sys.stderr)
+
+    # the identifiers of the annotations are all distinct, but share the prefix of the manifest they belong to
+    ids = encode_prefixes(frame["id"].astype(object))
+    assert decode_prefixes(ids).equals(frame["id"].astype(object).rename(None))
+    results["compact"]["id_bytes"] = frame_bytes(frame[["id"]])
+    results["compact"]["id_prefix_encoded_bytes"] = frame_bytes(ids)
+    print(f"{'id':<10}{results['compact']['id_bytes'] / 2 ** 20:>10.1f} MiB as Arrow strings, "
+          f"{results['compact']['id_prefix_encoded_bytes'] / 2 ** 20:.1f} MiB prefix-encoded", file=sys.stderr)
+    processor.close()
+    uploader.close()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="the comparison of the dtypes of the annotations")
+    parser.add_argument("--annotations", type=float, default=10 ** 6)
+    parser.add_argument("--manifests", type=float, default=10 ** 4)
+    parser.add_argument("--canvases", type=int, default=10, help="the number of canvases of each manifest")
+    parser.add_argument("--repeat", type=int, default=3, help="the runs of each merge")
+    parser.add_argument("--output", help="the JSON file where the results are written")
+    args = parser.parse_args(argv)
+    directory = tempfile.mkdtemp(prefix="benchmark-")
+    try:
+        results = run(int(args.annotations), int(args.manifests), args.canvases, args.repeat, directory)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
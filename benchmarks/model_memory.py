@@ -0,0 +1,81 @@
+# it measures the memory used by the entities of model.py, in bytes per entity, compared with the
+# previous classes, which stored their attributes in a __dict__ and wrapped body and target of each
+# annotation in two more objects
+# usage: python -m benchmarks.model_memory [number of entities]
+
+import sys
+import tracemalloc
+
+from model import Annotation, Canvas, IdentifiableEntity, Image
+
+
+class LegacyIdentifiableEntity:
+    def __init__(self, id):
+        self.id = id
+
+
+class LegacyImage(LegacyIdentifiableEntity):
+    pass
+
+
+class LegacyAnnotation(LegacyIdentifiableEntity):
+    def __init__(self, id, motivation, body, target):
+        self.motivation = motivation
+        self.target = target
+        self.body = body
+        super().__init__(id)
+
+
+class LegacyCanvas(LegacyIdentifiableEntity):
+    def __init__(self, id, label, title=None, creators=None):
+        self.label = label
+        self.title = title
+        self.creators = creators if isinstance(creators, list) else []
+        super().__init__(id)
+
+
+def legacy_annotation(i, ids):
+    return LegacyAnnotation(ids[0][i], "painting", LegacyImage(ids[1][i]), LegacyIdentifiableEntity(ids[2][i]))
+
+
+def annotation(i, ids):
+    return Annotation(ids[0][i], "painting", ids[1][i], ids[2][i])
+
+
+def legacy_canvas(i, ids):
+    return LegacyCanvas(ids[0][i], ids[1][i])
+
+
+def canvas(i, ids):
+    return Canvas(ids[0][i], ids[1][i])
+
+
+def measure(build, ids, n: int) -> float:
+    """it returns the bytes allocated per entity to build n entities, excluding the strings passed to them."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    entities = [build(i, ids) for i in range(n)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del entities
+    return (after - before) / n
+
+
+def main(n: int = 100000):
+    # the identifiers are built in advance, so that only the memory of the entities is measured
+    ids = [[f"https://example.org/iiif/{kind}/{i}" for i in range(n)] for kind in ("annotation", "image", "canvas")]
+    rows = [
+        ("Annotation", measure(legacy_annotation, ids, n), measure(annotation, ids, n)),
+        ("Canvas", measure(legacy_canvas, ids, n), measure(canvas, ids, n)),
+    ]
+    # the views of body and target are built only when read
+    assert isinstance(annotation(0, ids).getBody(), Image)
+    assert isinstance(annotation(0, ids).getTarget(), IdentifiableEntity)
+    print(f"{n} entities, bytes per entity (list included)")
+    print(f"{'class':<12}{'before':>10}{'after':>10}{'saved':>8}")
+    for name, before, after in rows:
+        print(f"{name:<12}{before:>10.0f}{after:>10.0f}{1 - after / before:>8.0%}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
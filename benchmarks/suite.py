@@ -0,0 +1,211 @@
+# the benchmark of the uploads and of the get methods of GenericQueryProcessor on synthetic data,
+# run on a local triplestore (a N-Triples file) and a SQLite database in a temporary directory, with no network
+# usage: python -m benchmarks.suite [--preset small|medium|large|huge] [--output results.json] [--compare old.json]
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from statistics import median
+
+from benchmarks.synthetic import generate
+from generic import GenericQueryProcessor
+from instrumentation import MetricsCollector
+from rdf import CollectionProcessor, TriplestoreQueryProcessor
+from relational import AnnotationProcessor, MetadataProcessor, RelationalQueryProcessor
+
+# the number of annotations and of manifests of each preset
+PRESETS = {
+    "small": (10 ** 3, 10 ** 2),
+    "medium": (10 ** 5, 10 ** 3),
+    "large": (10 ** 6, 10 ** 4),
+    "huge": (10 ** 7, 10 ** 5),
+}
+
+# the get methods of GenericQueryProcessor, with their keyword arguments and the identifiers (see generate) they take
+QUERIES = [
+    ("getEntityById", {}, ["manifest"]),
+    ("getAllAnnotations", {}, []),
+    ("getAllCanvas", {}, []),
+    ("getAllImages", {}, []),
+    ("getAllManifests", {}, []),
+    ("getAllManifests", {"prefetch": True}, []),
+    ("getAllCollections", {}, []),
+    ("getAllCollections", {"prefetch": True}, []),
+    ("getAnnotationsToCanvas", {}, ["canvas"]),
+    ("getAnnotationsToCollection", {}, ["collection"]),
+    ("getAnnotationsToManifest", {}, ["manifest"]),
+    ("getAnnotationsWithBody", {}, ["image"]),
+    ("getAnnotationsWithBodyAndTarget", {}, ["image", "canvas"]),
+    ("getAnnotationsWithTarget", {}, ["canvas"]),
+    ("getAncestors", {}, ["canvas"]),
+    ("getCanvasesInCollection", {}, ["collection"]),
+    ("getCanvasesInManifest", {}, ["manifest"]),
+    ("getEntitiesWithCreator", {}, ["creator"]),
+    ("getEntitiesWithLabel", {}, ["label"]),
+    ("getEntitiesWithTitle", {}, ["title"]),
+    ("getImagesAnnotatingCanvas", {}, ["canvas"]),
+    ("getManifestsInCollection", {}, ["collection"]),
+]
+
+
+def measure(function, repeat: int = 1, processor=None) -> dict:
+    """it runs the input function repeat times, and returns the median and minimum of the seconds it took,
+    the peak of the memory it allocated and the queries sent by the input processor (in a further run,
+    traced by tracemalloc and recorded by a MetricsCollector)."""
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        seconds.append(time.perf_counter() - start)
+    metrics = MetricsCollector()
+    if processor is not None:
+        processor.setInstrumentation(metrics)
+    tracemalloc.start()
+    try:
+        function()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+        if processor is not None:
+            processor.setInstrumentation(None)
+    return {
+        "seconds": median(seconds),
+        "min_seconds": min(seconds),
+        "peak_bytes": peak,
+        "sql_queries": len(metrics.getRecords(backend="sqlite")),
+        "sparql_queries": len(metrics.getRecords()) - len(metrics.getRecords(backend="sqlite")),
+        "bytes_decoded": sum(record.size or 0 for record in metrics.getRecords()),
+        "results": len(result) if hasattr(result, "__len__") else int(result is not None),
+    }
+
+
+def upload(processor, path: str, filenames: list) -> int:
+    """it uploads the input files with a new processor of the input class and returns the rows uploaded."""
+    rows = 0
+    for filename in filenames:
+        uploader = processor()
+        uploader.setDbPathOrUrl(path)
+        uploader.uploadData(filename)
+        rows += uploader.getUploadReport().rows
+    return rows
+
+
+def run(annotations: int, manifests: int, canvases: int = 10, manifests_per_collection: int = 100,
+        repeat: int = 3, directory: str = None) -> dict:
+    """it generates the synthetic data, uploads it and runs all the get methods of GenericQueryProcessor,
+    and returns the measures of each step."""
+    directory = directory or tempfile.mkdtemp(prefix="benchmark-")
+    relational, graph = os.path.join(directory, "relational.db"), os.path.join(directory, "graph.nt")
+    results = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "parameters": {"annotations": annotations, "manifests": manifests, "canvases_per_manifest": canvases,
+                       "manifests_per_collection": manifests_per_collection, "repeat": repeat},
+        "uploads": {},
+        "queries": {},
+    }
+    start = time.perf_counter()
+    files = generate(os.path.join(directory, "data"), annotations, manifests, canvases, manifests_per_collection)
+    results["generation_seconds"] = time.perf_counter() - start
+
+    # an upload cannot be repeated, so that it is measured once, with its memory traced
+    for name, processor, path, filenames in [
+            ("AnnotationProcessor.uploadData", AnnotationProcessor, relational, [files["annotations"]]),
+            ("MetadataProcessor.uploadData", MetadataProcessor, relational, [files["metadata"]]),
+            ("CollectionProcessor.uploadData", CollectionProcessor, graph, files["collections"])]:
+        tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            rows = upload(processor, path, filenames)
+            seconds = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        results["uploads"][name] = {"seconds": seconds, "peak_bytes": peak, "rows": rows,
+                                    "rows_per_second": rows / seconds if seconds else 0.0}
+        print(f"{name:<45}{seconds:>10.3f}s {rows:>10} rows", file=sys.stderr)
+
+    rel_qp = RelationalQueryProcessor()
+    rel_qp.setDbPathOrUrl(relational)
+    grp_qp = TriplestoreQueryProcessor()
+    grp_qp.setDbPathOrUrl(graph)
+    generic = GenericQueryProcessor()
+    generic.cleanQueryProcessors()
+    generic.addQueryProcessor(rel_qp)
+    generic.addQueryProcessor(grp_qp)
+    for method, kwargs, ids in QUERIES:
+        name = method + "".join(f"({key}={value})" for key, value in kwargs.items())
+        args = [files["ids"][id] for id in ids]
+        results["queries"][name] = measure(lambda: getattr(generic, method)(*args, **kwargs), repeat, generic)
+        measures = results["queries"][name]
+        print(f"{name:<45}{measures['seconds']:>10.4f}s {measures['results']:>10} results "
+              f"{measures['sql_queries']:>4} SQL {measures['sparql_queries']:>4} SPARQL", file=sys.stderr)
+    generic.close()
+    rel_qp.close()
+    return results
+
+
+def git_commit() -> str:
+    """it returns the commit of the repository being measured, if any."""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(previous: dict, current: dict, threshold: float = 1.2) -> list:
+    """it returns the steps that take more than threshold times the seconds they took in the previous results,
+    as tuples (step, previous seconds, current seconds)."""
+    regressions = []
+    for section in ("uploads", "queries"):
+        for name, measures in current[section].items():
+            before = previous.get(section, {}).get(name)
+            if before and before["seconds"] > 0 and measures["seconds"] > threshold * before["seconds"]:
+                regressions.append((name, before["seconds"], measures["seconds"]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="the benchmark of the uploads and of the get methods on synthetic data")
+    parser.add_argument("--preset", choices=PRESETS, default="small")
+    parser.add_argument("--annotations", type=float, help="the number of annotations (overrides the preset)")
+    parser.add_argument("--manifests", type=float, help="the number of manifests (overrides the preset)")
+    parser.add_argument("--canvases", type=int, default=10, help="the number of canvases of each manifest")
+    parser.add_argument("--manifests-per-collection", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=3, help="the runs of each get method")
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--compare", help="previous results, to report the steps that became slower")
+    parser.add_argument("--threshold", type=float, default=1.2)
+    parser.add_argument("--keep", help="the directory where the data and the databases are kept")
+    args = parser.parse_args(argv)
+    annotations, manifests = PRESETS[args.preset]
+    annotations = int(args.annotations or annotations)
+    manifests = int(args.manifests or manifests)
+
+    directory = args.keep or tempfile.mkdtemp(prefix="benchmark-")
+    try:
+        results = run(annotations, manifests, args.canvases, args.manifests_per_collection, args.repeat, directory)
+    finally:
+        if not args.keep:
+            shutil.rmtree(directory, ignore_errors=True)
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(results, file, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            regressions = compare(json.load(file), results, args.threshold)
+        for name, before, after in regressions:
+            print(f"slower: {name} {before:.4f}s -> {after:.4f}s")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+# the generator of synthetic data, shaped as the files in data/ but of any size: IIIF collections,
+# and the CSV files of annotations and metadata of their entities
+# usage: python -m benchmarks.synthetic <directory> [number of annotations] [number of manifests]
+
+import csv
+import json
+import os
+import random
+import sys
+
+BASE = "https://example.org/iiif"
+CREATORS = ["Alighieri, Dante", "Petrarca, Francesco", "Boccaccio, Giovanni", "Doe, John", "Doe, Jane"]
+
+
+def collection_id(c: int) -> str:
+    return f"{BASE}/{c}/collection"
+
+
+def manifest_id(m: int) -> str:
+    return f"{BASE}/2/{m}/manifest"
+
+
+def canvas_id(m: int, p: int) -> str:
+    return f"{BASE}/2/{m}/canvas/p{p}"
+
+
+def write_collections(directory: str, manifests: int, canvases: int, manifests_per_collection: int) -> list:
+    """it writes the IIIF collections containing the input number of manifests, each with the input number
+    of canvases, manifests_per_collection manifests in each collection file, and returns the paths of the files.
+    The files are written while they are generated, so that their size is not limited by the memory."""
+    filenames = []
+    for c, first in enumerate(range(0, manifests, manifests_per_collection)):
+        filename = os.path.join(directory, f"collection-{c}.json")
+        with open(filename, "w", encoding="utf-8") as file:
+            file.write(json.dumps({
+                "@context": "http://iiif.io/api/presentation/3/context.json",
+                "id": collection_id(c),
+                "type": "Collection",
+                "label": {"none": [f"Collection {c}"]},
+            })[:-1] + ', "items": [\n')
+            for m in range(first, min(first + manifests_per_collection, manifests)):
+                manifest = {
+                    "id": manifest_id(m),
+                    "type": "Manifest",
+                    "label": {"none": [f"Manifest {m}"]},
+                    "items": [
+                        {"id": canvas_id(m, p), "type": "Canvas", "label": {"none": [f"Page {p} of manifest {m}"]}}
+                        for p in range(1, canvases + 1)
+                    ],
+                }
+                file.write((",\n" if m > first else "") + json.dumps(manifest))
+            file.write("\n]}\n")
+        filenames.append(filename)
+    return filenames
+
+
+def write_annotations(filename: str, annotations: int, manifests: int, canvases: int,
+                      manifests_per_collection: int = 100, seed: int = 0) -> dict:
+    """it writes the CSV file of the input number of annotations, each targeting a random canvas
+    (or, one time out of a hundred, a random manifest) of the collections written by write_collections,
+    except one annotation out of two hundred, which targets the collection containing the manifest.
+    It returns the identifiers of the first canvas, manifest and collection annotated,
+    and the body (image) of the annotation of that canvas."""
+    rng = random.Random(seed)
+    annotated = {}
+    with open(filename, "w", encoding="utf-8", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["id", "body", "target", "motivation"])
+        for a in range(annotations):
+            m = rng.randrange(manifests)
+            if rng.random() < 0.01:
+                kind, target = "manifest", manifest_id(m)
+            else:
+                kind, target = "canvas", canvas_id(m, rng.randint(1, canvases))
+            if a % 200 == 1:
+                kind, target = "collection", collection_id(m // manifests_per_collection)
+            body = f"{BASE}/2/{a}/full/699,800/0/default.jpg"
+            if kind not in annotated:
+                annotated[kind] = target
+                if kind == "canvas":
+                    annotated["image"] = body
+            writer.writerow([f"{BASE}/2/{m}/annotation/a{a}", body, target, "painting"])
+    return annotated
+
+
+def write_metadata(filename: str, manifests: int, manifests_per_collection: int, seed: int = 0):
+    """it writes the CSV file of the metadata of all the collections and manifests written by write_collections."""
+    rng = random.Random(seed)
+    with open(filename, "w", encoding="utf-8", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["id", "title", "creator"])
+        for c in range((manifests + manifests_per_collection - 1) // manifests_per_collection):
+            writer.writerow([collection_id(c), f"Collection {c}: Opere", "; ".join(rng.sample(CREATORS, 2))])
+        for m in range(manifests):
+            writer.writerow([manifest_id(m), f"Manifest {m}", rng.choice(CREATORS)])
+
+
+def generate(directory: str, annotations: int, manifests: int, canvases: int = 10,
+             manifests_per_collection: int = 100, seed: int = 0) -> dict:
+    """it writes all the synthetic data in the input directory, and returns the paths of the files
+    and some identifiers to query (a collection, a manifest, a canvas, an image, a creator, a title and a label).
+    The collection, the manifest and the canvas are targets of annotations, and the image is the body
+    of an annotation of the canvas."""
+    os.makedirs(directory, exist_ok=True)
+    files = {
+        "collections": write_collections(directory, manifests, canvases, manifests_per_collection),
+        "annotations": os.path.join(directory, "annotations.csv"),
+        "metadata": os.path.join(directory, "metadata.csv"),
+    }
+    annotated = write_annotations(files["annotations"], annotations, manifests, canvases, manifests_per_collection, seed)
+    write_metadata(files["metadata"], manifests, manifests_per_collection, seed)
+    # the identifiers are taken from the annotations, so that the lookups by body and target find them
+    files["ids"] = {
+        "collection": annotated.get("collection", collection_id(0)),
+        "manifest": annotated.get("manifest", manifest_id(0)),
+        "canvas": annotated.get("canvas", canvas_id(0, 1)),
+        "image": annotated.get("image", f"{BASE}/2/0/full/699,800/0/default.jpg"),
+        "creator": CREATORS[0],
+        "title": "Manifest 0",
+        "label": "Manifest 0",
+    }
+    return files
+
+
+if __name__ == "__main__":
+    generate(sys.argv[1],
+             int(float(sys.argv[2])) if len(sys.argv) > 2 else 1000,
+             int(float(sys.argv[3])) if len(sys.argv) > 3 else 100)
@@ -0,0 +1,81 @@
+# the cache of the results of the get methods of GenericQueryProcessor
+# ResultCache
+
+import threading
+import time
+from collections import OrderedDict
+
+
+all = [
+    "ResultCache",
+]
+
+
+class ResultCache():
+    """
+        A cache of at most max_size results, evicting the least recently used one when it is full.
+        Each result is stored with the generations of the databases it has been read from, and it is discarded
+        when it is looked up with different generations (i.e. after an upload in one of the databases)
+        or, if ttl is not None, when it has been stored more than ttl seconds before.
+        """
+
+    def __init__(self, max_size: int = 1024, ttl: float = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key, generation):
+        """it returns a tuple (True, result) with the result stored for the input key, if it is still valid
+        for the input generation, and (False, None) otherwise."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                result, stored_generation, stored_at = entry
+                if stored_generation != generation:
+                    self.invalidations += 1
+                elif self.ttl is not None and time.monotonic() - stored_at > self.ttl:
+                    self.expirations += 1
+                else:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, result
+                del self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key, result, generation):
+        """it stores the input result for the input key and generation, evicting the least recently used results
+        when the cache is full."""
+        with self._lock:
+            self._entries[key] = (result, generation, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """it removes all the results from the cache."""
+        with self._lock:
+            self._entries.clear()
+        return True
+
+    def getStatistics(self) -> dict:
+        """it returns the number of results in the cache, and the hits, misses, evictions, expirations
+        and invalidations since it has been created."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,93 @@
+# the compact dtypes of the data frames returned by the query processors, and the encoding of the URIs
+# as a dictionary of their shared prefixes
+# compact_chunks, compact_dataframe, decode_prefixes, encode_prefixes
+
+import pandas as pd
+
+
+all = [
+    "compact_chunks",
+    "compact_dataframe",
+    "decode_prefixes",
+    "encode_prefixes",
+]
+
+# the maximum ratio between the distinct values of a column and its rows for the column to be categorical
+CATEGORY_RATIO = 0.5
+
+
+def arrow_string_dtype():
+    """it returns the dtype of the strings stored in Arrow arrays, or None if pyarrow is not installed."""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return None
+    return pd.StringDtype("pyarrow")
+
+
+def compact_dataframe(dataframe: pd.DataFrame, category_ratio: float = CATEGORY_RATIO) -> pd.DataFrame:
+    """it returns the input data frame with compact dtypes for its string columns: categorical for the columns
+    with few distinct values (at most category_ratio times the rows, e.g. motivation, or the target of
+    the annotations of the same canvas), and Arrow strings, which are not Python objects, for the others
+    (e.g. the identifiers). The values are not changed, and the missing ones become pandas.NA."""
+    strings = arrow_string_dtype()
+    compacted = {}
+    for name in dataframe.columns:
+        values = dataframe[name]
+        if not (values.dtype == object or isinstance(values.dtype, pd.StringDtype)) or not len(values):
+            continue
+        if values.nunique() <= category_ratio * len(values):
+            values = values.astype("category")
+            # the categories are few, and are merged and compared faster as Python strings
+            compacted[name] = pd.Categorical.from_codes(
+                values.cat.codes, categories=values.cat.categories.astype(object))
+        elif values.dtype == object and strings is not None:
+            compacted[name] = values.astype(strings)
+    if not compacted:
+        return dataframe
+    return dataframe.assign(**compacted)
+
+
+def compact_chunks(chunks, category_ratio: float = CATEGORY_RATIO) -> pd.DataFrame:
+    """it returns the data frame joining the input data frames (e.g. the chunks returned by pandas.read_sql)
+    with compact dtypes. Every chunk is converted to Arrow strings before the next one is read,
+    so that the rows are never all held as Python strings at the same time."""
+    strings = arrow_string_dtype()
+    if strings is not None:
+        chunks = (chunk.astype({name: strings for name in chunk.columns if chunk[name].dtype == object})
+                  for chunk in chunks)
+    return compact_dataframe(pd.concat(chunks, ignore_index=True), category_ratio)
+
+
+def split_uri(uri: str) -> tuple:
+    """it splits the input URI after its last "/" or "#", into the prefix it shares with the URIs of the same
+    namespace and its local part."""
+    end = max(uri.rfind("/"), uri.rfind("#")) + 1
+    return uri[:end], uri[end:]
+
+
+def encode_prefixes(values: pd.Series) -> pd.DataFrame:
+    """it returns the input URIs as a data frame with the columns prefix, categorical, whose dictionary stores
+    every shared prefix once, and local, with the rest of each URI. It is the most compact form of
+    columns of distinct URIs, such as the identifiers of the annotations, decoded by decode_prefixes."""
+    prefixes, local_names = [], []
+    for value in values:
+        if isinstance(value, str):
+            prefix, local = split_uri(value)
+        else:
+            prefix, local = None, None
+        prefixes.append(prefix)
+        local_names.append(local)
+    strings = arrow_string_dtype() or object
+    return pd.DataFrame({
+        "prefix": pd.Categorical(prefixes),
+        "local": pd.Series(local_names, dtype=strings),
+    }, index=values.index)
+
+
+def decode_prefixes(encoded: pd.DataFrame) -> pd.Series:
+    """it returns the URIs encoded by encode_prefixes, as Python strings (None if missing)."""
+    return pd.Series([
+        prefix + local if isinstance(prefix, str) and isinstance(local, str) else None
+        for prefix, local in zip(encoded["prefix"].tolist(), encoded["local"].tolist())
+    ], index=encoded.index, dtype=object)
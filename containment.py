@@ -0,0 +1,60 @@
+# the in-memory index of the containment of collections, manifests and canvases in the triplestore
+# ContainmentIndex
+
+import pandas as pd
+
+
+all = [
+    "ContainmentIndex",
+]
+
+
+class ContainmentIndex():
+    """
+        The containment of the entities of a triplestore, kept in memory: the children of every entity,
+        in the order returned by the triplestore, the entities containing every entity, and the type and label
+        of every entity. It is loaded from the data frame of all the entities with their parent
+        (see TriplestoreQueryProcessor.getContainmentIndex), and remembers the generation of the triplestore
+        it has been loaded from.
+        """
+
+    def __init__(self, entities: pd.DataFrame, generation: int = 0):
+        self.generation = generation
+        self.entities = {}
+        children = {}
+        parents = {}
+        for parent, id, type, label in zip(entities["parent"], entities["id"], entities["type"], entities["label"]):
+            if id not in self.entities or self.entities[id][1] is None:
+                self.entities[id] = (type, label if isinstance(label, str) else None)
+            if isinstance(parent, str):
+                # the dictionaries are used as ordered sets, since each child has a row for each of its labels
+                children.setdefault(parent, {})[id] = None
+                parents.setdefault(id, {})[parent] = None
+        self.children = {parent: list(items) for parent, items in children.items()}
+        self.parents = {child: list(items) for child, items in parents.items()}
+
+    def getEntity(self, id: str):
+        """it returns the tuple (type, label) of the input entity, or None if it is not in the triplestore."""
+        return self.entities.get(id)
+
+    def getChildren(self, id: str) -> list:
+        """it returns the identifiers of the entities contained in the input entity."""
+        return self.children.get(id, [])
+
+    def getParents(self, id: str) -> list:
+        """it returns the identifiers of the entities containing the input entity."""
+        return self.parents.get(id, [])
+
+    def getAncestors(self, id: str) -> list:
+        """it returns the identifiers of all the entities containing, directly or not, the input entity,
+        from the closest ones (e.g. the manifest of a canvas) to the farthest (e.g. its collection)."""
+        ancestors = {}
+        level = self.getParents(id)
+        while level:
+            next_level = []
+            for parent in level:
+                if parent not in ancestors and parent != id:
+                    ancestors[parent] = None
+                    next_level.extend(self.getParents(parent))
+            level = next_level
+        return list(ancestors)
@@ -1,8 +1,58 @@
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextvars import copy_context
+from functools import partial, wraps
 from typing import List
 import pandas as pd
-from processor import QueryProcessor
+from cache import ResultCache
+from instrumentation import traced
+from processor import QueryProcessor, get_generation, store_key
 from rdf import match_types
-from model import Annotation, Canvas, Collection, Image, Manifest, IdentifiableEntity, EntityWithMetadata
+from model import Annotation, Canvas, Collection, Image, Manifest, EntityWithMetadata
+
+# the kinds of result the get methods can return: lists of model objects, data frames or Arrow tables
+RESULT_MODES = ["objects", "dataframe", "arrow"]
+models_by_type = {value["uriref"]: value["model"] for value in match_types.values()}
+# the columns of the empty results returned when no query processor can run a sub-query
+ANNOTATION_COLUMNS = ["id", "body", "target", "motivation"]
+CANVAS_COLUMNS = ["id", "label", "title"]
+METADATA_COLUMNS = ["id", "title", "creator"]
+# the columns of the manifests and collections returned when the triplestore is not queried
+ENTITY_COLUMNS = ["id", "label", "title", "creator"]
+ENTITY_TYPE_COLUMNS = ["id", "type", "label", "title", "creator"]
+# the lock guarding the creation of the threads and of the semaphores of the processors
+_executor_lock = threading.Lock()
+
+
+def cached(method):
+    """it makes the input get method return, when the result cache of the GenericQueryProcessor is enabled,
+    the result stored for the same arguments, as long as no data has been uploaded since then in the databases
+    of the query processors. The queries it sends are recorded under its name (see traced)."""
+    @wraps(method)
+    def get(self, *args, **kwargs):
+        if self.resultCache is None:
+            return method(self, *args, **kwargs)
+        stores = tuple(store_key(qp.getDbPathOrUrl()) for qp in self.queryProcessors)
+        key = (method.__name__, args, tuple(sorted(kwargs.items())),
+               self.resultMode, self.prefetchItems, self.useEntityView, stores)
+        try:
+            hash(key)
+        except TypeError:
+            # e.g. a list of identifiers as argument
+            return method(self, *args, **kwargs)
+        generation = tuple(get_generation(store) for store in stores)
+        found, result = self.resultCache.get(key, generation)
+        if not found:
+            result = method(self, *args, **kwargs)
+            self.resultCache.put(key, result, generation)
+        # the callers can change the list or the dataframe they receive without changing the one in the cache
+        # (a pyarrow Table cannot be changed, and is returned as it is)
+        if isinstance(result, list):
+            return list(result)
+        if isinstance(result, pd.DataFrame):
+            return result.copy()
+        return result
+    return traced(get)
 
 
 class GenericQueryProcessor(QueryProcessor):
@@ -10,6 +60,29 @@ class GenericQueryProcessor(QueryProcessor):
     """the variable containing the list of QueryProcessor objects to involve when one of the get methods below is executed.
     In practice, every time a get method is executed, the method will call the related method on
     all the QueryProcessor objects included in the variable queryProcessors, before combining the results and returning the requested object."""
+    resultMode = "objects"
+    """the kind of result returned by the get methods: "objects" (the default) for lists of objects of the model,
+    "dataframe" for the data frame combining the results of the query processors, without creating any object,
+    and "arrow" for the same data as a pyarrow Table. Each get method can override it with its parameter mode."""
+    prefetchItems = False
+    """if True, the manifests and collections returned by the get methods include all their items, retrieved
+    with a constant number of queries; otherwise (the default) the items of each manifest and collection are retrieved
+    the first time they are read. Each get method returning manifests or collections can override it
+    with its parameter prefetch."""
+
+    useEntityView = False
+    """if True, the get methods looking for entities by identifier, title, label or creator read the entity view
+    of the relational database (see EntityViewProcessor) with a single query, when the view exists."""
+    maxWorkers = 8
+    """the number of threads sending the independent sub-queries of a get method to the query processors
+    at the same time. With 1, the sub-queries are sent one after the other."""
+    maxQueriesPerDatabase = 4
+    """the number of sub-queries sent to the same database at the same time, by all the threads of the processor."""
+    executor = None
+    semaphores = None
+    resultCache = None
+    """the ResultCache storing the results of the get methods, None (the default) if they are not cached.
+    A result is discarded when data is uploaded in one of the databases of the query processors."""
 
     def cleanQueryProcessors(self):
         """It clean the list queryProcessors from all the QueryProcessor objects it includes."""
@@ -19,11 +92,81 @@ class GenericQueryProcessor(QueryProcessor):
     def addQueryProcessor(self, qp) -> bool:
         """It append the input QueryProcessor object to the list queryProcessors."""
         self.queryProcessors.append(qp)
+        if self.instrumentation is not None:
+            qp.setInstrumentation(self.instrumentation)
+        return True
+
+    def setInstrumentation(self, instrumentation) -> bool:
+        """It sets the Instrumentation recording the queries sent by all the query processors, grouped under
+        the get method that caused them (see MetricsCollector), or None to stop recording them."""
+        self.instrumentation = instrumentation
+        for qp in self.queryProcessors:
+            qp.setInstrumentation(instrumentation)
+        return True
+
+    def setResultMode(self, mode: str) -> bool:
+        """It sets the kind of result returned by the get methods (see the variable resultMode)."""
+        if mode not in RESULT_MODES:
+            return False
+        self.resultMode = mode
+        return True
+
+    def setUseEntityView(self, use: bool) -> bool:
+        """It sets whether the entity view is used to answer the get methods (see the variable useEntityView)."""
+        self.useEntityView = bool(use)
+        return True
+
+    def setMaxWorkers(self, max_workers: int) -> bool:
+        """It sets how many sub-queries are sent to the query processors at the same time (see the variable maxWorkers)."""
+        if max_workers < 1:
+            return False
+        self.close()
+        self.maxWorkers = max_workers
+        return True
+
+    def setMaxQueriesPerDatabase(self, max_queries: int) -> bool:
+        """It sets how many sub-queries are sent to the same database at the same time."""
+        if max_queries < 1:
+            return False
+        self.maxQueriesPerDatabase = max_queries
+        self.semaphores = {}
+        return True
+
+    def close(self) -> bool:
+        """It stops the threads sending the sub-queries, started again by the next get method."""
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+        return True
+
+    def setResultCache(self, max_size: int = 1024, ttl: float = None) -> bool:
+        """It enables the cache of the results of the get methods, storing at most max_size results
+        for at most ttl seconds each (with no limit if ttl is None). A max_size of 0 disables the cache."""
+        if max_size < 0 or ttl is not None and ttl <= 0:
+            return False
+        self.resultCache = ResultCache(max_size, ttl) if max_size else None
+        return True
+
+    def clearResultCache(self) -> bool:
+        """It removes all the results from the cache, if enabled."""
+        if self.resultCache is not None:
+            self.resultCache.clear()
+        return True
+
+    def getCacheStatistics(self) -> dict:
+        """It returns the statistics of the result cache (see ResultCache.getStatistics), or None if it is disabled."""
+        if self.resultCache is None:
+            return None
+        return self.resultCache.getStatistics()
+
+    def setPrefetchItems(self, prefetch: bool) -> bool:
+        """It sets whether the manifests and collections are returned with all their items (see the variable prefetchItems)."""
+        self.prefetchItems = bool(prefetch)
         return True
 
     def convert_row_to_model(self, row: pd.Series):
         """It converts the input row into an object having the class model."""
-        model = [value["model"] for _, value in match_types.items() if value["uriref"] == row["type"]][0]
+        model = models_by_type[row["type"]]
         return model(
             id=row["id"],
             label=row.get("label"),
@@ -32,273 +175,470 @@ class GenericQueryProcessor(QueryProcessor):
         )
 
     def convert_dataframe_to_list(self, dataframe: pd.DataFrame):
-        """It converts the input dataframe into a list of objects having the class model."""
-        return [self.convert_row_to_model(row) for _, row in dataframe.iterrows()]
+        """It converts the input dataframe into a list of objects having the class model
+        (EntityWithMetadata for the entities whose type is unknown)."""
+        columns = [self.column(dataframe, name) for name in ("type", "id", "label", "title", "creator")]
+        return [models_by_type.get(type, EntityWithMetadata)(id=id, label=label, title=title, creators=creator)
+                for type, id, label, title, creator in zip(*columns) if type is None or type in models_by_type]
 
-    def getEntityById(self, id: str):
-        entity = pd.DataFrame(columns=["id"])
-        for query_processor in self.queryProcessors:
-            data = query_processor.getEntityById(id)
-            if data is not None and not data.empty:
-                entity = pd.merge(entity, data, on='id', how='outer')
-        if entity.empty:
-            return None
-        if "type" in entity.columns:
-            return self.convert_dataframe_to_list(entity)[0]
-        elif "motivation" in entity.columns:
-            entity = entity.to_dict()
-            return Annotation(
-                id=entity.get("id", {}).get(0),
-                motivation=entity.get("motivation", {}).get(0),
-                body=Image(id=entity.get("body", {}).get(0)),
-                target=IdentifiableEntity(id=entity.get("target", {}).get(0)),
-            )
+    @staticmethod
+    def column(dataframe: pd.DataFrame, name: str) -> list:
+        """It returns the values of the input column of the dataframe as a list, using None for missing values
+        and for all the rows when the column does not exist."""
+        if name not in dataframe.columns:
+            return [None] * len(dataframe)
+        values = dataframe[name]
+        if values.hasnans:
+            values = values.astype(object).where(values.notna(), None)
+        return values.tolist()
 
-        return None
+    def to_result(self, dataframe: pd.DataFrame, build, mode: str = None):
+        """It returns the input dataframe according to the input result mode (or to resultMode, if it is None):
+        as it is, as a pyarrow Table or, by default, as the list of objects created by the function build."""
+        mode = mode or self.resultMode
+        if mode == "objects":
+            return build(dataframe)
+        dataframe = dataframe.reset_index(drop=True).convert_dtypes()
+        if mode == "arrow":
+            try:
+                import pyarrow
+            except ImportError:
+                raise ImportError("the result mode \"arrow\" requires the package pyarrow")
+            return pyarrow.Table.from_pandas(dataframe, preserve_index=False)
+        return dataframe
+
+    @cached
+    def getEntityById(self, id: str, mode: str = None):
+        view_qp = self.find_entity_view()
+        if view_qp is not None:
+            entity = self.run_query(view_qp, "getViewEntityById", id)
+            # the annotations are not in the view
+            if not entity.empty:
+                return self.build_entity([entity], mode)
+        requests = [self.submit(query_processor, "getEntityById", id) for query_processor in self.queryProcessors]
+        return self.build_entity([request.result() for request in requests], mode)
 
-    def getAllAnnotations(self):
+    @cached
+    def getAllAnnotations(self, mode: str = None):
         """it returns a list of objects having class Annotation included in the databases accessible via the query processors."""
-        for qp in self.queryProcessors:
-            if "getAllAnnotations" in dir(qp):
-                annotations = qp.getAllAnnotations()
-        if not annotations.empty:
-            return [Annotation(
-                id=annotation["id"],
-                motivation=annotation["motivation"],
-                body=Image(id=annotation["body"]),
-                target=IdentifiableEntity(id=annotation["target"]),
-            ) for _, annotation in annotations.iterrows()]
-        return []
-
-    def getAllCanvas(self):
+        annotations = self.run_first("getAllAnnotations", ANNOTATION_COLUMNS)
+        return self.to_result(annotations, self.build_annotations, mode)
+
+    @cached
+    def getAllCanvas(self, mode: str = None):
         """it returns a list of objects having class Canvas included in the databases accessible via the query processors."""
-        canvases = pd.DataFrame()
-        for qp in self.queryProcessors:
-            if "getAllCanvases" in dir(qp):
-                canvases = qp.getAllCanvases()
-                return [Canvas(
-                    id=canvas["id"],
-                    label=canvas.get("label"),
-                    title=canvas.get("title"),
-                ) for _, canvas in canvases.iterrows()]
-
-    def getAllImages(self):
+        canvases = self.run_first("getAllCanvases", CANVAS_COLUMNS)
+        return self.to_result(canvases, self.build_canvases, mode)
+
+    @cached
+    def getAllImages(self, mode: str = None):
         """it returns a list of objects having class Image included in the databases accessible via the query processors."""
-        for qp in self.queryProcessors:
-            if "getAllImages" in dir(qp):
-                images = qp.getAllImages()
-                return [Image(
-                    id=image["body"],
-                ) for _, image in images.iterrows()]
+        images = self.run_first("getAllImages", ["body"])
+        return self.to_result(images, self.build_images, mode)
+
+    @traced
+    def iterAllAnnotations(self, mode: str = None, chunk_size: int = None):
+        """it yields the objects having class Annotation included in the databases accessible via the query processors,
+        in lists of at most chunk_size objects (chunkSize if None) read from the database while they are consumed,
+        so that the memory used does not depend on the number of annotations. With the result modes "dataframe"
+        and "arrow", it yields data frames or pyarrow Tables."""
+        for annotations in self.iter_first("iterAllAnnotations", chunk_size or self.chunkSize):
+            if not annotations.empty:
+                yield self.to_result(annotations, self.build_annotations, mode)
+
+    @traced
+    def iterAllCanvas(self, mode: str = None, chunk_size: int = None):
+        """it yields the objects having class Canvas included in the databases accessible via the query processors,
+        in lists of the canvases read by each query, of at most chunk_size canvases (chunkSize if None)."""
+        for canvases in self.iter_first("iterAllCanvases", chunk_size or self.chunkSize):
+            yield self.to_result(canvases, self.build_canvases, mode)
 
-    def getAllManifests(self):
+    @traced
+    def iterAllImages(self, mode: str = None, chunk_size: int = None):
+        """it yields the objects having class Image included in the databases accessible via the query processors,
+        in lists of at most chunk_size objects (chunkSize if None) read from the database while they are consumed."""
+        for images in self.iter_first("iterAllImages", chunk_size or self.chunkSize):
+            if not images.empty:
+                yield self.to_result(images, self.build_images, mode)
+
+    @cached
+    def getAllManifests(self, mode: str = None, prefetch: bool = None):
         """it returns a list of objects having class Manifest included in the databases accessible via the query processors."""
-        for qp in self.queryProcessors:
-            if "getAllManifests" in dir(qp):
-                manifests = qp.getAllManifests()
-            else:
-                relational = qp
-        return [Manifest(
-            id=manifest["id"],
-            label=manifest.get("label"),
-            title=relational.getEntityById(manifest["id"]).loc[0, "title"],
-            creators=relational.getEntityById(manifest["id"]).loc[0, "creator"],
-            list_of_canvas=self.getCanvasesInManifest(manifest["id"]),
-        ) for _, manifest in manifests.iterrows()]
-
-    def getAnnotationsToCanvas(self, canvas_id: str):
+        triple_qp = self.find_query_processor("getAllManifests")
+        relational_qp = self.find_query_processor("getEntitiesWithTitle")
+        if triple_qp is None:
+            return self.to_result(pd.DataFrame(columns=ENTITY_COLUMNS), self.build_manifests, mode)
+        prefetch = (mode or self.resultMode) == "objects" and self.prefetch(prefetch)
+        # the canvases are retrieved while the manifests and their metadata are
+        canvases = self.submit(triple_qp, "getAllCanvasesWithManifest") if prefetch else None
+        manifests = self.run_query(triple_qp, "getAllManifests")
+        manifests = self.add_metadata(manifests, self.get_metadata(relational_qp, manifests["id"]))
+        if (mode or self.resultMode) != "objects":
+            return self.to_result(manifests, None, mode)
+        if not prefetch:
+            return self.build_manifests(manifests)
+        canvases = canvases.result()
+        return self.build_manifests(manifests, self.group_items(canvases, "manifest", self.build_canvases))
+
+    # the getAnnotationsTo methods are not cached themselves, they use the results cached by getAnnotationsWithTarget
+    @traced
+    def getAnnotationsToCanvas(self, canvas_id: str, mode: str = None):
         """it returns a list of objects having class Annotation, included in the databases
         accessible via the query processors, that have, as annotation target, the canvas specified by the input identifier."""
-        for qp in self.queryProcessors:
-            if "getAnnotationsWithTarget" in dir(qp):
-                annotation = qp.getAnnotationsWithTarget(canvas_id)
-                return [Annotation(
-                    id=annotation["id"],
-                    motivation=annotation["motivation"],
-                    body=Image(id=annotation["body"]),
-                    target=IdentifiableEntity(id=annotation["target"]),
-                ) for _, annotation in annotation.iterrows()]
-
-    def getAnnotationsToCollection(self, collection_id: str):
+        return self.getAnnotationsWithTarget(canvas_id, mode)
+
+    @traced
+    def getAnnotationsToCollection(self, collection_id: str, mode: str = None):
         """it returns a list of objects having class Annotation, included in the databases accessible
         via the query processors, that have, as annotation target, the collection specified by the input identifier."""
-        annotation_data = pd.DataFrame()
-        for qp in self.queryProcessors:
-            if "getAnnotationsWithTarget" in dir(qp):
-                collection = qp.getAnnotationsWithTarget(collection_id)
-                annotation_data = pd.concat([annotation_data, collection], ignore_index=True)
+        return self.getAnnotationsWithTarget(collection_id, mode)
 
-        return [Annotation(
-            id=annotation["id"],
-            motivation=annotation["motivation"],
-            body=Image(id=annotation["body"]),
-            target=IdentifiableEntity(id=annotation["target"]),
-        ) for _, annotation in annotation_data.iterrows()]
-
-    def getAnnotationsToManifest(self, manifest_id: str):
+    @traced
+    def getAnnotationsToManifest(self, manifest_id: str, mode: str = None):
         """it returns a list of objects having class Annotation, included in the databases accessible
         via the query processors, that have, as annotation target, the manifest specified by the input identifier."""
-        manifest_data = pd.DataFrame()
-        for qp in self.queryProcessors:
-            if "getAnnotationsWithTarget" in dir(qp):
-                manifest = qp.getAnnotationsWithTarget(manifest_id)
-                manifest_data = pd.concat([manifest_data, manifest], ignore_index=True)
-        return [Annotation(
-            id=annotation["id"],
-            motivation=annotation["motivation"],
-            body=Image(id=annotation["body"]),
-            target=IdentifiableEntity(id=annotation["target"]),
-        ) for _, annotation in manifest_data.iterrows()]
+        return self.getAnnotationsWithTarget(manifest_id, mode)
 
-    def getAnnotationsWithBody(self, id: str):
+    @cached
+    def getAnnotationsWithBody(self, id: str, mode: str = None):
         """it returns a list of objects having class Annotation, included in the databases accessible
         via the query processors, that have, as annotation body, the entity specified by the input identifier."""
-        for qp in self.queryProcessors:
-            if "getAnnotationsWithBody" in dir(qp):
-                annotation = qp.getAnnotationsWithBody(id)
-                return [Annotation(
-                    id=annotation["id"],
-                    motivation=annotation["motivation"],
-                    body=Image(id=annotation["body"]),
-                    target=IdentifiableEntity(id=annotation["target"]),
-                ) for _, annotation in annotation.iterrows()]
-        return None
+        annotations = [self.submit(qp, "getAnnotationsWithBody", id) for qp in self.queryProcessors if "getAnnotationsWithBody" in dir(qp)]
+        annotations = [request.result() for request in annotations]
+        return self.to_result(self.concat(annotations), self.build_annotations, mode)
 
-    def getAnnotationsWithTarget(self, id: str):
+    @cached
+    def getAnnotationsWithTarget(self, id: str, mode: str = None):
         """it returns a list of objects having class Annotation, included in the databases accessible
         via the query processors, that have, as annotation target, the entity specified by the input identifier."""
-        for qp in self.queryProcessors:
-            if "getAnnotationsWithTarget" in dir(qp):
-                annotation = qp.getAnnotationsWithTarget(id)
-                return [Annotation(
-                    id=annotation["id"],
-                    motivation=annotation["motivation"],
-                    body=Image(id=annotation["body"]),
-                    target=IdentifiableEntity(id=annotation["target"]),
-                ) for _, annotation in annotation.iterrows()]
-        return None
+        annotations = [self.submit(qp, "getAnnotationsWithTarget", id) for qp in self.queryProcessors if "getAnnotationsWithTarget" in dir(qp)]
+        annotations = [request.result() for request in annotations]
+        return self.to_result(self.concat(annotations), self.build_annotations, mode)
 
-    def getAnnotationsWithBodyAndTarget(self, body: str, target: str):
+    @cached
+    def getAnnotationsWithBodyAndTarget(self, body: str, target: str, mode: str = None):
         """it returns a list of objects having class Annotation, included in the databases accessible
         via the query processors, that have, as annotation body and annotation target, the entities specified by the input identifiers."""
-        for qp in self.queryProcessors:
-            if "getAnnotationsWithBodyAndTarget" in dir(qp):
-                annotation = qp.getAnnotationsWithBodyAndTarget(body, target)
-                return [Annotation(
-                    id=annotation["id"],
-                    motivation=annotation["motivation"],
-                    body=Image(id=annotation["body"]),
-                    target=IdentifiableEntity(id=annotation["target"]),
-                ) for _, annotation in annotation.iterrows()]
-        return None
+        annotations = [self.submit(qp, "getAnnotationsWithBodyAndTarget", body, target)
+                       for qp in self.queryProcessors if "getAnnotationsWithBodyAndTarget" in dir(qp)]
+        annotations = [request.result() for request in annotations]
+        return self.to_result(self.concat(annotations), self.build_annotations, mode)
 
-    def getCanvasesInCollection(self, collection_id: str):
+    @cached
+    def getCanvasesInCollection(self, collection_id: str, mode: str = None):
         """it returns a list of objects having class Canvas, included in the databases accessible
         via the query processors, that are contained in the collection identified by the input identifier."""
-        for qp in self.queryProcessors:
-            if "getCanvasesInCollection" in dir(qp):
-                canvases = qp.getCanvasesInCollection(collection_id)
-
-        return [Canvas(
-            id=canvas["id"],
-            label=canvas.get("label"),
-            title=canvas.get("title"),
-        ) for _, canvas in canvases.iterrows()]
+        canvases = self.run_first("getCanvasesInCollection", ["manifest", "id", "label", "type", "title"], collection_id)
+        return self.to_result(canvases, self.build_canvases, mode)
 
-    def getCanvasesInManifest(self, manifest_id: str):
+    @cached
+    def getCanvasesInManifest(self, manifest_id: str, mode: str = None):
         """it returns a list of objects having class Canvas, included in the databases accessible
         via the query processors, that are contained in the manifest identified by the input identifier."""
-        for qp in self.queryProcessors:
-            if "getCanvasesInManifest" in dir(qp):
-                canvases = qp.getCanvasesInManifest(manifest_id)
-        return [Canvas(
-            id=canvas["id"],
-            label=canvas["label"],
-            title=canvas["title"],
-        ) for _, canvas in canvases.iterrows()]
-
-    def getEntitiesWithCreator(self, creator_id: str):
+        canvases = self.run_first("getCanvasesInManifest", CANVAS_COLUMNS, manifest_id)
+        return self.to_result(canvases, self.build_canvases, mode)
+
+    @cached
+    def getEntitiesWithCreator(self, creator_id: str, mode: str = None):
         """it returns a list of objects having class EntityWithMetadata, included in the databases accessible
         via the query processors, related to the entities having the input creator as one of their creators."""
-        entities = pd.DataFrame()
-        for qp in self.queryProcessors:
-            if "getEntitiesWithCreator" in dir(qp):
-                entities = qp.getEntitiesWithCreator(creator_id)
-            else:
-                triple_qp = qp
-        if not entities.empty:
-            entities["label"] = entities["id"].apply(lambda x: triple_qp.getEntityById(x).loc[0, "label"])
-            entities["type"] = entities["id"].apply(lambda x: triple_qp.getEntityById(x).loc[0, "type"])
-            return self.convert_dataframe_to_list(entities)
-        return []
-
-    def getEntitiesWithLabel(self, label: str):
+        view_qp = self.find_entity_view()
+        if view_qp is not None:
+            entities = self.run_query(view_qp, "getViewEntitiesWithCreator", creator_id)
+            return self.to_result(entities, self.convert_dataframe_to_list, mode)
+        relational_qp = self.find_query_processor("getEntitiesWithCreator")
+        triple_qp = self.find_query_processor("getEntitiesWithLabel")
+        if relational_qp is None:
+            return self.to_result(pd.DataFrame(columns=ENTITY_TYPE_COLUMNS), self.convert_dataframe_to_list, mode)
+        entities = self.run_query(relational_qp, "getEntitiesWithCreator", creator_id)
+        entities = self.get_types_and_labels(triple_qp, entities)
+        return self.to_result(entities, self.convert_dataframe_to_list, mode)
+
+    @cached
+    def getEntitiesWithLabel(self, label: str, mode: str = None):
         """it returns a list of objects having class EntityWithMetadata, included in the databases accessible
         via the query processors, related to the entities having, as label, the input label."""
-        entities = pd.DataFrame()
-        for qp in self.queryProcessors:
-            if "getEntitiesWithLabel" in dir(qp):
-                entities = qp.getEntitiesWithLabel(label)
-            else:
-                relational_qp = qp
-        if not entities.empty:
-            entities["title"] = entities["id"].apply(lambda x: relational_qp.getEntityById(x).loc[0, "title"])
-            entities["creator"] = entities["id"].apply(lambda x: relational_qp.getEntityById(x).loc[0, "creator"])
-            return self.convert_dataframe_to_list(entities)
-        return []
-
-    def getEntitiesWithTitle(self, title: str) -> List[EntityWithMetadata]:
+        view_qp = self.find_entity_view()
+        if view_qp is not None:
+            entities = self.run_query(view_qp, "getViewEntitiesWithLabel", label)
+            return self.to_result(entities, self.convert_dataframe_to_list, mode)
+        relational_qp = self.find_query_processor("getEntitiesWithTitle")
+        triple_qp = self.find_query_processor("getEntitiesWithLabel")
+        if triple_qp is None:
+            return self.to_result(pd.DataFrame(columns=ENTITY_TYPE_COLUMNS), self.convert_dataframe_to_list, mode)
+        entities = self.run_query(triple_qp, "getEntitiesWithLabel", label)
+        entities = self.add_metadata(entities, self.get_metadata(relational_qp, entities["id"]))
+        return self.to_result(entities, self.convert_dataframe_to_list, mode)
+
+    @cached
+    def getEntitiesWithTitle(self, title: str, mode: str = None) -> List[EntityWithMetadata]:
         """it returns a list of objects having class EntityWithMetadata, included in the databases accessible
         via the query processors, related to the entities having, as title, the input title."""
-        entities = pd.DataFrame()
-        for qp in self.queryProcessors:
-            if "getEntitiesWithTitle" in dir(qp):
-                entities = qp.getEntitiesWithTitle(title)
-            else:
-                triple_qp = qp
-        if not entities.empty:
-            entities["label"] = entities["id"].apply(lambda x: triple_qp.getEntityById(x).loc[0, "label"])
-            entities["type"] = entities["id"].apply(lambda x: triple_qp.getEntityById(x).loc[0, "type"])
-            return self.convert_dataframe_to_list(entities)
-        return []
-
-    def getImagesAnnotatingCanvas(self, canvas_id: str):
+        view_qp = self.find_entity_view()
+        if view_qp is not None:
+            entities = self.run_query(view_qp, "getViewEntitiesWithTitle", title)
+            return self.to_result(entities, self.convert_dataframe_to_list, mode)
+        relational_qp = self.find_query_processor("getEntitiesWithTitle")
+        triple_qp = self.find_query_processor("getEntitiesWithLabel")
+        if relational_qp is None:
+            return self.to_result(pd.DataFrame(columns=ENTITY_TYPE_COLUMNS), self.convert_dataframe_to_list, mode)
+        entities = self.run_query(relational_qp, "getEntitiesWithTitle", title)
+        entities = self.get_types_and_labels(triple_qp, entities)
+        return self.to_result(entities, self.convert_dataframe_to_list, mode)
+
+    @cached
+    def getImagesAnnotatingCanvas(self, canvas_id: str, mode: str = None):
         """it returns a list of objects having class Image, included in the databases accessible
         via the query processors, that are body of the annotations targetting the canvases specified by the input identifier."""
-        for qp in self.queryProcessors:
-            if "getAnnotationsWithTarget" in dir(qp):
-                canvases = qp.getAnnotationsWithTarget(canvas_id)
-                canvases = canvases.to_dict("records")
-                return [Image(id=canvas["body"]) for canvas in canvases]
+        annotations = self.run_first("getAnnotationsWithTarget", ANNOTATION_COLUMNS, canvas_id)
+        return self.to_result(annotations[["body"]], self.build_images, mode)
 
-    def getManifestsInCollection(self, collection_id: str):
+    @cached
+    def getManifestsInCollection(self, collection_id: str, mode: str = None, prefetch: bool = None):
         """it returns a list of objects having class Manifest, included in the databases accessible
         via the query processors, that are contained in the collection identified by the input identifier."""
-        for qp in self.queryProcessors:
-            if "getManifestsInCollection" in dir(qp):
-                manifests = qp.getManifestsInCollection(collection_id)
-            else:
-                relational_qp = qp
-        return [Manifest(
-            id=manifest["id"],
-            label=manifest.get("label"),
-            title=relational_qp.getEntityById(manifest["id"]).loc[0, "title"],
-            creators=relational_qp.getEntityById(manifest["id"]).loc[0, "creator"],
-            list_of_canvas=self.getCanvasesInManifest(manifest["id"]),
-        ) for _, manifest in manifests.iterrows()]
-
-    def getAllCollections(self):
+        triple_qp = self.find_query_processor("getManifestsInCollection")
+        relational_qp = self.find_query_processor("getEntitiesWithTitle")
+        if triple_qp is None:
+            return self.to_result(pd.DataFrame(columns=["id", "label", "type", "title", "creator"]), self.build_manifests, mode)
+        prefetch = (mode or self.resultMode) == "objects" and self.prefetch(prefetch)
+        canvases = self.submit(triple_qp, "getCanvasesInCollection", collection_id) if prefetch else None
+        manifests = self.run_query(triple_qp, "getManifestsInCollection", collection_id)
+        manifests = self.add_metadata(manifests, self.get_metadata(relational_qp, manifests["id"]))
+        if (mode or self.resultMode) != "objects":
+            return self.to_result(manifests, None, mode)
+        if not prefetch:
+            return self.build_manifests(manifests)
+        canvases = canvases.result()
+        return self.build_manifests(manifests, self.group_items(canvases, "manifest", self.build_canvases))
+
+    @cached
+    def getAncestors(self, id: str, mode: str = None) -> List[EntityWithMetadata]:
+        """it returns a list of objects having class EntityWithMetadata, included in the databases accessible
+        via the query processors, that contain, directly or not, the entity specified by the input identifier
+        (e.g. the manifest and the collection containing a canvas)."""
+        triple_qp = self.find_query_processor("getAncestors")
+        relational_qp = self.find_query_processor("getEntitiesWithTitle")
+        if triple_qp is None:
+            return self.to_result(pd.DataFrame(columns=ENTITY_TYPE_COLUMNS), self.convert_dataframe_to_list, mode)
+        ancestors = self.run_query(triple_qp, "getAncestors", id)
+        ancestors = self.add_metadata(ancestors, self.get_metadata(relational_qp, ancestors["id"]))
+        return self.to_result(ancestors, self.convert_dataframe_to_list, mode)
+
+    @cached
+    def getAllCollections(self, mode: str = None, prefetch: bool = None):
         """it returns a list of objects having class Collection included in the databases accessible via the query processors."""
-        collections = pd.DataFrame()
+        triple_qp = self.find_query_processor("getAllCollections")
+        relational_qp = self.find_query_processor("getEntitiesWithTitle")
+        if triple_qp is None:
+            return self.to_result(pd.DataFrame(columns=ENTITY_COLUMNS), self.build_collections, mode)
+        if (mode or self.resultMode) != "objects" or not self.prefetch(prefetch):
+            collections = self.run_query(triple_qp, "getAllCollections")
+            collections = self.add_metadata(collections, self.get_metadata(relational_qp, collections["id"]))
+            if (mode or self.resultMode) != "objects":
+                return self.to_result(collections, None, mode)
+            return self.build_collections(collections)
+        canvases = self.submit(triple_qp, "getAllCanvasesWithManifest")
+        collections = self.submit(triple_qp, "getAllCollections")
+        manifests = self.submit(triple_qp, "getAllManifestsWithCollection")
+        collections, manifests = collections.result(), manifests.result()
+        metadata = self.get_metadata(relational_qp, pd.concat([collections["id"], manifests["id"]]))
+        canvases = canvases.result()
+        return self.build_collections(collections, metadata, manifests, canvases)
+
+    def find_query_processor(self, method: str):
+        """It returns the first QueryProcessor object of the list queryProcessors having the input method."""
         for qp in self.queryProcessors:
-            if "getAllCollections" in dir(qp):
-                collections = qp.getAllCollections()
-            else:
-                relational_qp = qp
+            if method in dir(qp):
+                return qp
+        return None
+
+    def run_first(self, method: str, columns: list, *args) -> pd.DataFrame:
+        """It runs the input sub-query on the first query processor having the input method, and returns
+        an empty data frame with the input columns if there is none (e.g. canvases without a triplestore)."""
+        query_processor = self.find_query_processor(method)
+        if query_processor is None:
+            return pd.DataFrame(columns=columns)
+        return self.run_query(query_processor, method, *args)
+
+    def iter_first(self, method: str, *args):
+        """It returns the iterator of the input method of the first query processor having it,
+        or an empty one if there is none."""
+        query_processor = self.find_query_processor(method)
+        if query_processor is None:
+            return iter(())
+        return getattr(query_processor, method)(*args)
+
+    def submit(self, query_processor, method: str, *args) -> Future:
+        """It sends the input sub-query (the method of the query processor called with the input arguments)
+        to the threads of the processor, and returns the Future of its result. With maxWorkers equal to 1,
+        the sub-query is run immediately in the current thread."""
+        if self.maxWorkers <= 1:
+            request = Future()
+            try:
+                request.set_result(self.run_query(query_processor, method, *args))
+            except Exception as error:
+                request.set_exception(error)
+            return request
+        with _executor_lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(self.maxWorkers, thread_name_prefix="GenericQueryProcessor")
+        # the thread records the queries under the get method being run (see traced)
+        return self.executor.submit(copy_context().run, self.run_query, query_processor, method, *args)
+
+    def run_query(self, query_processor, method: str, *args):
+        """It runs the input sub-query in the current thread, waiting while maxQueriesPerDatabase sub-queries
+        are already running on the same database."""
+        store = store_key(query_processor.getDbPathOrUrl())
+        with _executor_lock:
+            if self.semaphores is None:
+                self.semaphores = {}
+            if store not in self.semaphores:
+                self.semaphores[store] = threading.BoundedSemaphore(self.maxQueriesPerDatabase)
+            semaphore = self.semaphores[store]
+        with semaphore:
+            return getattr(query_processor, method)(*args)
+
+    def get_metadata(self, relational_qp, ids) -> pd.DataFrame:
+        """It returns the metadata of the entities matching the input identifiers, read by the input query processor
+        of the relational database, or no metadata if there is no such processor (or no identifier)."""
+        if relational_qp is None or len(ids) == 0:
+            return pd.DataFrame(columns=METADATA_COLUMNS)
+        return self.run_query(relational_qp, "getEntitiesByIds", ids)
+
+    def get_types_and_labels(self, triple_qp, entities: pd.DataFrame) -> pd.DataFrame:
+        """It adds to the input dataframe of entities their type and label, read by the input query processor
+        of the triplestore, or no type and label if there is no such processor."""
+        if triple_qp is None:
+            return entities.assign(type=None, label=None)
+        return self.add_types_and_labels(entities, self.run_query(triple_qp, "getEntitiesByIds", entities["id"]))
+
+    def find_entity_view(self):
+        """It returns the query processor of the relational database containing the entity view,
+        if the entity view is used, and None otherwise."""
+        if not self.useEntityView:
+            return None
+        view_qp = self.find_query_processor("getViewEntityById")
+        if view_qp is None or not view_qp.hasEntityView():
+            return None
+        return view_qp
+
+    def prefetch(self, prefetch: bool = None) -> bool:
+        """It returns whether the items of manifests and collections are retrieved with them,
+        according to the input parameter or, if it is None, to prefetchItems."""
+        return self.prefetchItems if prefetch is None else prefetch
+
+    @staticmethod
+    def concat(dataframes: List[pd.DataFrame]) -> pd.DataFrame:
+        """It concatenates the input dataframes returned by the query processors."""
+        if not dataframes:
+            return pd.DataFrame()
+        return pd.concat(dataframes, ignore_index=True)
+
+    def build_entity(self, results: List[pd.DataFrame], mode: str = None):
+        """It merges the input data frames returned by the query processors for the same identifier,
+        and returns the entity they describe according to the input result mode (None if there is no such entity)."""
+        entity = pd.DataFrame(columns=["id"])
+        for data in results:
+            if data is not None and not data.empty:
+                entity = pd.merge(entity, data, on='id', how='outer')
+        if (mode or self.resultMode) != "objects":
+            return self.to_result(entity, None, mode)
+        if entity.empty:
+            return None
+        if "type" in entity.columns:
+            entities = self.convert_dataframe_to_list(entity)
+            return entities[0] if entities else None
+        elif "motivation" in entity.columns:
+            return self.build_annotations(entity)[0]
+
+        return None
+
+    def build_annotations(self, annotations: pd.DataFrame) -> List[Annotation]:
+        """It converts the input dataframe of annotations into a list of Annotation objects."""
+        if annotations.empty:
+            return []
+        return [Annotation(
+            id=id,
+            motivation=motivation,
+            body=body,
+            target=target,
+        ) for id, motivation, body, target in zip(*[
+            self.column(annotations, name) for name in ("id", "motivation", "body", "target")])]
+
+    @staticmethod
+    def build_images(images: pd.DataFrame) -> List[Image]:
+        """It converts the input dataframe of images (with the column body) into a list of Image objects."""
+        return [Image(id=body) for body in images["body"].tolist()]
+
+    def build_canvases(self, canvases: pd.DataFrame) -> List[Canvas]:
+        """It converts the input dataframe of canvases (with columns id, label and title) into a list of Canvas objects."""
+        return [Canvas(id=id, label=label, title=title) for id, label, title in zip(*[
+            self.column(canvases, name) for name in ("id", "label", "title")])]
+
+    @staticmethod
+    def group_items(items: pd.DataFrame, parent: str, build) -> dict:
+        """It groups the rows of the input dataframe by the identifier in the column parent,
+        and returns a dictionary mapping each identifier to the list of objects created by build from its rows."""
+        if items.empty:
+            return {}
+        return {id: build(group) for id, group in items.groupby(parent, sort=False, observed=True)}
+
+    @staticmethod
+    def add_metadata(entities: pd.DataFrame, metadata: pd.DataFrame) -> pd.DataFrame:
+        """It adds to the input dataframe of entities the title and the creator included in the input metadata,
+        using None for the entities having no metadata."""
+        entities = entities.drop(columns=["title", "creator"], errors="ignore")
+        entities = entities.merge(metadata[["id", "title", "creator"]], on="id", how="left")
+        return entities.astype(object).where(entities.notna(), None)
+
+    @staticmethod
+    def add_types_and_labels(entities: pd.DataFrame, types_and_labels: pd.DataFrame) -> pd.DataFrame:
+        """It adds to the input dataframe of entities their type and label, included in the input dataframe returned
+        by getEntitiesByIds of the triplestore, dropping the entities that are not included in the triplestore."""
+        types_and_labels = types_and_labels.drop_duplicates("id")
+        return entities.merge(types_and_labels[["id", "type", "label"]], on="id", how="inner")
+
+    def build_manifests(self, manifests: pd.DataFrame, canvases_in_manifest: dict = None) -> List[Manifest]:
+        """It assembles the list of Manifest objects from the input dataframe of manifests, including their metadata,
+        and the dictionary mapping the identifier of each manifest to the list of its canvases.
+        Without the dictionary, the canvases of each manifest are retrieved the first time they are read."""
+        loader = None
+        if canvases_in_manifest is None:
+            canvases_in_manifest = {}
+            loader = partial(self.getCanvasesInManifest, mode="objects")
+        return [Manifest(
+            id=id,
+            label=label,
+            title=title,
+            creators=creator,
+            list_of_canvas=canvases_in_manifest.get(id, None if loader else []),
+            items_loader=loader,
+        ) for id, label, title, creator in zip(
+            manifests["id"], manifests["label"], manifests["title"], manifests["creator"])]
+
+    def build_collections(self, collections: pd.DataFrame, metadata: pd.DataFrame = None,
+                          manifests: pd.DataFrame = None, canvases: pd.DataFrame = None) -> List[Collection]:
+        """It assembles the list of Collection objects from the input dataframes of collections, of the metadata
+        of collections and manifests, of their manifests (identifying the collection containing them in the column
+        collection) and of their canvases (identifying the manifest containing them in the column manifest).
+        With the collections alone, already including their metadata, the manifests of each collection
+        are retrieved the first time they are read."""
+        if manifests is None:
+            loader = partial(self.getManifestsInCollection, mode="objects")
+            return [Collection(id=id, label=label, title=title, creators=creator, items_loader=loader)
+                    for id, label, title, creator in zip(
+                        collections["id"], collections["label"], collections["title"], collections["creator"])]
+        collections = self.add_metadata(collections, metadata)
+        canvases_in_manifest = self.group_items(canvases, "manifest", self.build_canvases)
+        manifests_in_collection = self.group_items(
+            self.add_metadata(manifests, metadata), "collection",
+            lambda group: self.build_manifests(group, canvases_in_manifest))
         return [Collection(
-            id=collection["id"],
-            label=collection.get("label"),
-            title=collection.get("title"),
-            creators=relational_qp.getEntityById(collection["id"]).to_dict().get("creator", {}).get(0, []),
-            list_of_manifests=self.getManifestsInCollection(collection["id"]),
-        ) for _, collection in collections.iterrows()]
+            id=id,
+            label=label,
+            title=title,
+            creators=creator,
+            list_of_manifests=manifests_in_collection.get(id, []),
+        ) for id, label, title, creator in zip(
+            collections["id"], collections["label"], collections["title"], collections["creator"])]
@@ -0,0 +1,204 @@
+# the functions reading IIIF collections incrementally, without loading the whole JSON file in memory
+# iter_json_events, iter_collection_triples
+
+import codecs
+import json
+import re
+from json.decoder import scanstring
+
+from rdflib import RDF, Literal, URIRef
+from rdflib.namespace import RDFS
+
+try:
+    # the C backend of ijson, when installed, parses the file much faster than the fallback below
+    import ijson
+except ImportError:
+    ijson = None
+
+
+all = [
+    "iter_collection_triples",
+    "iter_json_events",
+]
+
+IIIF_TYPES = {
+    "Collection": URIRef("http://iiif.io/api/presentation/3#Collection"),
+    "Manifest": URIRef("http://iiif.io/api/presentation/3#Manifest"),
+    "Canvas": URIRef("http://iiif.io/api/presentation/3#Canvas"),
+}
+HAS_ITEM = URIRef("http://iiif.io/api/presentation/3#hasItem")
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+NUMBER = re.compile(r"-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][-+]?[0-9]+)?")
+CONSTANTS = {"true": ("boolean", True), "false": ("boolean", False), "null": ("null", None)}
+
+
+def iter_json_events(file, chunk_size: int = 65536):
+    """it parses the input binary file incrementally and yields a tuple (prefix, event, value) for each JSON token,
+    with the same prefixes and events of ijson.parse (e.g. ("items.item.id", "string", "https://...")).
+    The file is read chunk_size bytes at a time, so the memory used does not depend on the size of the file."""
+    if ijson is not None:
+        yield from ijson.parse(file)
+        return
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    position = 0
+    eof = False
+    # every open container is a list [kind, prefix, key], where key is the last key read in a map
+    stack = []
+    expect_key = False
+
+    def value_prefix():
+        if not stack:
+            return ""
+        kind, prefix, key = stack[-1]
+        child = "item" if kind == "array" else key
+        return f"{prefix}.{child}" if prefix else child
+
+    while True:
+        match = WHITESPACE.match(buffer, position)
+        position = match.end()
+        if position >= len(buffer) - 64 and not eof:
+            # keep enough text in the buffer to read any token but the longest strings and numbers
+            chunk = file.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[position:] + decoder.decode(chunk, final=eof)
+            position = 0
+            continue
+        if position >= len(buffer):
+            if stack:
+                raise json.JSONDecodeError("Unexpected end of file", buffer, position)
+            return
+        char = buffer[position]
+        if char in ",:":
+            position += 1
+            continue
+        if char == "}" or char == "]":
+            kind, prefix, _ = stack.pop()
+            position += 1
+            yield prefix, "end_map" if kind == "map" else "end_array", None
+            expect_key = bool(stack) and stack[-1][0] == "map"
+            continue
+        if char == "{":
+            prefix = value_prefix()
+            stack.append(["map", prefix, None])
+            position += 1
+            expect_key = True
+            yield prefix, "start_map", None
+            continue
+        if char == "[":
+            prefix = value_prefix()
+            stack.append(["array", prefix, None])
+            position += 1
+            expect_key = False
+            yield prefix, "start_array", None
+            continue
+        if char == '"':
+            try:
+                value, end = scanstring(buffer, position + 1)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                # the string continues in the next chunk
+                chunk = file.read(chunk_size)
+                eof = not chunk
+                buffer = buffer[position:] + decoder.decode(chunk, final=eof)
+                position = 0
+                continue
+            position = end
+            if expect_key:
+                stack[-1][2] = value
+                expect_key = False
+                yield stack[-1][1], "map_key", value
+            else:
+                yield value_prefix(), "string", value
+                expect_key = bool(stack) and stack[-1][0] == "map"
+            continue
+        match = NUMBER.match(buffer, position)
+        if match is not None:
+            if match.end() == len(buffer) and not eof:
+                chunk = file.read(chunk_size)
+                eof = not chunk
+                buffer = buffer[position:] + decoder.decode(chunk, final=eof)
+                position = 0
+                continue
+            text = match.group()
+            position = match.end()
+            value = float(text) if any(c in text for c in ".eE") else int(text)
+            yield value_prefix(), "number", value
+            expect_key = bool(stack) and stack[-1][0] == "map"
+            continue
+        for constant, (event, value) in CONSTANTS.items():
+            if buffer.startswith(constant, position):
+                position += len(constant)
+                yield value_prefix(), event, value
+                expect_key = bool(stack) and stack[-1][0] == "map"
+                break
+        else:
+            raise json.JSONDecodeError("Unexpected character", buffer, position)
+
+
+class _Node():
+    """A Collection, Manifest or Canvas being read: its triples are emitted as soon as its id and type are known."""
+
+    def __init__(self, prefix: str, parent):
+        self.prefix = prefix
+        self.parent = parent
+        self.id = None
+        self.type = None
+        self.label = None
+        self.emitted = False
+        self.has_label = False
+        base = f"{prefix}." if prefix else ""
+        self.items = base + "items.item"
+        self.fields = {base + "id": "id", base + "type": "type", base + "label.none.item": "label"}
+        # the children read before the identifier of the node, linked to it once the identifier is known
+        self.pending_children = []
+
+    def triples(self):
+        """it returns the triples of the node that can be emitted with the data read so far."""
+        if self.id is None or self.type not in IIIF_TYPES:
+            return []
+        subject = URIRef(self.id)
+        triples = []
+        if not self.emitted:
+            self.emitted = True
+            triples.append((subject, RDF.type, IIIF_TYPES[self.type]))
+            if self.parent is not None:
+                triples.extend(self.parent.link(subject))
+        if self.label is not None:
+            triples.append((subject, RDFS.label, Literal(self.label)))
+            self.label = None
+        for child in self.pending_children:
+            triples.append((subject, HAS_ITEM, child))
+        self.pending_children = []
+        return triples
+
+    def link(self, child: URIRef):
+        """it returns the hasItem triple linking the node to the input child, if the node has been emitted."""
+        if self.emitted:
+            return [(URIRef(self.id), HAS_ITEM, child)]
+        self.pending_children.append(child)
+        return []
+
+
+def iter_collection_triples(file):
+    """it yields the triples describing the Collection in the input binary file containing IIIF JSON,
+    i.e. the type and the label of the collection and of the manifests and canvases it contains, and the hasItem
+    relations between them, as the file is read, keeping in memory only the entities currently open."""
+    node = None
+    for prefix, event, value in iter_json_events(file):
+        if event == "start_map" and (node is None and prefix == "" or node is not None and prefix == node.items):
+            node = _Node(prefix, node)
+        elif node is None:
+            continue
+        elif event == "end_map" and prefix == node.prefix:
+            node = node.parent
+        elif event == "string" and prefix in node.fields:
+            field = node.fields[prefix]
+            if field == "label":
+                if node.has_label:
+                    continue
+                node.has_label = True
+            setattr(node, field, value)
+            yield from node.triples()
@@ -0,0 +1,217 @@
+# the instrumentation of the processors: the records of the queries sent to the databases and of the uploads,
+# grouped under the get method of GenericQueryProcessor that caused them
+# Instrumentation, MetricsCollector, QueryRecord, current_operation, operation, traced
+
+import asyncio
+import inspect
+import threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from functools import wraps
+
+import pandas as pd
+
+
+all = [
+    "Instrumentation",
+    "MetricsCollector",
+    "QueryRecord",
+    "current_operation",
+    "operation",
+    "traced",
+]
+
+# the get method of GenericQueryProcessor being run, inherited by the threads and the tasks running its sub-queries
+_operation = ContextVar("operation", default=None)
+# the columns of the summary returned by MetricsCollector.getSummary
+SUMMARY_COLUMNS = ["operation", "backend", "queries", "errors", "rows", "bytes", "seconds",
+                   "p50", "p90", "p95", "p99", "max"]
+
+
+def current_operation() -> str:
+    """it returns the name of the get method of GenericQueryProcessor being run, or None if there is none."""
+    return _operation.get()
+
+
+@contextmanager
+def operation(name: str):
+    """it records the queries sent in its body under the input operation, unless they are already recorded
+    under another one (e.g. getAnnotationsToCanvas, which runs getAnnotationsWithTarget)."""
+    if _operation.get() is not None:
+        yield
+        return
+    token = _operation.set(name)
+    try:
+        yield
+    finally:
+        _operation.reset(token)
+
+
+def traced(method):
+    """it makes the queries sent by the input get method, coroutine or generator be recorded under its name."""
+    if asyncio.iscoroutinefunction(method):
+        @wraps(method)
+        async def run_coroutine(*args, **kwargs):
+            with operation(method.__name__):
+                return await method(*args, **kwargs)
+        return run_coroutine
+
+    if inspect.isgeneratorfunction(method):
+        @wraps(method)
+        def run_generator(*args, **kwargs):
+            # the generator runs in its own context, so that the operation is not set in the code consuming it
+            context = copy_context()
+            if context.run(_operation.get) is None:
+                context.run(_operation.set, method.__name__)
+            generator = context.run(method, *args, **kwargs)
+            try:
+                while True:
+                    try:
+                        item = context.run(next, generator)
+                    except StopIteration:
+                        return
+                    yield item
+            finally:
+                context.run(generator.close)
+        return run_generator
+
+    @wraps(method)
+    def run(*args, **kwargs):
+        with operation(method.__name__):
+            return method(*args, **kwargs)
+    return run
+
+
+class QueryRecord():
+    """
+        A query sent to a database: the operation (the get method of GenericQueryProcessor) that caused it,
+        the backend ("sqlite", "sparql" for a SPARQL endpoint or "rdflib" for a local triplestore), the database,
+        the text of the query, the seconds it took, the rows it returned, the bytes of the response decoded
+        (None when the rows are read directly from the database, as in SQLite) and the error it raised, if any.
+        """
+    __slots__ = ("operation", "backend", "store", "query", "seconds", "rows", "size", "error")
+
+    def __init__(self, operation: str, backend: str, store: str, query: str, seconds: float,
+                 rows: int = None, size: int = None, error: str = None):
+        self.operation = operation
+        self.backend = backend
+        self.store = store
+        self.query = query
+        self.seconds = seconds
+        self.rows = rows
+        self.size = size
+        self.error = error
+
+    def __repr__(self):
+        return f"QueryRecord({self.operation}, {self.backend}: {self.rows} rows in {self.seconds:.4f}s)"
+
+
+class Instrumentation():
+    """
+        The base class of the instrumentation hooks given to the processors (see Processor.setInstrumentation).
+        Its methods are called, possibly by several threads at the same time, for every query sent
+        to the database and at the end of every upload, and do nothing: the subclasses override them.
+        """
+
+    def recordQuery(self, record: QueryRecord):
+        """it is called with the QueryRecord of every query sent to the database."""
+        pass
+
+    def recordUpload(self, backend: str, store: str, report):
+        """it is called with the UploadReport of every upload in the database."""
+        pass
+
+
+class MetricsCollector(Instrumentation):
+    """
+        The instrumentation keeping in memory the last maxRecords query records, summarized by operation
+        and backend with the percentiles of their latency (see getSummary), the counters of the uploads
+        of each backend, and the log of the last maxSlowQueries queries taking at least slowQueryThreshold seconds.
+        """
+    maxRecords = 100000
+    maxSlowQueries = 100
+    slowQueryThreshold = None
+
+    def __init__(self, slow_query_threshold: float = None, max_records: int = None):
+        if slow_query_threshold is not None:
+            self.slowQueryThreshold = slow_query_threshold
+        if max_records is not None:
+            self.maxRecords = max_records
+        self._lock = threading.Lock()
+        self.clear()
+
+    def setSlowQueryThreshold(self, seconds: float) -> bool:
+        """it sets the seconds from which a query is added to the slow-query log (None to log no query)."""
+        if seconds is not None and seconds < 0:
+            return False
+        self.slowQueryThreshold = seconds
+        return True
+
+    def clear(self) -> bool:
+        """it removes all the records, the slow-query log and the upload counters."""
+        with self._lock:
+            self.records = deque(maxlen=self.maxRecords)
+            self.slowQueries = deque(maxlen=self.maxSlowQueries)
+            self.uploads = {}
+        return True
+
+    def recordQuery(self, record: QueryRecord):
+        with self._lock:
+            self.records.append(record)
+            if self.slowQueryThreshold is not None and record.seconds >= self.slowQueryThreshold:
+                self.slowQueries.append(record)
+
+    def recordUpload(self, backend: str, store: str, report):
+        with self._lock:
+            counters = self.uploads.setdefault(backend, {
+                "uploads": 0, "rows": 0, "inserted": 0, "rejected": 0,
+                "batches": 0, "retries": 0, "errors": 0, "seconds": 0.0})
+            counters["uploads"] += 1
+            counters["rows"] += report.rows
+            counters["inserted"] += report.inserted
+            counters["rejected"] += report.rejected
+            counters["batches"] += report.batches
+            counters["retries"] += report.retries
+            counters["errors"] += report.error is not None
+            counters["seconds"] += report.seconds
+
+    def getRecords(self, operation: str = None, backend: str = None) -> list:
+        """it returns the query records of the input operation and backend (all of them if they are None)."""
+        with self._lock:
+            records = list(self.records)
+        return [record for record in records
+                if (operation is None or record.operation == operation) and (backend is None or record.backend == backend)]
+
+    def getSlowQueries(self) -> list:
+        """it returns the records of the queries taking at least slowQueryThreshold seconds, the slowest first."""
+        with self._lock:
+            records = list(self.slowQueries)
+        return sorted(records, key=lambda record: record.seconds, reverse=True)
+
+    def getUploadStatistics(self) -> dict:
+        """it returns a dictionary with the counters of the uploads of each backend."""
+        with self._lock:
+            return {backend: dict(counters) for backend, counters in self.uploads.items()}
+
+    def getSummary(self) -> pd.DataFrame:
+        """it returns a data frame with a row for every operation and backend: the number of queries and errors,
+        the rows and bytes they returned (no bytes for SQLite), their total seconds and the percentiles of their latency.
+        The queries sent outside the get methods of GenericQueryProcessor have no operation."""
+        records = self.getRecords()
+        if not records:
+            return pd.DataFrame(columns=SUMMARY_COLUMNS)
+        records = pd.DataFrame({
+            "operation": [record.operation or "" for record in records],
+            "backend": [record.backend for record in records],
+            "seconds": [record.seconds for record in records],
+            "rows": [record.rows for record in records],
+            "bytes": [record.size for record in records],
+            "errors": [record.error is not None for record in records],
+        })
+        groups = records.groupby(["operation", "backend"], sort=True)
+        summary = groups.agg(queries=("seconds", "size"), errors=("errors", "sum"), rows=("rows", "sum"),
+                             bytes=("bytes", lambda sizes: sizes.sum(min_count=1)), seconds=("seconds", "sum"), max=("seconds", "max"))
+        for percentile in (50, 90, 95, 99):
+            summary[f"p{percentile}"] = groups["seconds"].quantile(percentile / 100)
+        return summary.reset_index()[SUMMARY_COLUMNS]
@@ -19,12 +19,12 @@ met_dp.setDbPathOrUrl(rel_path)
 met_dp.uploadData("data/metadata.csv")
 
 # Then, create the RDF triplestore (remember first to run the
-# Blazegraph instance) using the related source data
+# Blazegraph instance) using the related source data - a file path,
+# such as "graph.nt", uses instead the embedded local triplestore
 grp_endpoint = "http://127.0.0.1:9999/blazegraph/sparql"
 col_dp = CollectionProcessor()
 col_dp.setDbPathOrUrl(grp_endpoint)
-col_dp.uploadData("data/collection-1.json")
-col_dp.uploadData("data/collection-2.json")
+col_dp.uploadFiles(["data/collection-1.json", "data/collection-2.json"])
 
 # In the next passage, create the query processors for both
 # the databases, using the related classes
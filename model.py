@@ -1,7 +1,25 @@
-from typing import List
+from typing import Callable, List
 
 
+def split_creators(creators: str) -> List[str]:
+    """it splits a string of creators separated by semicolons (e.g. "Doe, John; Doe, Jane") into a list."""
+    if isinstance(creators, str) and creators != "":
+        return creators.split("; ")
+    return []
+
+
+def entity_id(entity) -> str:
+    """it returns the identifier of the input entity, or the input itself if it is already an identifier."""
+    if isinstance(entity, IdentifiableEntity):
+        return entity.id
+    return entity
+
+
+# all the classes declare __slots__, so that their instances have no __dict__:
+# materializing millions of entities (e.g. all the annotations) takes a fraction of the memory
+
 class IdentifiableEntity:
+    __slots__ = ("id",)
     id: str
 
     def __init__(self, id):
@@ -12,21 +30,39 @@ class IdentifiableEntity:
 
 
 class Image(IdentifiableEntity):
-    pass
+    __slots__ = ()
 
 
 class Annotation(IdentifiableEntity):
+    # body and target are stored as identifiers, and wrapped in an entity only when they are read
+    __slots__ = ("motivation", "body_id", "target_id")
     motivation: str
-    body: Image
-    target: str
+    body_id: str
+    target_id: str
 
     def __init__(self, id, motivation, body, target):
         self.motivation = motivation
-        self.target = target
-        self.body = body
+        self.body_id = entity_id(body)
+        self.target_id = entity_id(target)
 
         super().__init__(id)
 
+    @property
+    def body(self) -> Image:
+        return Image(self.body_id)
+
+    @body.setter
+    def body(self, body):
+        self.body_id = entity_id(body)
+
+    @property
+    def target(self) -> IdentifiableEntity:
+        return IdentifiableEntity(self.target_id)
+
+    @target.setter
+    def target(self, target):
+        self.target_id = entity_id(target)
+
     def getBody(self):
         return self.body
 
@@ -38,15 +74,16 @@ class Annotation(IdentifiableEntity):
 
 
 class EntityWithMetadata(IdentifiableEntity):
+    __slots__ = ("label", "title", "creators")
     label: str
-    title: str = None
-    creators: list = []
+    title: str
+    creators: List[str]
 
     def __init__(self, id, label, title=None, creators=None):
         self.label = label
         self.title = title
-        if isinstance(creators, str) and creators != "":
-            self.creators = creators.split("; ")
+        if isinstance(creators, str):
+            self.creators = split_creators(creators)
         elif isinstance(creators, list):
             self.creators = creators
         else:
@@ -65,31 +102,68 @@ class EntityWithMetadata(IdentifiableEntity):
 
 
 class Canvas(EntityWithMetadata):
-    pass
+    __slots__ = ()
 
 
 class Manifest(EntityWithMetadata):
-    list_of_canvas: List[Canvas] = []
+    # the canvases are either given to the constructor or, if it receives an items_loader, loaded by calling it
+    # with the identifier of the manifest the first time they are read
+    __slots__ = ("_list_of_canvas", "items_loader")
+    items_loader: Callable[[str], List[Canvas]]
 
-    def __init__(self, id, label, title=None, creators=None, list_of_canvas=None):
+    def __init__(self, id, label, title=None, creators=None, list_of_canvas=None, items_loader=None):
         if isinstance(list_of_canvas, list):
-            self.list_of_canvas = list_of_canvas
+            self._list_of_canvas = list_of_canvas
         else:
-            self.list_of_canvas = []
+            self._list_of_canvas = None if items_loader is not None else []
+        self.items_loader = items_loader
 
         super().__init__(id, label, title, creators)
 
+    @property
+    def list_of_canvas(self) -> List[Canvas]:
+        if self._list_of_canvas is None:
+            self._list_of_canvas = self.items_loader(self.id)
+            self.items_loader = None
+        return self._list_of_canvas
+
+    @list_of_canvas.setter
+    def list_of_canvas(self, list_of_canvas: List[Canvas]):
+        self._list_of_canvas = list_of_canvas
+
+    def hasLoadedItems(self):
+        return self._list_of_canvas is not None
+
     def getItems(self):
         return self.list_of_canvas
 
 
 class Collection(EntityWithMetadata):
-    list_of_manifests: List[Manifest] = []
+    # the manifests are given to the constructor or loaded on first access, as the canvases of Manifest
+    __slots__ = ("_list_of_manifests", "items_loader")
+    items_loader: Callable[[str], List[Manifest]]
 
-    def __init__(self, id, label, title=None, creators=None, list_of_manifests=None):
+    def __init__(self, id, label, title=None, creators=None, list_of_manifests=None, items_loader=None):
         if isinstance(list_of_manifests, list):
-            self.list_of_manifests = list_of_manifests
+            self._list_of_manifests = list_of_manifests
+        else:
+            self._list_of_manifests = None if items_loader is not None else []
+        self.items_loader = items_loader
         super().__init__(id, label, title, creators)
 
+    @property
+    def list_of_manifests(self) -> List[Manifest]:
+        if self._list_of_manifests is None:
+            self._list_of_manifests = self.items_loader(self.id)
+            self.items_loader = None
+        return self._list_of_manifests
+
+    @list_of_manifests.setter
+    def list_of_manifests(self, list_of_manifests: List[Manifest]):
+        self._list_of_manifests = list_of_manifests
+
+    def hasLoadedItems(self):
+        return self._list_of_manifests is not None
+
     def getItems(self):
         return self.list_of_manifests
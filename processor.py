@@ -1,10 +1,46 @@
+import os
+import threading
+import time
+
+from compact import compact_dataframe
+from instrumentation import QueryRecord, current_operation
+
+# the generation of each database, i.e. the number of uploads run on it by this process,
+# used to discard the results read before the last upload
+_generations = {}
+_generations_lock = threading.Lock()
+
+
+def store_key(path_url: str) -> str:
+    """it returns the key identifying the database at the input path or URL, the same for all the paths of a file."""
+    if not path_url or path_url.startswith(("http://", "https://")):
+        return path_url
+    return os.path.abspath(path_url)
+
+
+def get_generation(path_url: str) -> int:
+    """it returns the generation of the database at the input path or URL."""
+    return _generations.get(store_key(path_url), 0)
+
+
+def bump_generation(path_url: str) -> int:
+    """it increments the generation of the database at the input path or URL, and returns the new one."""
+    key = store_key(path_url)
+    with _generations_lock:
+        _generations[key] = _generations.get(key, 0) + 1
+        return _generations[key]
+
+
 class Processor():
     """
         The base class for the processors.
         The variable path_url containing the path or the URL of the database,
         initially set as an empty string, that will be updated with the method setDbPathOrUrl.
+        The Instrumentation object set with the method setInstrumentation, if any, records every query sent
+        to the database and every upload.
         """
     dbPathOrUrl = ""
+    instrumentation = None
 
     def getDbPathOrUrl(self) -> str:
         """it returns the path or URL of the database."""
@@ -15,9 +51,107 @@ class Processor():
         self.dbPathOrUrl = path_url
         return True
 
+    def getGeneration(self) -> int:
+        """it returns the generation of the database, incremented by every upload of data in it."""
+        return get_generation(self.dbPathOrUrl)
+
+    def bumpGeneration(self) -> int:
+        """it increments the generation of the database, invalidating the results read from it before."""
+        return bump_generation(self.dbPathOrUrl)
+
+    def setInstrumentation(self, instrumentation) -> bool:
+        """it sets the Instrumentation (e.g. a MetricsCollector) recording the queries and the uploads
+        of the processor, or None to stop recording them."""
+        self.instrumentation = instrumentation
+        return True
+
+    def getBackend(self) -> str:
+        """it returns the name of the kind of database handled by the processor, used by the instrumentation."""
+        return ""
+
+    def instrumentQuery(self, query: str, run):
+        """it calls run, which sends the input query to the database and returns its result and the bytes
+        of the response decoded (None if unknown), and returns the result, recording the query
+        in the instrumentation of the processor, if any."""
+        if self.instrumentation is None:
+            return run()[0]
+        result, size, error = None, None, None
+        start = time.perf_counter()
+        try:
+            result, size = run()
+            return result
+        except Exception as exception:
+            error = f"{type(exception).__name__}: {exception}"
+            raise
+        finally:
+            self.recordQuery(query, time.perf_counter() - start, None if result is None else len(result), size, error)
+
+    def recordQuery(self, query: str, seconds: float, rows: int = None, size: int = None, error: str = None):
+        """it records the input query, which took the input seconds, in the instrumentation of the processor, if any."""
+        if self.instrumentation is not None:
+            self.instrumentation.recordQuery(QueryRecord(
+                current_operation(), self.getBackend(), store_key(self.dbPathOrUrl), query, seconds, rows, size, error))
+
+    def instrumentUpload(self, report):
+        """it records the input UploadReport in the instrumentation of the processor, if any."""
+        if self.instrumentation is not None:
+            self.instrumentation.recordUpload(self.getBackend(), store_key(self.dbPathOrUrl), report)
+
 
 class QueryProcessor(Processor):
+    chunkSize = 10000
+    """the number of rows (or entities) of every chunk yielded by the iter methods, which stream their results."""
+    compactResults = False
+    """if True, the data frames returned by the processor have compact dtypes (see compact_dataframe):
+    categorical for the columns with few distinct values and Arrow strings, if pyarrow is installed, for the others."""
+
+    def setChunkSize(self, chunk_size: int) -> bool:
+        """it sets how many rows (or entities) are read at a time by the iter methods."""
+        if chunk_size < 1:
+            return False
+        self.chunkSize = chunk_size
+        return True
+
+    def setCompactResults(self, compact: bool) -> bool:
+        """it sets whether the data frames returned by the processor have compact dtypes."""
+        self.compactResults = bool(compact)
+        return True
+
+    def compactResult(self, dataframe):
+        """it returns the input data frame with compact dtypes, if compactResults is True, or as it is."""
+        return compact_dataframe(dataframe) if self.compactResults else dataframe
 
     def getEntityById():
         """it returns a data frame with all the entities matching the input identifier (i.e. maximum one entity)."""
         pass
+
+
+class UploadReport():
+    """
+        The statistics of an upload: the rows (or triples) read from the file, the ones inserted in the database,
+        the ones rejected (because malformed, refused by the conflict policy or not accepted by the database),
+        the committed batches, the batches that had to be sent again and the error that stopped the upload, if any.
+        """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.rows = 0
+        self.inserted = 0
+        self.rejected = 0
+        self.batches = 0
+        self.retries = 0
+        self.seconds = 0.0
+        self.error = None
+        self._start = time.perf_counter()
+
+    def finish(self):
+        """it records the time elapsed since the beginning of the upload."""
+        self.seconds = time.perf_counter() - self._start
+
+    def getRowsPerSecond(self) -> float:
+        """it returns the number of rows (or triples) read from the file per second."""
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def __repr__(self):
+        return f"UploadReport({self.filename!r}: {self.inserted} inserted, {self.rejected} rejected " \
+            f"of {self.rows} in {self.batches} batches, {self.getRowsPerSecond():.0f}/s)"
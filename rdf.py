@@ -1,14 +1,30 @@
-import json
+import multiprocessing
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from glob import glob
+from itertools import islice
+from queue import Empty
+from threading import BoundedSemaphore, Lock
+
 import pandas as pd
-from rdflib import RDF, Literal, URIRef, Graph
-from rdflib.plugins.stores.sparqlstore import SPARQLUpdateStore
-from rdflib.namespace import RDFS
-from sparql_dataframe import get as get_sparql
-from urllib.error import URLError
+from urllib.error import HTTPError
 
-from processor import Processor, QueryProcessor
+from processor import Processor, QueryProcessor, UploadReport
 from model import Collection, Manifest, Canvas
+from containment import ContainmentIndex
+from iiif import iter_collection_triples
+from triplestore import SPARQLEndpoint, get_local_triplestore, is_endpoint_url, ntriples, sparql_string
+
 
+# the characters that cannot be included in an IRI
+INVALID_IRI = re.compile(r'[\x00-\x20<>"{}|^`\\]')
+# the lock guarding the creation of the SPARQLEndpoint of the processors
+_endpoints_lock = Lock()
+# the lock guarding the loading of the ContainmentIndex of the processors
+_indexes_lock = Lock()
+# the queue where the processes of CollectionProcessor.uploadFiles put the batches of triples they parse
+_batches = None
 
 match_types = {
     "Collection": {"uriref": "http://iiif.io/api/presentation/3#Collection", "model": Collection},
@@ -17,64 +33,345 @@ match_types = {
 }
 
 
-class CollectionProcessor(Processor):
+def collect_subjects(triples, subjects: set):
+    """it yields the input triples, adding their subjects to the input set."""
+    for triple in triples:
+        subjects.add(str(triple[0]))
+        yield triple
+
+
+def set_batches_queue(queue):
+    """it sets the queue where parse_collection puts the batches of triples, in the processes of uploadFiles."""
+    global _batches
+    _batches = queue
+
+
+def parse_collection(filename: str, batch_size: int):
+    """it parses the input JSON file containing a IIIF collection and puts its triples in the queue set by
+    set_batches_queue, as tuples (filename, batch, size) with batches of batch_size triples each, serialized
+    as N-Triples, and the number of triples they contain. The file ends with a tuple without batch, whose size
+    is the error that stopped the parsing, if any. The queue is bounded, so that the parsing waits for the uploads."""
+    error = None
+    try:
+        with open(filename, "rb") as user_file:
+            triples = iter_collection_triples(user_file)
+            while True:
+                batch = list(islice(triples, batch_size))
+                if not batch:
+                    break
+                _batches.put((filename, ntriples(batch), len(batch)))
+    except Exception as exception:
+        error = f"{type(exception).__name__}: {exception}"
+    _batches.put((filename, None, error))
+
+
+class TriplestoreProcessor(Processor):
+    """
+        The base class for the processors handling the triplestore, which is either a SPARQL endpoint,
+        when the processor is given its URL, or a local triplestore, when it is given a file path.
+        The requests to a SPARQL endpoint are sent by a SPARQLEndpoint, which keeps its connections alive
+        and is replaced every time a new URL is set with the method setDbPathOrUrl. Each request waits
+        at most timeout seconds, and at most maxConnections requests are sent at the same time.
+        """
+    timeout = 60
+    maxConnections = 8
+    endpoint = None
+
+    def setDbPathOrUrl(self, path_url: str):
+        """it enables to set a new path or URL for the database to handle, closing the connections to the previous one."""
+        self.close()
+        return super().setDbPathOrUrl(path_url)
+
+    def setTimeout(self, timeout: float):
+        """it sets how many seconds each request waits for the SPARQL endpoint to answer."""
+        self.close()
+        self.timeout = timeout
+        return True
+
+    def setMaxConnections(self, max_connections: int):
+        """it sets how many requests can be sent to the SPARQL endpoint at the same time."""
+        if max_connections < 1:
+            return False
+        self.close()
+        self.maxConnections = max_connections
+        return True
+
+    def getEndpoint(self) -> SPARQLEndpoint:
+        """it returns the client of the SPARQL endpoint of the processor."""
+        endpoint = self.endpoint
+        if endpoint is None or endpoint.url != self.dbPathOrUrl:
+            # the threads of GenericQueryProcessor may send their first request at the same time
+            with _endpoints_lock:
+                if self.endpoint is None or self.endpoint.url != self.dbPathOrUrl:
+                    self.close()
+                    self.endpoint = SPARQLEndpoint(self.dbPathOrUrl, self.timeout, self.maxConnections)
+                endpoint = self.endpoint
+        return endpoint
+
+    def close(self):
+        """it closes all the connections to the SPARQL endpoint opened by the processor."""
+        if self.endpoint is not None:
+            self.endpoint.close()
+            self.endpoint = None
+        return True
+
+    def getBackend(self) -> str:
+        return "sparql" if is_endpoint_url(self.dbPathOrUrl) else "rdflib"
+
+
+class CollectionProcessor(TriplestoreProcessor):
+    """
+        The processor uploading IIIF collections in the triplestore.
+        The triples are sent in "INSERT DATA" requests of batchSize triples each; a failed request is retried
+        up to maxRetries times, waiting retryDelay seconds (doubled at every attempt) before sending it again.
+        """
+    batchSize = 10000
+    maxRetries = 3
+    retryDelay = 0.5
+    uploadReport = None
+    entityView = None
 
     def uploadData(self, filename: str) -> bool:
-        collection = URIRef(match_types["Collection"]["uriref"])
-        manifest = URIRef(match_types["Manifest"]["uriref"])
-        canvas = URIRef(match_types["Canvas"]["uriref"])
-        has_item = URIRef("http://iiif.io/api/presentation/3#hasItem")
-
-        my_graph = Graph()
-
-        with open(filename, "r") as user_file:
-            json_file = json.load(user_file)
-
-            for key, value in json_file.items():
-                collection_subject = URIRef(json_file["id"])
-                if key == "type" and value == "Collection":
-                    type_triple = (collection_subject, RDF.type, collection)
-                    my_graph.add(type_triple)
-                    label = Literal(json_file["label"]["none"][0])
-                    label_triple = (collection_subject, RDFS.label, label)
-                    my_graph.add(label_triple)
-
-                    for item in json_file["items"]:
-                        if item["type"] == "Manifest":
-                            manifest_subject = URIRef(item["id"])
-                            type_triple = (manifest_subject, RDF.type, manifest)
-                            my_graph.add(type_triple)
-                            label = Literal(item["label"]["none"][0])
-                            label_triple = (manifest_subject, RDFS.label, label)
-                            my_graph.add(label_triple)
-                            triple = (collection_subject, has_item, manifest_subject)
-                            my_graph.add(triple)
-
-                            for each in item["items"]:
-                                if each["type"] == "Canvas":
-                                    canvas_subject = URIRef(each["id"])
-                                    type_triple = (canvas_subject, RDF.type, canvas)
-                                    my_graph.add(type_triple)
-                                    label = Literal(each["label"]["none"][0])
-                                    label_triple = (canvas_subject, RDFS.label, label)
-                                    my_graph.add(label_triple)
-                                    triple = (manifest_subject, has_item, canvas_subject)
-                                    my_graph.add(triple)
-
-            store = SPARQLUpdateStore()
-            store.open((self.dbPathOrUrl, self.dbPathOrUrl))
+        """it takes in input the path of a JSON file containing a IIIF collection and uploads it in the database.
+        The file is parsed incrementally and its triples are sent to the database while they are read,
+        so that the memory used does not depend on the number of manifests and canvases in the file."""
+        uploaded = set()
+        with open(filename, "rb") as user_file:
+            triples = iter_collection_triples(user_file)
+            if self.entityView is not None:
+                triples = collect_subjects(triples, uploaded)
+            self.uploadTriples(filename, triples)
+        if self.entityView is not None:
+            self.entityView.refreshEntities(uploaded)
+        return True
+
+    def uploadTriples(self, filename: str, triples):
+        """it sends the input triples to the database in "INSERT DATA" requests of batchSize triples each.
+        A batch that fails is sent again up to maxRetries times, without sending again the batches already stored.
+        The upload statistics are stored in an UploadReport, available via getUploadReport."""
+        report = UploadReport(filename)
+        batch = []
+        try:
+            for triple in triples:
+                report.rows += 1
+                batch.append(triple)
+                if len(batch) >= self.batchSize:
+                    self.sendBatch(batch, report)
+                    batch = []
+            if batch:
+                self.sendBatch(batch, report)
+        except HTTPError as error:
+            # the database is running, but it refused the data (e.g. malformed triples)
+            report.rejected = report.rows - report.inserted
+            report.error = f"{type(error).__name__}: {error}"
+            print(f"Error: the database refused the data ({error.code} {error.reason}).")
+        except OSError as error:
+            report.rejected = report.rows - report.inserted
+            report.error = f"{type(error).__name__}: {error}"
+            print("There is a problem with the connection to the database.")
+            print("Are you sure the database is running?")
+        finally:
+            report.finish()
+            self.uploadReport = report
+            self.instrumentUpload(report)
+            # the results read from the database before the upload are no longer valid
+            self.bumpGeneration()
+        return report
+
+    def sendBatch(self, batch: list, report: UploadReport):
+        """it stores the input batch of triples with a single "INSERT DATA" request, retrying it if it fails."""
+        report.retries += self.storeWithRetries(ntriples(batch))
+        report.inserted += len(batch)
+        report.batches += 1
+
+    def storeWithRetries(self, data: str) -> int:
+        """it stores the input triples, serialized as N-Triples, trying again up to maxRetries times if it fails.
+        It returns the number of retries needed, and raises the last error if the triples could not be stored."""
+        for attempt in range(self.maxRetries + 1):
             try:
-                for triple in my_graph.triples((None, None, None)):
-                    store.add(triple)
-            except URLError:
-                print("There is a problem with the connection to the database.")
-                print("Are you sure the database is running?")
-            store.close()
+                self.store(data)
+                return attempt
+            except HTTPError as error:
+                # the request has been refused: sending it again would not change the answer
+                if error.code < 500 or attempt == self.maxRetries:
+                    raise
+            except OSError:
+                if attempt == self.maxRetries:
+                    raise
+            time.sleep(self.retryDelay * 2 ** attempt)
+
+    def uploadFiles(self, files, processes: int = None, http_workers: int = 4) -> dict:
+        """it uploads all the input JSON files containing IIIF collections, given as a list of paths or as a glob
+        pattern (e.g. "data/collection-*.json"). The files are parsed in a pool of processes, and the resulting
+        batches of triples are sent to the database by http_workers concurrent threads while the files are parsed.
+        At most 2 * http_workers batches wait to be sent, and the processes stop parsing until they are,
+        so that the memory used does not depend on the size of the files.
+        It returns a dictionary with the UploadReport of each file, while the overall statistics of the upload
+        are available via getUploadReport."""
+        filenames = sorted(glob(files)) if isinstance(files, str) else list(files)
+        reports = {filename: UploadReport(filename) for filename in filenames}
+        total = UploadReport(f"{len(filenames)} files")
+        context = multiprocessing.get_context()
+        batches = context.Queue(2 * http_workers)
+        slots = BoundedSemaphore(2 * http_workers)
+        sending = {}
+        try:
+            with ProcessPoolExecutor(max_workers=processes, mp_context=context,
+                                     initializer=set_batches_queue, initargs=(batches,)) as parsers, \
+                    ThreadPoolExecutor(max_workers=http_workers) as senders:
+                parsing = {parsers.submit(parse_collection, filename, self.batchSize): filename
+                           for filename in filenames}
+                parsed = set()
+                while len(parsed) < len(filenames):
+                    try:
+                        filename, data, size = batches.get(timeout=0.1)
+                    except Empty:
+                        # a process that stopped without ending its file in the queue
+                        for parser, filename in parsing.items():
+                            if filename not in parsed and parser.done() and parser.exception() is not None:
+                                error = parser.exception()
+                                reports[filename].error = f"{type(error).__name__}: {error}"
+                                parsed.add(filename)
+                        continue
+                    if data is None:
+                        reports[filename].error = reports[filename].error or size
+                        parsed.add(filename)
+                        continue
+                    reports[filename].rows += size
+                    slots.acquire()
+                    request = senders.submit(self.storeWithRetries, data)
+                    request.add_done_callback(lambda _: slots.release())
+                    sending[request] = (filename, size)
+                for request in as_completed(sending):
+                    filename, size = sending[request]
+                    report = reports[filename]
+                    try:
+                        report.retries += request.result()
+                        report.inserted += size
+                        report.batches += 1
+                    except Exception as error:
+                        report.rejected += size
+                        report.error = f"{type(error).__name__}: {error}"
+        finally:
+            batches.close()
+            for report in reports.values():
+                report.finish()
+                self.instrumentUpload(report)
+                total.rows += report.rows
+                total.inserted += report.inserted
+                total.rejected += report.rejected
+                total.batches += report.batches
+                total.retries += report.retries
+            total.finish()
+            self.uploadReport = total
+            self.bumpGeneration()
+            if self.entityView is not None:
+                # the entities of the files are only known by the processes that parsed them
+                self.entityView.refreshEntities()
+        return reports
+
+    def store(self, data: str):
+        """it stores the input triples, serialized as N-Triples, in the database: with a single "INSERT DATA"
+        request to the SPARQL endpoint, or in the local triplestore when the database is a file path."""
+        if is_endpoint_url(self.dbPathOrUrl):
+            self.getEndpoint().update("INSERT DATA {\n" + data + "}")
+        else:
+            get_local_triplestore(self.dbPathOrUrl).add(data)
+
+    def setEntityView(self, entity_view) -> bool:
+        """it sets the EntityViewProcessor whose rows are refreshed, after every upload,
+        for the entities that have been uploaded (None to stop refreshing it)."""
+        self.entityView = entity_view
+        return True
+
+    def setBatchSize(self, batch_size: int):
+        """it sets how many triples are sent in each "INSERT DATA" request of an upload."""
+        if batch_size < 1:
+            return False
+        self.batchSize = batch_size
         return True
 
+    def getUploadReport(self):
+        """it returns the UploadReport of the last upload run by the processor (None if there was none)."""
+        return self.uploadReport
+
 
-class TriplestoreQueryProcessor(QueryProcessor):
+class TriplestoreQueryProcessor(TriplestoreProcessor, QueryProcessor):
+    """
+        The processor querying the triplestore.
+        When useContainmentIndex is True, the methods returning the items of collections and manifests
+        read a ContainmentIndex kept in memory, loaded with a single query and loaded again after every upload
+        run by this process (see setUseContainmentIndex).
+        """
     prefix_sc = "PREFIX sc: <http://iiif.io/api/presentation/3#> "
+    useContainmentIndex = False
+    containmentIndex = None
+
+    def setUseContainmentIndex(self, use: bool) -> bool:
+        """it sets whether the items of collections and manifests are read from the ContainmentIndex."""
+        self.useContainmentIndex = bool(use)
+        return True
+
+    def getContainmentIndex(self) -> ContainmentIndex:
+        """it returns the ContainmentIndex of the triplestore, loading it if it has not been loaded yet
+        or if data has been uploaded in the triplestore since it has been loaded."""
+        index = self.containmentIndex
+        if index is None or index.generation != self.getGeneration():
+            with _indexes_lock:
+                if self.containmentIndex is None or self.containmentIndex.generation != self.getGeneration():
+                    self.refreshContainmentIndex()
+                index = self.containmentIndex
+        return index
+
+    def refreshContainmentIndex(self) -> bool:
+        """it loads again the ContainmentIndex of the triplestore, e.g. after an upload run by another process."""
+        generation = self.getGeneration()
+        query = self.prefix_sc + """select ?parent ?id ?type ?label where
+            {
+                ?id rdf:type ?type .
+                FILTER(?type IN (sc:Collection, sc:Manifest, sc:Canvas))
+                OPTIONAL { ?id rdfs:label ?label . }
+                OPTIONAL { ?parent sc:hasItem ?id . }
+            }
+        """
+        self.containmentIndex = ContainmentIndex(self.query(query), generation)
+        return True
+
+    def getIndexedItems(self, parent_ids, item_type: str = None) -> pd.DataFrame:
+        """it returns a data frame with the labeled items of the input entities, read from the ContainmentIndex:
+        the identifier (parent) and the label (title) of the entity containing them, and their identifier, label
+        and type. Only the items having the input type are included, if any."""
+        index = self.getContainmentIndex()
+        rows = []
+        for parent in parent_ids:
+            title = (index.getEntity(parent) or (None, None))[1]
+            for id in index.getChildren(parent):
+                type, label = index.getEntity(id) or (None, None)
+                if label is not None and (item_type is None or type == item_type):
+                    rows.append((parent, title, id, label, type))
+        return pd.DataFrame(rows, columns=["parent", "title", "id", "label", "type"])
+
+    def getAncestors(self, id: str) -> pd.DataFrame:
+        """it returns a data frame containing all the entities containing, directly or not, the entity
+        identified by the input identifier, with their type and label (e.g. the manifest and the collection
+        of a canvas). With the ContainmentIndex, the closest entities come first."""
+        if self.useContainmentIndex:
+            index = self.getContainmentIndex()
+            rows = [(ancestor, *index.getEntity(ancestor)) for ancestor in index.getAncestors(id)
+                    if index.getEntity(ancestor) is not None]
+            return pd.DataFrame(rows, columns=["id", "type", "label"])
+        if INVALID_IRI.search(id) is not None:
+            return pd.DataFrame(columns=["id", "type", "label"])
+        query = self.prefix_sc + "select distinct ?id ?type ?label where { ?id sc:hasItem+ <" + id + "> . ?id rdf:type ?type . ?id rdfs:label ?label . }"
+        return self.query(query)
+
+    def query(self, query: str, typed: bool = False) -> pd.DataFrame:
+        """it runs the input SPARQL SELECT query on the database and returns its results as a data frame,
+        whose values are strings unless typed is True, when the literals are converted according to their datatype."""
+        if is_endpoint_url(self.dbPathOrUrl):
+            return self.compactResult(self.instrumentQuery(query, lambda: self.getEndpoint().select(query, typed)))
+        return self.compactResult(self.instrumentQuery(
+            query, lambda: get_local_triplestore(self.dbPathOrUrl).select(query, typed)))
 
     def getEntityById(self, id: str) -> pd.DataFrame:
         query = f"""select ?id ?type ?label
@@ -83,9 +380,50 @@ class TriplestoreQueryProcessor(QueryProcessor):
             ?id rdf:type ?type ;
             rdfs:label ?label .
             }}"""
-        df_sparql = get_sparql(self.dbPathOrUrl, query, True)
+        df_sparql = self.query(query)
         return df_sparql
 
+    def getEntitiesByIds(self, ids) -> pd.DataFrame:
+        """it returns a data frame containing all the entities matching the input identifiers, with their type
+        and label, retrieved with a single query binding all of them in one VALUES block."""
+        # the identifiers that cannot be written as IRIs cannot match any entity
+        ids = [id for id in dict.fromkeys(ids) if isinstance(id, str) and INVALID_IRI.search(id) is None]
+        if not ids:
+            return pd.DataFrame(columns=["id", "type", "label"])
+        values = " ".join(f"<{id}>" for id in ids)
+        query = f"""select ?id ?type ?label
+            WHERE {{
+                VALUES ?id {{ {values} }}
+            ?id rdf:type ?type ;
+            rdfs:label ?label .
+            }}"""
+        return self.query(query)
+
+    def getEntitiesWithContainment(self, ids=None) -> pd.DataFrame:
+        """it returns a data frame containing the collections, manifests and canvases matching the input identifiers
+        (all of them if ids is None), with their type, label, the identifier of the entity containing them (parent)
+        and the number of entities they contain (children)."""
+        values = ""
+        if ids is not None:
+            ids = [id for id in dict.fromkeys(ids) if isinstance(id, str) and INVALID_IRI.search(id) is None]
+            if not ids:
+                return pd.DataFrame(columns=["id", "type", "label", "parent", "children"])
+            values = "VALUES ?id { " + " ".join(f"<{id}>" for id in ids) + " }"
+        # one row for each label, container and child of each entity, aggregated below
+        query = self.prefix_sc + f"""select ?id ?type ?label ?parent ?child
+            WHERE {{
+                {values}
+                ?id rdf:type ?type .
+                FILTER(?type IN (sc:Collection, sc:Manifest, sc:Canvas))
+                {{ ?id rdfs:label ?label . }} UNION {{ ?parent sc:hasItem ?id . }} UNION {{ ?id sc:hasItem ?child . }}
+            }}"""
+        entities = self.query(query)
+        if entities.empty:
+            return pd.DataFrame(columns=["id", "type", "label", "parent", "children"])
+        entities = entities.groupby(["id", "type"], sort=False, observed=True).agg(
+            label=("label", "first"), parent=("parent", "first"), children=("child", "nunique"))
+        return entities.reset_index()
+
     def getAllCanvases(self):
         """it returns a data frame containing all the canvases included in the database."""
 
@@ -97,14 +435,82 @@ class TriplestoreQueryProcessor(QueryProcessor):
                 ?manifest rdfs:label ?title .
             }
         """
-        df_sparql = get_sparql(self.dbPathOrUrl, query, True)
+        df_sparql = self.query(query)
+        return df_sparql
+
+    def iterAllCanvases(self, chunk_size: int = None):
+        """it yields all the canvases of getAllCanvases as data frames of the rows of at most chunk_size canvases
+        (chunkSize if None), one query each. The canvases are sorted by identifier, and every query starts
+        after the last identifier returned by the previous one (keyset pagination) instead of skipping
+        the canvases already returned with OFFSET, so that every query costs the same."""
+        chunk_size = chunk_size or self.chunkSize
+        last = ""
+        while True:
+            # the canvases without label or manifest are kept by the query, to know where the next one starts
+            query = self.prefix_sc + f"""select ?id ?label ?title where
+                {{
+                    {{
+                        select ?id where {{
+                            ?id rdf:type sc:Canvas .
+                            filter(str(?id) > {sparql_string(last)})
+                        }} order by str(?id) limit {chunk_size}
+                    }}
+                    optional {{ ?id rdfs:label ?label . }}
+                    optional {{ ?manifest sc:hasItem ?id . ?manifest rdfs:label ?title . }}
+                }} order by str(?id)
+            """
+            page = self.query(query)
+            if page.empty:
+                return
+            canvases = page.dropna(subset=["label", "title"]).reset_index(drop=True)
+            if not canvases.empty:
+                yield canvases
+            if page["id"].nunique() < chunk_size:
+                return
+            last = page["id"].iloc[-1]
+
+    def getAllCanvasesWithManifest(self):
+        """it returns a data frame containing all the canvases included in the database,
+        together with the identifier of the manifest containing them."""
+        if self.useContainmentIndex:
+            canvases = self.getIndexedItems(list(self.getContainmentIndex().children), match_types["Canvas"]["uriref"])
+            canvases = canvases[canvases["title"].notna()].rename(columns={"parent": "manifest"})
+            return canvases[["manifest", "id", "label", "title"]].reset_index(drop=True)
+
+        query = self.prefix_sc + """select ?manifest ?id ?label ?title where
+            {
+                ?manifest sc:hasItem ?id .
+                ?id rdfs:label ?label .
+                ?id rdf:type sc:Canvas .
+                ?manifest rdfs:label ?title .
+            }
+        """
+        df_sparql = self.query(query)
+        return df_sparql
+
+    def getAllManifestsWithCollection(self):
+        """it returns a data frame containing all the manifests included in the database,
+        together with the identifier of the collection containing them."""
+        if self.useContainmentIndex:
+            manifests = self.getIndexedItems(list(self.getContainmentIndex().children), match_types["Manifest"]["uriref"])
+            return manifests.rename(columns={"parent": "collection"})[["collection", "id", "label", "type"]]
+
+        query = self.prefix_sc + """select ?collection ?id ?label ?type where
+            {
+                ?collection sc:hasItem ?id .
+                ?id rdf:type sc:Manifest .
+                ?id rdf:type ?type .
+                ?id rdfs:label ?label .
+            }
+        """
+        df_sparql = self.query(query)
         return df_sparql
 
     def getAllCollections(self):
         """it returns a data frame containing all the collections included in the database."""
 
         query = self.prefix_sc + "select ?id ?label where { ?id ?p sc:Collection . ?id rdfs:label ?label . }"
-        df_sparql = get_sparql(self.dbPathOrUrl, query, True)
+        df_sparql = self.query(query)
         return df_sparql
 
     def getAllManifests(self):
@@ -116,7 +522,7 @@ class TriplestoreQueryProcessor(QueryProcessor):
                 ?id rdfs:label ?label .
             }
         """
-        df_sparql = get_sparql(self.dbPathOrUrl, query, True)
+        df_sparql = self.query(query)
         return df_sparql
 
     def getCanvasesInCollection(self, collection_id: str):
@@ -132,9 +538,13 @@ class TriplestoreQueryProcessor(QueryProcessor):
           ?manifest rdfs:label ?title .
         }
         """
+        if self.useContainmentIndex:
+            canvases = self.getIndexedItems(self.getContainmentIndex().getChildren(collection_id))
+            canvases = canvases[canvases["title"].notna()].rename(columns={"parent": "manifest"})
+            return canvases[["manifest", "id", "label", "type", "title"]].reset_index(drop=True)
 
-        query = self.prefix_sc + "select * where { <" + collection_id + "> sc:hasItem ?manifest . ?manifest sc:hasItem ?id . ?id rdfs:label ?label . ?id rdf:type ?type . ?manifest rdfs:label ?title .}"
-        df_sparql = get_sparql(self.dbPathOrUrl, query, True)
+        query = self.prefix_sc + "select ?manifest ?id ?label ?type ?title where { <" + collection_id + "> sc:hasItem ?manifest . ?manifest sc:hasItem ?id . ?id rdfs:label ?label . ?id rdf:type ?type . ?manifest rdfs:label ?title .}"
+        df_sparql = self.query(query)
         return df_sparql
 
     def getCanvasesInManifest(self, manifest_id: str):
@@ -144,23 +554,28 @@ class TriplestoreQueryProcessor(QueryProcessor):
         PREFIX sc: <http://iiif.io/api/presentation/3#>
         select ?s where { <https://dl.ficlit.unibo.it/iiif/2/28429/manifest> sc:hasItem ?s . }
         """
+        if self.useContainmentIndex:
+            canvases = self.getIndexedItems([manifest_id])
+            return canvases[canvases["title"].notna()][["id", "label", "title"]].reset_index(drop=True)
 
         query = self.prefix_sc + "select ?id ?label ?title where { <" + manifest_id + "> sc:hasItem ?id . ?id rdfs:label ?label . <" + manifest_id + "> rdfs:label ?title . }"
-        df_sparql = get_sparql(self.dbPathOrUrl, query, True)
+        df_sparql = self.query(query)
         return df_sparql
 
     def getManifestsInCollection(self, collection_id: str):
         """it returns a data frame containing all the manifests included in the database
         that are contained in the collection identified by the input identifier."""
+        if self.useContainmentIndex:
+            return self.getIndexedItems([collection_id])[["id", "label", "type"]]
 
-        query = self.prefix_sc + "select * where { <" + collection_id + "> sc:hasItem ?id . ?id rdfs:label ?label . ?id rdf:type ?type . }"
-        df_sparql = get_sparql(self.dbPathOrUrl, query, True)
+        query = self.prefix_sc + "select ?id ?label ?type where { <" + collection_id + "> sc:hasItem ?id . ?id rdfs:label ?label . ?id rdf:type ?type . }"
+        df_sparql = self.query(query)
         return df_sparql
 
     def getEntitiesWithLabel(self, label: str):
         """it returns a data frame containing all the entities included in the database
         that have the input label."""
 
-        query = self.prefix_sc + "SELECT * WHERE { ?id rdfs:label '" + label + "' .  ?id rdf:type ?type . ?id rdfs:label ?label . }"""
-        df_sparql = get_sparql(self.dbPathOrUrl, query, True)
+        query = self.prefix_sc + "SELECT ?id ?type ?label WHERE { ?id rdfs:label '" + label + "' .  ?id rdf:type ?type . ?id rdfs:label ?label . }"""
+        df_sparql = self.query(query)
         return df_sparql
@@ -2,137 +2,561 @@
 # AnnotationProcessor, MetadataProcessor, RelationalQueryProcessor
 
 import csv
+import json
 import sqlite3
+import threading
+import time
 import pandas as pd
-from processor import Processor, QueryProcessor
+from model import split_creators
+from compact import compact_chunks
+from processor import Processor, QueryProcessor, UploadReport
+from snapshot import SNAPSHOT_TABLES, read_snapshot, write_snapshot
 
 
 all = [
     "AnnotationProcessor",
+    "ConnectionManager",
     "MetadataProcessor",
     "QueryProcessor",
+    "RelationalProcessor",
     "RelationalQueryProcessor",
+    "UploadReport",
 ]
 
+# the indexes backing the lookups of RelationalQueryProcessor, created together with the tables
+ANNOTATION_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_annotations_target ON annotations(target);",
+    "CREATE INDEX IF NOT EXISTS idx_annotations_body ON annotations(body);",
+    "CREATE INDEX IF NOT EXISTS idx_annotations_body_target ON annotations(body, target);",
+]
+METADATA_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_metadata_title ON metadata(title);",
+    "CREATE INDEX IF NOT EXISTS idx_metadata_creators_creator ON metadata_creators(creator);",
+]
+# the materialized view joining the metadata of the entities with their type, label and containment
+# in the triplestore, filled by EntityViewProcessor (see view.py)
+ENTITY_VIEW = [
+    '''CREATE TABLE IF NOT EXISTS entity_view(
+        id STRING PRIMARY KEY,
+        type STRING NOT NULL,
+        label STRING,
+        title STRING,
+        creator STRING,
+        parent STRING,
+        children INTEGER NOT NULL DEFAULT 0);
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_entity_view_title ON entity_view(title);",
+    "CREATE INDEX IF NOT EXISTS idx_entity_view_label ON entity_view(label);",
+    "CREATE INDEX IF NOT EXISTS idx_entity_view_parent ON entity_view(parent);",
+]
+ENTITY_VIEW_COLUMNS = "id, type, label, title, creator, parent, children"
+# the table storing the change counter of the database, incremented by every upload, which stamps the snapshots
+META_TABLE = "CREATE TABLE IF NOT EXISTS meta(key STRING PRIMARY KEY, value INTEGER NOT NULL);"
+
+# the statements used to insert rows under each of the conflict policies of the upload processors
+CONFLICT_POLICIES = {
+    "abort": "INSERT",
+    "insert-or-replace": "INSERT OR REPLACE",
+    "insert-or-ignore": "INSERT OR IGNORE",
+}
+# the PRAGMAs applied for the duration of an upload, restored to their previous values at the end
+BULK_LOAD_PRAGMAS = {
+    "synchronous": "OFF",
+    "temp_store": "MEMORY",
+}
+# the number of identifiers bound in a single "IN (...)" query, below the SQLite limit on host parameters
+SQLITE_MAX_PARAMETERS = 900
+# the lock guarding the creation of the ConnectionManager of the processors
+_managers_lock = threading.Lock()
+
+
+class ConnectionManager():
+    """
+        It keeps one long-lived SQLite connection per thread for the database at the input path.
+        Every connection is opened in WAL mode, so that readers are not blocked while an upload is running,
+        and is configured with the page cache (in KiB) and the memory map size (in bytes) given in input.
+        """
+
+    def __init__(self, path: str, cache_size: int = 65536, mmap_size: int = 268435456):
+        self.path = path
+        self.cache_size = cache_size
+        self.mmap_size = mmap_size
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+
+    def getConnection(self) -> sqlite3.Connection:
+        """it returns the connection of the current thread, opening it the first time it is needed."""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            # the connection may be closed from another thread by close()
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL;")
+            connection.execute("PRAGMA synchronous=NORMAL;")
+            connection.execute(f"PRAGMA cache_size=-{int(self.cache_size)};")
+            connection.execute(f"PRAGMA mmap_size={int(self.mmap_size)};")
+            self._local.connection = connection
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    def close(self):
+        """it closes the connections opened by all the threads."""
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            connection.close()
+        self._local = threading.local()
+        return True
+
+
+class RelationalProcessor(Processor):
+    """
+        The base class for the processors handling the relational database.
+        The connections to the database are handled by a ConnectionManager, which is replaced
+        every time a new path is set with the method setDbPathOrUrl.
+        The variables cacheSize (in KiB) and mmapSize (in bytes) size the page cache and the memory map
+        of every connection opened by the processor.
+        The uploads stream the input files in transactions of batchSize rows, handling the rows whose identifier
+        is already in the database according to conflictPolicy (see setConflictPolicy).
+        """
+    cacheSize = 65536
+    mmapSize = 268435456
+    connectionManager = None
+    batchSize = 10000
+    conflictPolicy = "abort"
+    uploadReport = None
 
-class AnnotationProcessor(Processor):
+    def setDbPathOrUrl(self, path_url: str):
+        """it enables to set a new path for the database to handle, closing the connections to the previous one."""
+        self.close()
+        return super().setDbPathOrUrl(path_url)
+
+    def setCacheSize(self, cache_size: int):
+        """it sets the size, in KiB, of the page cache of the connections opened from now on."""
+        self.close()
+        self.cacheSize = cache_size
+        return True
+
+    def setMmapSize(self, mmap_size: int):
+        """it sets the size, in bytes, of the memory map of the connections opened from now on."""
+        self.close()
+        self.mmapSize = mmap_size
+        return True
+
+    def getConnection(self) -> sqlite3.Connection:
+        """it returns the connection to the database owned by the current thread."""
+        manager = self.connectionManager
+        if manager is None or manager.path != self.dbPathOrUrl:
+            # the threads of GenericQueryProcessor may ask for their first connection at the same time
+            with _managers_lock:
+                if self.connectionManager is None or self.connectionManager.path != self.dbPathOrUrl:
+                    self.close()
+                    self.connectionManager = ConnectionManager(self.dbPathOrUrl, self.cacheSize, self.mmapSize)
+                manager = self.connectionManager
+        return manager.getConnection()
+
+    def close(self):
+        """it closes all the connections to the database opened by the processor."""
+        if self.connectionManager is not None:
+            self.connectionManager.close()
+            self.connectionManager = None
+        return True
+
+    def getBackend(self) -> str:
+        return "sqlite"
+
+    def getChangeCounter(self) -> int:
+        """it returns the change counter of the database, incremented by every upload run by any process."""
+        try:
+            row = self.getConnection().execute("SELECT value FROM meta WHERE key = 'change_counter'").fetchone()
+        except sqlite3.OperationalError:
+            # there has been no upload since the table meta was introduced
+            return 0
+        return row[0] if row else 0
+
+    @staticmethod
+    def incrementChangeCounter(connection: sqlite3.Connection):
+        """it increments the change counter of the database, committing the pending changes with it."""
+        connection.execute(META_TABLE)
+        connection.execute("INSERT INTO meta (key, value) VALUES('change_counter', 1) "
+                           "ON CONFLICT(key) DO UPDATE SET value = value + 1")
+        connection.commit()
+
+    def setBatchSize(self, batch_size: int):
+        """it sets how many rows are written, and committed, in each transaction of an upload."""
+        if batch_size < 1:
+            return False
+        self.batchSize = batch_size
+        return True
+
+    def setConflictPolicy(self, policy: str):
+        """it sets what an upload does with a row whose identifier is already in the database:
+        "abort" stops the upload, "insert-or-replace" overwrites the stored row and "insert-or-ignore" keeps it."""
+        if policy not in CONFLICT_POLICIES:
+            return False
+        self.conflictPolicy = policy
+        return True
+
+    def getUploadReport(self):
+        """it returns the UploadReport of the last upload run by the processor (None if there was none)."""
+        return self.uploadReport
+
+    def ingestCsv(self, filename: str, table: str, columns: list, indexes: list, on_batch=None):
+        """it streams the rows of the input CSV file into the input table, one transaction every batchSize rows,
+        following the conflict policy of the processor. Malformed rows and rows rejected by the policy are counted
+        and the upload statistics are stored in an UploadReport, available via getUploadReport.
+        The function on_batch, if any, is called with the cursor and every batch inside its transaction."""
+        connection = self.getConnection()
+        cursor = connection.cursor()
+        insert_records = f"{CONFLICT_POLICIES[self.conflictPolicy]} INTO {table} ({', '.join(columns)}) " \
+            f"VALUES({', '.join('?' * len(columns))})"
+        report = UploadReport(filename)
+        # the PRAGMAs cannot be changed, nor a batch begun, inside a pending transaction
+        connection.commit()
+        previous = {pragma: cursor.execute(f"PRAGMA {pragma};").fetchone()[0] for pragma in BULK_LOAD_PRAGMAS}
+        for pragma, value in BULK_LOAD_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {pragma}={value};")
+        try:
+            with open(filename, "r", encoding="utf-8", newline="") as file:
+                contents = csv.reader(file)
+                next(contents, None)
+                batch = []
+                for row in contents:
+                    report.rows += 1
+                    if len(row) != len(columns):
+                        report.rejected += 1
+                        continue
+                    batch.append(row)
+                    if len(batch) >= self.batchSize:
+                        if not self.writeBatch(cursor, insert_records, batch, report, on_batch):
+                            break
+                        batch = []
+                else:
+                    if batch:
+                        self.writeBatch(cursor, insert_records, batch, report, on_batch)
+            for create_index in indexes:
+                cursor.execute(create_index)
+            connection.commit()
+        finally:
+            if connection.in_transaction:
+                # the batch interrupted by an error is not committed with the change counter
+                connection.rollback()
+            self.incrementChangeCounter(connection)
+            for pragma, value in previous.items():
+                cursor.execute(f"PRAGMA {pragma}={value};")
+            report.finish()
+            self.uploadReport = report
+            self.instrumentUpload(report)
+            # the results read from the database before the upload are no longer valid
+            self.bumpGeneration()
+        return report
+
+    def writeBatch(self, cursor: sqlite3.Cursor, insert_records: str, batch: list, report, on_batch=None) -> bool:
+        """it writes the input batch of rows in a single transaction, updating the input UploadReport.
+        It returns False if the batch has been rolled back because of the "abort" conflict policy."""
+        connection = cursor.connection
+        cursor.execute("BEGIN;")
+        try:
+            changes = connection.total_changes
+            cursor.executemany(insert_records, batch)
+            inserted = connection.total_changes - changes
+            if on_batch is not None:
+                on_batch(cursor, batch)
+            connection.commit()
+        except sqlite3.IntegrityError:
+            connection.rollback()
+            report.rejected += len(batch)
+            print("Error: the database already contains the entity with the same identifier.")
+            return False
+        report.inserted += inserted
+        report.rejected += len(batch) - inserted
+        report.batches += 1
+        return True
+
+
+class AnnotationProcessor(RelationalProcessor):
 
     def uploadData(self, filename: str) -> bool:
         """it takes in input the path of a CSV file containing annotations and uploads them in the database.
         This method can be called everytime there is a need to upload annotations in the database."""
-        connection = sqlite3.connect(self.dbPathOrUrl)
-        cursor = connection.cursor()
         create_table = '''CREATE TABLE IF NOT EXISTS annotations(
                 id STRING PRIMARY KEY,
                 body STRING NOT NULL,
                 target STRING NOT NULL,
                 motivation STRING NOT NULL);
                 '''
-        cursor.execute(create_table)
-        with open(filename, "r", encoding="utf-8") as file:
-            contents = csv.reader(file)
-            next(contents)
-            insert_records = "INSERT INTO annotations (id, body, target, motivation) VALUES(?, ?, ?, ?)"
-            try:
-                cursor.executemany(insert_records, contents)
-                connection.commit()
-                connection.close()
-            except sqlite3.IntegrityError:
-                print("Error: the database already contains the entity with the same identifier.")
+        self.getConnection().execute(create_table)
+        self.ingestCsv(filename, "annotations", ["id", "body", "target", "motivation"], ANNOTATION_INDEXES)
         return True
 
 
-class MetadataProcessor(Processor):
+class MetadataProcessor(RelationalProcessor):
+    entityView = None
+
+    def setEntityView(self, entity_view) -> bool:
+        """it sets the EntityViewProcessor whose rows are refreshed, after every upload,
+        for the entities whose metadata has been uploaded (None to stop refreshing it)."""
+        self.entityView = entity_view
+        return True
 
     def uploadData(self, filename: str) -> bool:
         """it takes in input the path of a CSV file containing metadata and uploads them in the database.
         This method can be called everytime there is a need to upload metadata in the database."""
-
-        connection = sqlite3.connect(self.dbPathOrUrl)
-        cursor = connection.cursor()
+        connection = self.getConnection()
         create_table = '''CREATE TABLE IF NOT EXISTS metadata(
                 id STRING PRIMARY KEY,
                 title STRING NOT NULL,
                 creator STRING NOT NULL);
                 '''
+        connection.execute(create_table)
+        self.createCreatorsTable(connection.cursor())
+        connection.commit()
+        uploaded = []
+
+        def on_batch(cursor: sqlite3.Cursor, batch: list):
+            self.indexCreators(cursor, batch)
+            if self.entityView is not None:
+                uploaded.extend(row[0] for row in batch)
+
+        self.ingestCsv(filename, "metadata", ["id", "title", "creator"], METADATA_INDEXES, on_batch)
+        if self.entityView is not None:
+            self.entityView.refreshEntities(uploaded)
+        return True
+
+    def createCreatorsTable(self, cursor: sqlite3.Cursor):
+        """it creates the table metadata_creators, which links every entity to each of its creators,
+        filling it from the metadata already in the database when the table did not exist yet."""
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'metadata_creators'")
+        exists = cursor.fetchone() is not None
+        create_table = '''CREATE TABLE IF NOT EXISTS metadata_creators(
+                entity_id STRING NOT NULL,
+                creator STRING NOT NULL,
+                PRIMARY KEY (entity_id, creator));
+                '''
         cursor.execute(create_table)
-        with open(filename, "r", encoding="utf-8") as file:
-            contents = csv.reader(file)
-            next(contents)
-            insert_records = "INSERT INTO metadata (id, title, creator) VALUES(?, ?, ?)"
-            try:
-                cursor.executemany(insert_records, contents)
-                connection.commit()
-                connection.close()
-            except sqlite3.IntegrityError:
-                print("Error: the database already contains the entity with the same identifier.")
+        if not exists:
+            self.indexCreators(cursor, cursor.execute("SELECT id FROM metadata").fetchall())
+
+    @staticmethod
+    def indexCreators(cursor: sqlite3.Cursor, batch: list):
+        """it rebuilds the rows of metadata_creators of the entities in the input batch of metadata rows
+        from the creators currently stored in metadata, whatever the conflict policy kept for each of them."""
+        ids = [row[0] for row in batch]
+        cursor.executemany("DELETE FROM metadata_creators WHERE entity_id = ?", [(id,) for id in ids])
+        insert_creators = "INSERT OR IGNORE INTO metadata_creators (entity_id, creator) VALUES(?, ?)"
+        for start in range(0, len(ids), SQLITE_MAX_PARAMETERS):
+            chunk = ids[start:start + SQLITE_MAX_PARAMETERS]
+            select = f"SELECT id, creator FROM metadata WHERE id IN ({', '.join('?' * len(chunk))})"
+            cursor.executemany(insert_creators, [
+                (id, creator)
+                for id, creators in cursor.execute(select, chunk).fetchall()
+                for creator in split_creators(creators)
+            ])
+
+
+class RelationalQueryProcessor(RelationalProcessor, QueryProcessor):
+    """
+        The processor querying the relational database. It can export its tables in a columnar snapshot
+        (see exportSnapshot), which another processor, e.g. in a new process, loads with loadSnapshot
+        to answer the scans of whole tables (getAllAnnotations and getAllImages) without reading the rows of SQLite,
+        as long as the change counter of the database is the one the snapshot is stamped with.
+        """
+    snapshot = None
+
+    def exportSnapshot(self, directory: str, compression: str = None) -> bool:
+        """it writes the tables annotations and metadata in the input directory, as Arrow IPC files
+        stamped with the change counter of the database. By default the files are not compressed, so that
+        loadSnapshot reads their columns straight from the memory map; with a codec ("lz4" or "zstd") they take
+        less disk, but every load decompresses them in memory. It requires the package pyarrow."""
+        connection = self.getConnection()
+        connection.commit()
+        cursor = connection.cursor()
+        # the tables and the change counter are read in the same transaction, so that they match
+        cursor.execute("BEGIN;")
+        try:
+            existing = {row[0] for row in cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            change_counter = self.getChangeCounter()
+            # the tables are stored with the dtypes of SQLite, whatever compactResults
+            tables = {table: self.instrumentQuery(f"SELECT * FROM {table}", lambda: (
+                pd.read_sql(f"SELECT * FROM {table}", connection), None)) for table in SNAPSHOT_TABLES if table in existing}
+        finally:
+            connection.commit()
+        return write_snapshot(directory, tables, change_counter, compression)
+
+    def loadSnapshot(self, directory: str) -> bool:
+        """it loads the snapshot in the input directory, used by the scans of whole tables as long as
+        no data is uploaded in the database. It returns False if there is no snapshot, or if it is stale."""
+        snapshot = read_snapshot(directory)
+        if snapshot is None or snapshot.change_counter != self.getChangeCounter():
+            return False
+        self.snapshot = snapshot
         return True
 
+    def getSnapshot(self, table: str):
+        """it returns the loaded snapshot if it includes the input table and the database has not changed since
+        it was exported, and None otherwise: once stale, the snapshot is discarded."""
+        snapshot = self.snapshot
+        if snapshot is None or not snapshot.hasTable(table):
+            return None
+        if snapshot.change_counter != self.getChangeCounter():
+            self.snapshot = None
+            return None
+        return snapshot
 
-class RelationalQueryProcessor(QueryProcessor):
+    def readSql(self, query: str, params=None) -> pd.DataFrame:
+        """it runs the input SQL query with the input parameters and returns its results as a data frame."""
+        if self.compactResults:
+            # the rows are compacted while they are read, a chunk at a time (see compact_chunks)
+            return self.instrumentQuery(query, lambda: (compact_chunks(
+                pd.read_sql(query, self.getConnection(), params=params, chunksize=self.chunkSize)), None))
+        return self.instrumentQuery(query, lambda: (pd.read_sql(query, self.getConnection(), params=params), None))
 
     def getEntityById(self, id: str) -> pd.DataFrame:
         if not isinstance(id, str):
             return None
-        with sqlite3.connect(self.dbPathOrUrl) as con:
-            query = "SELECT * FROM metadata WHERE id = ?"
-            result = pd.read_sql(query, con, params=(id,))
-            if not result.empty:
-                return result
-            query = "SELECT * FROM annotations WHERE id = ?"
-            result = pd.read_sql(query, con, params=(id,))
+        query = "SELECT * FROM metadata WHERE id = ?"
+        result = self.readSql(query, (id,))
+        if not result.empty:
             return result
+        query = "SELECT * FROM annotations WHERE id = ?"
+        result = self.readSql(query, (id,))
+        return result
+
+    def getEntitiesByIds(self, ids) -> pd.DataFrame:
+        """it returns a data frame containing the metadata of all the entities matching the input identifiers,
+        retrieved with a single query, whatever their number: the identifiers are bound as one JSON array,
+        joined with metadata through json_each instead of a host parameter each."""
+        ids = list(dict.fromkeys(id for id in ids if isinstance(id, str)))
+        query = "SELECT metadata.* FROM json_each(?) AS ids JOIN metadata ON metadata.id = ids.value"
+        return self.readSql(query, (json.dumps(ids),))
 
     def getAllAnnotations(self):
-        with sqlite3.connect(self.dbPathOrUrl) as con:
-            query = "SELECT * FROM annotations"
-            df_sql = pd.read_sql(query, con)
+        snapshot = self.getSnapshot("annotations")
+        if snapshot is not None:
+            return self.compactResult(snapshot.getTable("annotations"))
+        query = "SELECT * FROM annotations"
+        df_sql = self.readSql(query)
         return df_sql
 
+    def iterSql(self, query: str, params=None, chunk_size: int = None):
+        """it runs the input SQL query with the input parameters and yields its results as data frames
+        of at most chunk_size rows (chunkSize if None), read from the database while they are consumed.
+        The query is recorded in the instrumentation once all its chunks have been read."""
+        rows, seconds, error, chunks = 0, 0.0, None, None
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    if chunks is None:
+                        chunks = pd.read_sql(query, self.getConnection(), params=params,
+                                             chunksize=chunk_size or self.chunkSize)
+                    chunk = next(chunks, None)
+                except Exception as exception:
+                    error = f"{type(exception).__name__}: {exception}"
+                    raise
+                finally:
+                    seconds += time.perf_counter() - start
+                if chunk is None:
+                    return
+                rows += len(chunk)
+                yield self.compactResult(chunk)
+        finally:
+            if chunks is not None:
+                chunks.close()
+            self.recordQuery(query, seconds, rows, None, error)
+
+    def iterAllAnnotations(self, chunk_size: int = None):
+        """it yields all the annotations included in the database as data frames of at most chunk_size rows
+        (chunkSize if None), so that the memory used does not depend on the number of annotations."""
+        snapshot = self.getSnapshot("annotations")
+        if snapshot is not None:
+            return map(self.compactResult, snapshot.iterTable("annotations", None, chunk_size or self.chunkSize))
+        return self.iterSql("SELECT * FROM annotations", None, chunk_size)
+
+    def iterAllImages(self, chunk_size: int = None):
+        """it yields all the images included in the database as data frames of at most chunk_size rows
+        (chunkSize if None), so that the memory used does not depend on the number of images."""
+        snapshot = self.getSnapshot("annotations")
+        if snapshot is not None:
+            return map(self.compactResult, snapshot.iterTable("annotations", ["body"], chunk_size or self.chunkSize))
+        return self.iterSql("SELECT body FROM annotations", None, chunk_size)
+
     def getAllImages(self):
         """it returns a data frame containing all the images included in the database."""
-        with sqlite3.connect(self.dbPathOrUrl) as con:
-            query = "SELECT body FROM annotations"
-            df_sql = pd.read_sql(query, con)
+        snapshot = self.getSnapshot("annotations")
+        if snapshot is not None:
+            return self.compactResult(snapshot.getTable("annotations", ["body"]))
+        query = "SELECT body FROM annotations"
+        df_sql = self.readSql(query)
         return df_sql
 
     def getAnnotationsWithBody(self, body):
         """"it returns a data frame containing all the annotations included in the database
         that have, as annotation body, the entity specified by the input identifier."""
-        with sqlite3.connect(self.dbPathOrUrl) as con:
-            query = "SELECT * FROM annotations"
-            df_sql = pd.read_sql(query, con)
-
-        return df_sql.query(f"body == '{body}'")
+        query = "SELECT * FROM annotations WHERE body = ?"
+        df_sql = self.readSql(query, (body,))
+        return df_sql
 
     def getAnnotationsWithTarget(self, target):
         """it returns a data frame containing all the annotations included in the database
         that have, as annotation target, the entity specified by the input identifier."""
-        with sqlite3.connect(self.dbPathOrUrl) as con:
-            query = "SELECT * FROM annotations"
-            df_sql = pd.read_sql(query, con)
-        return df_sql.query(f"target == '{target}'")
+        query = "SELECT * FROM annotations WHERE target = ?"
+        df_sql = self.readSql(query, (target,))
+        return df_sql
 
     def getAnnotationsWithBodyAndTarget(self, body, target):
         """it returns a data frame containing all the annotations included in the database
         that have, as annotation body and annotation target, the entities specified by the input identifiers."""
-        with sqlite3.connect(self.dbPathOrUrl) as con:
-            query = "SELECT * FROM annotations"
-            df_sql = pd.read_sql(query, con)
-        return df_sql.query(f"body == '{body}' and target == '{target}'")
+        query = "SELECT * FROM annotations WHERE body = ? AND target = ?"
+        df_sql = self.readSql(query, (body, target))
+        return df_sql
 
     def getEntitiesWithCreator(self, creator):
         """it returns a data frame containing all the metadata included in the database
         related to the entities having the input creator as one of their creators."""
-        with sqlite3.connect(self.dbPathOrUrl) as con:
-            query = "SELECT * FROM metadata"
-            df_sql = pd.read_sql(query, con)
-        return df_sql[df_sql['creator'].str.contains(creator)]
+        query = """SELECT * FROM metadata
+            WHERE id IN (SELECT entity_id FROM metadata_creators WHERE creator = ?)"""
+        df_sql = self.readSql(query, (creator,))
+        return df_sql
+
+    def getAllCreators(self):
+        """it returns a data frame containing all the creators included in the database,
+        together with the number of entities each of them is a creator of."""
+        query = """SELECT creator, COUNT(*) AS entities FROM metadata_creators
+            GROUP BY creator ORDER BY entities DESC, creator"""
+        df_sql = self.readSql(query)
+        return df_sql
+
+    def hasEntityView(self) -> bool:
+        """it returns True if the database contains the entity view (see EntityViewProcessor)."""
+        query = "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'entity_view'"
+        return self.getConnection().execute(query).fetchone() is not None
+
+    def getViewEntityById(self, id: str) -> pd.DataFrame:
+        """it returns a data frame with the row of the entity view matching the input identifier, if any."""
+        query = f"SELECT {ENTITY_VIEW_COLUMNS} FROM entity_view WHERE id = ?"
+        return self.readSql(query, (id,))
+
+    def getViewEntitiesWithTitle(self, title: str) -> pd.DataFrame:
+        """it returns a data frame with the rows of the entity view having, as title, the input title."""
+        query = f"SELECT {ENTITY_VIEW_COLUMNS} FROM entity_view WHERE title = ?"
+        return self.readSql(query, (title,))
+
+    def getViewEntitiesWithLabel(self, label: str) -> pd.DataFrame:
+        """it returns a data frame with the rows of the entity view having, as label, the input label."""
+        query = f"SELECT {ENTITY_VIEW_COLUMNS} FROM entity_view WHERE label = ?"
+        return self.readSql(query, (label,))
+
+    def getViewEntitiesWithCreator(self, creator: str) -> pd.DataFrame:
+        """it returns a data frame with the rows of the entity view having the input creator as one of their creators."""
+        query = f"""SELECT {ENTITY_VIEW_COLUMNS} FROM entity_view
+            WHERE id IN (SELECT entity_id FROM metadata_creators WHERE creator = ?)"""
+        return self.readSql(query, (creator,))
 
     def getEntitiesWithTitle(self, title):
         """it returns a data frame containing all the metadata included in the database
         related to the entities having, as title, the input title."""
-        with sqlite3.connect(self.dbPathOrUrl) as con:
-            query = "SELECT * FROM metadata"
-            df_sql = pd.read_sql(query, con)
-        return df_sql.query(f"title == '{title}'")
+        query = "SELECT * FROM metadata WHERE title = ?"
+        df_sql = self.readSql(query, (title,))
+        return df_sql
@@ -0,0 +1,101 @@
+# the columnar snapshots of the tables of the relational database, stored as Arrow IPC files
+# Snapshot, read_snapshot, write_snapshot
+
+import os
+
+import pandas as pd
+
+
+all = [
+    "Snapshot",
+    "read_snapshot",
+    "write_snapshot",
+]
+
+# the tables of the relational database included in a snapshot
+SNAPSHOT_TABLES = ["annotations", "metadata"]
+# the key of the schema metadata of every file storing the change counter of the database
+CHANGE_COUNTER_KEY = b"change_counter"
+
+
+def import_pyarrow():
+    """it returns the module pyarrow, which is only needed by the snapshots."""
+    try:
+        import pyarrow
+        import pyarrow.ipc
+    except ImportError:
+        raise ImportError("the snapshots of the relational database require the package pyarrow")
+    return pyarrow
+
+
+def snapshot_path(directory: str, table: str) -> str:
+    return os.path.join(directory, f"{table}.arrow")
+
+
+class Snapshot():
+    """
+        The tables of the relational database as they were when its change counter had the value change_counter
+        (see RelationalProcessor.getChangeCounter), as pyarrow Tables memory-mapped from their files.
+        """
+
+    def __init__(self, tables: dict, change_counter: int):
+        self.tables = tables
+        self.change_counter = change_counter
+
+    def hasTable(self, table: str) -> bool:
+        """it returns True if the snapshot includes the input table."""
+        return table in self.tables
+
+    def getTable(self, table: str, columns: list = None) -> pd.DataFrame:
+        """it returns the input table (or only the input columns of it) as a data frame."""
+        data = self.tables[table]
+        if columns is not None:
+            data = data.select(columns)
+        return data.to_pandas()
+
+    def iterTable(self, table: str, columns: list = None, chunk_size: int = 10000):
+        """it yields the input table (or only the input columns of it) as data frames of chunk_size rows each."""
+        data = self.tables[table]
+        if columns is not None:
+            data = data.select(columns)
+        for start in range(0, data.num_rows, chunk_size):
+            yield data.slice(start, chunk_size).to_pandas()
+
+
+def write_snapshot(directory: str, tables: dict, change_counter: int, compression: str = None) -> bool:
+    """it writes the input data frames, stamped with the input change counter, in the input directory,
+    an Arrow IPC file for each of them, compressed with the input codec ("lz4" or "zstd") or, by default,
+    not compressed, so that the memory-mapped files are read without copying them.
+    Every file is written in full before replacing the previous one, so that a reader never sees it half-written."""
+    pyarrow = import_pyarrow()
+    os.makedirs(directory, exist_ok=True)
+    options = pyarrow.ipc.IpcWriteOptions(compression=compression)
+    for table, dataframe in tables.items():
+        data = pyarrow.Table.from_pandas(dataframe, preserve_index=False)
+        data = data.replace_schema_metadata({**(data.schema.metadata or {}),
+                                             CHANGE_COUNTER_KEY: str(change_counter).encode()})
+        path = snapshot_path(directory, table)
+        with pyarrow.OSFile(path + ".tmp", "wb") as sink:
+            with pyarrow.ipc.new_file(sink, data.schema, options=options) as writer:
+                writer.write_table(data)
+        os.replace(path + ".tmp", path)
+    return True
+
+
+def read_snapshot(directory: str):
+    """it returns the Snapshot stored in the input directory, with its files memory-mapped,
+    or None if there is no snapshot or its files have been written at different times."""
+    pyarrow = import_pyarrow()
+    tables = {}
+    counters = set()
+    for table in SNAPSHOT_TABLES:
+        path = snapshot_path(directory, table)
+        if not os.path.exists(path):
+            continue
+        # the file stays mapped as long as the table reads its buffers
+        data = pyarrow.ipc.open_file(pyarrow.memory_map(path, "r")).read_all()
+        tables[table] = data
+        counters.add((data.schema.metadata or {}).get(CHANGE_COUNTER_KEY))
+    if not tables or len(counters) != 1 or None in counters:
+        return None
+    return Snapshot(tables, int(counters.pop()))
@@ -0,0 +1,1270 @@
+import asyncio
+import json
+import numpy
+import os
+import pyarrow
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from os import sep
+from typing import List
+from unittest.mock import patch
+from urllib.error import HTTPError
+from rdflib import Literal, URIRef
+from rdflib.namespace import RDFS
+import iiif
+import triplestore
+from relational import AnnotationProcessor, MetadataProcessor, RelationalQueryProcessor
+from rdf import CollectionProcessor, TriplestoreQueryProcessor
+from generic import GenericQueryProcessor
+from triplestore import LocalTriplestore, SPARQLEndpoint, decode_csv, ntriples
+from view import EntityViewProcessor
+from instrumentation import MetricsCollector
+from compact import decode_prefixes, encode_prefixes
+from benchmarks.synthetic import generate
+from asynchronous import AsyncGenericQueryProcessor, AsyncRelationalQueryProcessor, AsyncTriplestoreQueryProcessor
+import pandas as pd
+from pandas import DataFrame
+from model import IdentifiableEntity, Canvas, Collection, EntityWithMetadata, Image, Annotation, Manifest
+
+
+def add_labels(path: str, first: int, count: int) -> int:
+    """it adds to the LocalTriplestore in the input file, one triple at a time, the labels of count entities."""
+    store = LocalTriplestore(path)
+    for number in range(first, first + count):
+        store.add(ntriples([(URIRef(f"https://example.org/{number}"), RDFS.label, Literal(f"Label {number}"))]))
+    return len(store.graph)
+
+
+# The same checks of test_full.py, run against the local triplestore (a N-Triples file)
+# instead of Blazegraph, so that they do not need any database to be running.
+
+
+class TestProjectLocal(unittest.TestCase):
+
+    annotations = "data" + sep + "annotations.csv"
+    collections = ["data" + sep + "collection-1.json", "data" + sep + "collection-2.json"]
+    metadata = "data" + sep + "metadata.csv"
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        cls.relational = cls.directory + sep + "relational.db"
+        cls.graph = cls.directory + sep + "graph.nt"
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def test_01_AnnotationProcessor(self):
+        ann_dp = AnnotationProcessor()
+        self.assertTrue(ann_dp.setDbPathOrUrl(self.relational))
+        self.assertEqual(ann_dp.getDbPathOrUrl(), self.relational)
+        self.assertTrue(ann_dp.uploadData(self.annotations))
+
+    def test_02_MetadataProcessor(self):
+        met_dp = MetadataProcessor()
+        self.assertTrue(met_dp.setDbPathOrUrl(self.relational))
+        self.assertEqual(met_dp.getDbPathOrUrl(), self.relational)
+        self.assertTrue(met_dp.uploadData(self.metadata))
+
+    def test_03_CollectionProcessor(self):
+        col_dp = CollectionProcessor()
+        self.assertTrue(col_dp.setDbPathOrUrl(self.graph))
+        self.assertEqual(col_dp.getDbPathOrUrl(), self.graph)
+        for collection in self.collections:
+            self.assertTrue(col_dp.uploadData(collection))
+
+    def test_04_RelationalQueryProcessor(self):
+        rel_qp = RelationalQueryProcessor()
+        self.assertTrue(rel_qp.setDbPathOrUrl(self.relational))
+
+        self.assertIsInstance(rel_qp.getEntityById("just_a_test"), DataFrame)
+        self.assertEqual(rel_qp.getEntityById("just_a_test").shape, (0, 4))
+        self.assertIsInstance(rel_qp.getEntityById("https://dl.ficlit.unibo.it/iiif/2/28429/annotation/p0001-image"), DataFrame)
+        self.assertIsInstance(rel_qp.getEntityById("https://dl.ficlit.unibo.it/iiif/28429/collection"), DataFrame)
+
+        self.assertIsInstance(rel_qp.getAllAnnotations(), DataFrame)
+        self.assertIsInstance(rel_qp.getAllAnnotations().columns.to_list(), List)
+        self.assertEqual(rel_qp.getAllAnnotations().columns.to_list(), ['id', 'body', 'target', 'motivation'])
+        self.assertEqual(rel_qp.getAllAnnotations().shape, (271, 4))
+
+        self.assertIsInstance(rel_qp.getAllImages(), DataFrame)
+        self.assertIsInstance(rel_qp.getAllImages().columns.to_list(), List)
+        self.assertEqual(rel_qp.getAllImages().columns.to_list(), ['body'])
+        self.assertEqual(rel_qp.getAllImages().shape, (271, 1))
+
+        self.assertIsInstance(rel_qp.getAnnotationsWithBody("just_a_test"), DataFrame)
+        self.assertEqual(rel_qp.getAnnotationsWithBody("https://dl.ficlit.unibo.it/iiif/2/45498/full/699,800/0/default.jpg").shape, (1, 4))
+
+        annotation_1 = rel_qp.getAnnotationsWithBodyAndTarget(
+            "https://dl.ficlit.unibo.it/iiif/2/45503/full/699,800/0/default.jpg",
+            "https://dl.ficlit.unibo.it/iiif/2/28429/canvas/p6",
+        )
+        self.assertIsInstance(annotation_1, DataFrame)
+        self.assertEqual(annotation_1.shape, (1, 4))
+
+        annotation_2 = rel_qp.getAnnotationsWithTarget("https://dl.ficlit.unibo.it/iiif/2/28429/canvas/p6")
+        self.assertIsInstance(annotation_2, DataFrame)
+        self.assertEqual(annotation_2.shape, (1, 4))
+
+        annotation_3 = rel_qp.getEntitiesWithCreator("just_a_test")
+        self.assertIsInstance(annotation_3, DataFrame)
+        self.assertEqual(annotation_3.shape, (0, 3))
+
+        annotation_4 = rel_qp.getEntitiesWithCreator("Doe, John")
+        self.assertIsInstance(annotation_4, DataFrame)
+        self.assertEqual(annotation_4.shape, (1, 3))
+
+        annotation_5 = rel_qp.getEntitiesWithTitle("Il Canzoniere")
+        self.assertIsInstance(annotation_5, DataFrame)
+        self.assertEqual(annotation_5.shape, (1, 3))
+
+    def test_05_TriplestoreQueryProcessor(self):
+        grp_qp = TriplestoreQueryProcessor()
+        self.assertTrue(grp_qp.setDbPathOrUrl(self.graph))
+
+        self.assertIsInstance(grp_qp.getEntityById("just_a_test"), DataFrame)
+        self.assertIsInstance(grp_qp.getEntityById("https://dl.ficlit.unibo.it/iiif/28429/collection"), DataFrame)
+        self.assertIsInstance(grp_qp.getEntityById("https://dl.ficlit.unibo.it/iiif/2/28429/canvas/p1"), DataFrame)
+
+        all_canvases = grp_qp.getAllCanvases()
+        self.assertIsInstance(all_canvases, DataFrame)
+        self.assertEqual(all_canvases.shape, (271, 3))
+        self.assertEqual(all_canvases.columns.to_list(), ['id', 'label', 'title'])
+
+        all_collections = grp_qp.getAllCollections()
+        self.assertIsInstance(all_collections, DataFrame)
+        self.assertEqual(all_collections.shape, (2, 2))
+        self.assertEqual(all_collections.columns.to_list(), ['id', 'label'])
+
+        all_manifests = grp_qp.getAllManifests()
+        self.assertIsInstance(all_manifests, DataFrame)
+        self.assertEqual(all_manifests.shape, (3, 2))
+        self.assertEqual(all_manifests.columns.to_list(), ['id', 'label'])
+
+        canvases_in_collection = grp_qp.getCanvasesInCollection("https://dl.ficlit.unibo.it/iiif/28429/collection")
+        self.assertIsInstance(canvases_in_collection, DataFrame)
+        self.assertEqual(canvases_in_collection.shape, (239, 5))
+        self.assertEqual(canvases_in_collection.columns.to_list(), ['manifest', 'id', 'label', 'type', 'title'])
+
+        canvases_in_manifest = grp_qp.getCanvasesInManifest("https://dl.ficlit.unibo.it/iiif/2/28429/manifest")
+        self.assertIsInstance(canvases_in_manifest, DataFrame)
+        self.assertEqual(canvases_in_manifest.shape, (239, 3))
+        self.assertEqual(canvases_in_manifest.columns.to_list(), ['id', 'label', 'title'])
+
+        entity = grp_qp.getEntityById("https://dl.ficlit.unibo.it/iiif/2/28429/manifest")
+        self.assertIsInstance(entity, DataFrame)
+        self.assertEqual(entity.shape, (1, 3))
+        self.assertEqual(entity.columns.to_list(), ['id', 'type', 'label'])
+
+        entity_with_label = grp_qp.getEntitiesWithLabel("BO0451_CAM6537_0010_p.[VI].jpg")
+        self.assertIsInstance(entity_with_label, DataFrame)
+        self.assertEqual(entity_with_label.shape, (1, 3))
+        self.assertEqual(entity_with_label.columns.to_list(), ['id', 'type', 'label'])
+
+        manifests = grp_qp.getManifestsInCollection("https://dl.ficlit.unibo.it/iiif/28429/collection")
+        self.assertIsInstance(manifests, DataFrame)
+        self.assertEqual(manifests.shape, (1, 3))
+        self.assertEqual(manifests.columns.to_list(), ['id', 'label', 'type'])
+
+    def test_06_GenericQueryProcessor(self):
+        rel_qp = RelationalQueryProcessor()
+        rel_qp.setDbPathOrUrl(self.relational)
+        grp_qp = TriplestoreQueryProcessor()
+        grp_qp.setDbPathOrUrl(self.graph)
+
+        generic = GenericQueryProcessor()
+        self.assertIsInstance(generic.cleanQueryProcessors(), bool)
+        self.assertTrue(generic.addQueryProcessor(rel_qp))
+        self.assertTrue(generic.addQueryProcessor(grp_qp))
+        self.assertIsInstance(generic.queryProcessors, list)
+        self.assertEqual(len(generic.queryProcessors), 2)
+        self.assertIsInstance(generic.queryProcessors[0], RelationalQueryProcessor)
+        self.assertIsInstance(generic.queryProcessors[1], TriplestoreQueryProcessor)
+
+        self.assertEqual(generic.getEntityById("just_a_test"), None)
+        self.assertIsInstance(generic.getEntityById("https://dl.ficlit.unibo.it/iiif/2/28429/canvas/p1"), Canvas)
+        self.assertIsInstance(generic.getEntityById("https://dl.ficlit.unibo.it/iiif/2/28429/manifest"), Manifest)
+        self.assertIsInstance(generic.getEntityById("https://dl.ficlit.unibo.it/iiif/28429/collection"), Collection)
+
+        self.assertIsInstance(generic.getAllAnnotations(), list)
+        ann_1 = generic.getAllAnnotations()
+        self.assertIsInstance(ann_1, list)
+        for a in ann_1:
+            self.assertIsInstance(a, Annotation)
+            self.assertIsInstance(a.target, IdentifiableEntity)
+            self.assertIsInstance(a.body, Image)
+            self.assertIsInstance(a.body.id, str)
+            self.assertIsInstance(a.motivation, str)
+
+        self.assertIsInstance(generic.getAllCanvas(), list)
+        can_1 = generic.getAllCanvas()
+        self.assertIsInstance(can_1, list)
+        for a in can_1:
+            self.assertIsInstance(a, Canvas)
+            self.assertIsInstance(a.id, str)
+
+        self.assertIsInstance(generic.getAllCollections(), list)
+        col_1 = generic.getAllCollections()
+        self.assertIsInstance(col_1, list)
+        for a in col_1:
+            self.assertIsInstance(a, Collection)
+            self.assertIsInstance(a.id, str)
+            self.assertIsInstance(a.label, str)
+            self.assertIsInstance(a.list_of_manifests, list)
+            self.assertIsInstance(a.list_of_manifests[0], Manifest)
+
+        self.assertIsInstance(generic.getAllImages(), list)
+        ima_1 = generic.getAllImages()
+        self.assertIsInstance(ima_1, list)
+        for a in ima_1:
+            self.assertIsInstance(a, Image)
+
+        self.assertEqual(len(generic.queryProcessors), 2)
+        self.assertIsInstance(generic.getAllManifests(), list)
+        man_1 = generic.getAllManifests()
+        self.assertIsInstance(man_1, list)
+        for a in man_1:
+            self.assertIsInstance(a, Manifest)
+            self.assertIsInstance(a.id, str)
+            self.assertIsInstance(a.label, str)
+            self.assertIsInstance(a.list_of_canvas, list)
+            self.assertIsInstance(a.list_of_canvas[0], Canvas)
+
+        self.assertIsInstance(generic.getAnnotationsToCanvas("just_a_test"), list)
+        ann_2 = generic.getAnnotationsToCanvas("https://dl.ficlit.unibo.it/iiif/2/28429/canvas/p1")
+        self.assertIsInstance(ann_2, list)
+        self.assertEqual(len(ann_2), 1)
+        for a in ann_2:
+            self.assertIsInstance(a, Annotation)
+            self.assertEqual(a.target.id, "https://dl.ficlit.unibo.it/iiif/2/28429/canvas/p1")
+            self.assertIsInstance(a.body, Image)
+            self.assertIsInstance(a.motivation, str)
+            self.assertEqual(a.motivation, "painting")
+            self.assertIsInstance(a.id, str)
+            self.assertIsInstance(a.target, IdentifiableEntity)
+
+        self.assertIsInstance(generic.getAnnotationsToCollection("just_a_test"), list)
+        ann_3 = generic.getAnnotationsToCollection("https://dl.ficlit.unibo.it/iiif/28429/collection")
+        self.assertIsInstance(ann_3, list)
+        for a in ann_3:
+            self.assertIsInstance(a, Annotation)
+            self.assertEqual(a.target.id, "https://dl.ficlit.unibo.it/iiif/28429/collection")
+            self.assertIsInstance(a.body, Image)
+            self.assertIsInstance(a.motivation, str)
+            self.assertEqual(a.motivation, "painting")
+            self.assertIsInstance(a.id, str)
+            self.assertIsInstance(a.target, IdentifiableEntity)
+
+        self.assertIsInstance(generic.getAnnotationsToManifest("just_a_test"), list)
+        ann_4 = generic.getAnnotationsToManifest("https://dl.ficlit.unibo.it/iiif/2/28429/manifest")
+        self.assertIsInstance(ann_4, list)
+        for a in ann_4:
+            self.assertIsInstance(a, Annotation)
+            self.assertEqual(a.target.id, "https://dl.ficlit.unibo.it/iiif/2/28429/manifest")
+            self.assertIsInstance(a.body, Image)
+            self.assertIsInstance(a.motivation, str)
+            self.assertEqual(a.motivation, "painting")
+            self.assertIsInstance(a.id, str)
+            self.assertIsInstance(a.target, IdentifiableEntity)
+
+        self.assertIsInstance(generic.getAnnotationsWithBody("just_a_test"), list)
+        ann_5 = generic.getAnnotationsWithBody("https://dl.ficlit.unibo.it/iiif/2/45499/full/699,800/0/default.jpg")
+        self.assertIsInstance(ann_5, list)
+        for a in ann_5:
+            self.assertIsInstance(a, Annotation)
+            self.assertIsInstance(a.body, Image)
+            self.assertIsInstance(a.target, IdentifiableEntity)
+
+        self.assertIsInstance(generic.getAnnotationsWithBodyAndTarget("just_a_test", "just_a_test"), list)
+        ann_6 = generic.getAnnotationsWithBodyAndTarget("https://dl.ficlit.unibo.it/iiif/2/45499/full/699,800/0/default.jpg", "https://dl.ficlit.unibo.it/iiif/2/28429/canvas/p3")
+        self.assertIsInstance(ann_6, list)
+        for a in ann_6:
+            self.assertIsInstance(a, Annotation)
+            self.assertIsInstance(a.body, Image)
+            self.assertIsInstance(a.target, IdentifiableEntity)
+
+        self.assertIsInstance(generic.getAnnotationsWithTarget("just_a_test"), list)
+        ann_7 = generic.getAnnotationsWithTarget("https://dl.ficlit.unibo.it/iiif/2/28429/canvas/p3")
+        self.assertIsInstance(ann_7, list)
+        for a in ann_7:
+            self.assertIsInstance(a, Annotation)
+            self.assertIsInstance(a.body, Image)
+            self.assertIsInstance(a.target, IdentifiableEntity)
+
+        self.assertIsInstance(generic.getCanvasesInCollection("just_a_test"), list)
+        can_2 = generic.getCanvasesInCollection("https://dl.ficlit.unibo.it/iiif/28429/collection")
+        self.assertIsInstance(can_2, list)
+        for a in can_2:
+            self.assertIsInstance(a, Canvas)
+            self.assertIsInstance(a.id, str)
+            self.assertIsInstance(a.label, str)
+
+        self.assertIsInstance(generic.getCanvasesInManifest("just_a_test"), list)
+        can_2 = generic.getCanvasesInManifest("https://dl.ficlit.unibo.it/iiif/2/28429/manifest")
+        self.assertIsInstance(can_2, list)
+        for a in can_2:
+            self.assertIsInstance(a, Canvas)
+            self.assertIsInstance(a.id, str)
+            self.assertIsInstance(a.label, str)
+
+        # It must return None in case the entity does not exist
+        self.assertEqual(generic.getEntityById("just_a_test"), None)
+        self.assertEqual(len(generic.queryProcessors), 2)
+        self.assertIsInstance(generic.getEntitiesWithCreator("just_a_test"), list)
+        ent_1 = generic.getEntitiesWithCreator("Alighieri, Dante")
+        self.assertIsInstance(ent_1, list)
+        for a in ent_1:
+            self.assertIsInstance(a, Manifest)
+            self.assertIsInstance(a.id, str)
+            self.assertIsInstance(a.label, str)
+            self.assertIsInstance(a.creators, list)
+
+        self.assertIsInstance(generic.getEntitiesWithLabel("just_a_test"), list)
+        ent_2 = generic.getEntitiesWithLabel("Il Canzoniere")
+        self.assertIsInstance(ent_2, list)
+        for a in ent_2:
+            self.assertIsInstance(a, Manifest)
+            self.assertIsInstance(a.id, str)
+            self.assertIsInstance(a.label, str)
+
+        self.assertIsInstance(generic.getEntitiesWithTitle("just_a_test"), list)  # : list[EntityWithMetadata]
+        ent_3 = generic.getEntitiesWithTitle("Dante Alighieri: Opere")
+        self.assertIsInstance(ent_3, list)
+        for a in ent_3:
+            self.assertIsInstance(a, Collection)
+            self.assertIsInstance(a.id, str)
+            self.assertIsInstance(a.label, str)
+
+        self.assertIsInstance(generic.getImagesAnnotatingCanvas("just_a_test"), list)
+        ima_2 = generic.getImagesAnnotatingCanvas("https://dl.ficlit.unibo.it/iiif/2/28429/canvas/p7")
+        self.assertIsInstance(ima_2, list)
+        for a in ima_2:
+            self.assertIsInstance(a, Image)
+
+        self.assertIsInstance(generic.getManifestsInCollection("just_a_test"), list)
+        man_2 = generic.getManifestsInCollection("https://dl.ficlit.unibo.it/iiif/28429/collection")
+        self.assertIsInstance(man_2, list)
+        for a in man_2:
+            self.assertIsInstance(a, Manifest)
+            self.assertIsInstance(a.id, str)
+            self.assertIsInstance(a.label, str)
+            self.assertIsInstance(a.list_of_canvas, list)
+            self.assertIsInstance(a.list_of_canvas[0], Canvas)
+
+    def test_07_LazyItems(self):
+        rel_qp = RelationalQueryProcessor()
+        rel_qp.setDbPathOrUrl(self.relational)
+        grp_qp = TriplestoreQueryProcessor()
+        grp_qp.setDbPathOrUrl(self.graph)
+        generic = GenericQueryProcessor()
+        generic.cleanQueryProcessors()
+        generic.addQueryProcessor(rel_qp)
+        generic.addQueryProcessor(grp_qp)
+
+        # the items are retrieved the first time they are read, unless they are prefetched
+        lazy = generic.getAllCollections()
+        self.assertFalse(any(c.hasLoadedItems() for c in lazy))
+        eager = generic.getAllCollections(prefetch=True)
+        self.assertTrue(all(c.hasLoadedItems() for c in eager))
+        for c_lazy, c_eager in zip(lazy, eager):
+            self.assertEqual(c_lazy.getId(), c_eager.getId())
+            self.assertEqual([m.getId() for m in c_lazy.getItems()], [m.getId() for m in c_eager.getItems()])
+            self.assertTrue(c_lazy.hasLoadedItems())
+            for m_lazy, m_eager in zip(c_lazy.getItems(), c_eager.getItems()):
+                self.assertEqual(m_lazy.getTitle(), m_eager.getTitle())
+                self.assertEqual([c.getId() for c in m_lazy.getItems()], [c.getId() for c in m_eager.getItems()])
+
+        self.assertTrue(generic.setPrefetchItems(True))
+        self.assertTrue(all(m.hasLoadedItems() for m in generic.getAllManifests()))
+
+    def test_08_ResultCache(self):
+        rel_qp = RelationalQueryProcessor()
+        rel_qp.setDbPathOrUrl(self.relational)
+        grp_qp = TriplestoreQueryProcessor()
+        grp_qp.setDbPathOrUrl(self.graph)
+        generic = GenericQueryProcessor()
+        generic.cleanQueryProcessors()
+        generic.addQueryProcessor(rel_qp)
+        generic.addQueryProcessor(grp_qp)
+        self.assertIsNone(generic.getCacheStatistics())
+        self.assertTrue(generic.setResultCache(max_size=2))
+
+        canvas = "https://dl.ficlit.unibo.it/iiif/2/28429/canvas/p1"
+        first = generic.getAnnotationsToCanvas(canvas)
+        self.assertEqual([a.getId() for a in generic.getAnnotationsToCanvas(canvas)], [a.getId() for a in first])
+        statistics = generic.getCacheStatistics()
+        self.assertEqual(statistics["hits"], 1)
+
+        # an upload in one of the databases invalidates the results read before
+        ann_dp = AnnotationProcessor()
+        ann_dp.setDbPathOrUrl(self.relational)
+        ann_dp.setConflictPolicy("insert-or-ignore")
+        ann_dp.uploadData(self.annotations)
+        generic.getAnnotationsToCanvas(canvas)
+        self.assertEqual(generic.getCacheStatistics()["invalidations"], 1)
+
+        generic.getEntityById(canvas)
+        generic.getAllImages()
+        statistics = generic.getCacheStatistics()
+        self.assertEqual(statistics["size"], 2)
+        self.assertGreaterEqual(statistics["evictions"], 1)
+
+        # the changes to a result read from the cache do not change the cached result
+        for mode in ("objects", "dataframe"):
+            hits = generic.getCacheStatistics()["hits"]
+            result = generic.getAnnotationsToCanvas(canvas, mode=mode)
+            expected = len(result)
+            if mode == "dataframe":
+                result.drop(result.index, inplace=True)
+            else:
+                result.clear()
+            changed = generic.getAnnotationsToCanvas(canvas, mode=mode)
+            self.assertEqual(len(changed), expected)
+            if mode == "dataframe":
+                changed.loc[0, "motivation"] = "changed"
+                self.assertNotEqual(generic.getAnnotationsToCanvas(canvas, mode=mode).loc[0, "motivation"], "changed")
+            self.assertGreater(generic.getCacheStatistics()["hits"], hits)
+
+    def test_09_ConcurrentQueries(self):
+        rel_qp = RelationalQueryProcessor()
+        rel_qp.setDbPathOrUrl(self.relational)
+        grp_qp = TriplestoreQueryProcessor()
+        grp_qp.setDbPathOrUrl(self.graph)
+        generic = GenericQueryProcessor()
+        generic.cleanQueryProcessors()
+        generic.addQueryProcessor(rel_qp)
+        generic.addQueryProcessor(grp_qp)
+
+        # the sub-queries sent at the same time return the same results as the ones sent one after the other
+        self.assertFalse(generic.setMaxWorkers(0))
+        self.assertTrue(generic.setMaxQueriesPerDatabase(2))
+        concurrent = generic.getAllCollections(prefetch=True)
+        self.assertTrue(generic.setMaxWorkers(1))
+        serial = generic.getAllCollections(prefetch=True)
+        self.assertEqual(
+            [(c.getId(), c.getTitle(), [m.getId() for m in c.getItems()]) for c in concurrent],
+            [(c.getId(), c.getTitle(), [m.getId() for m in c.getItems()]) for c in serial])
+        self.assertTrue(generic.close())
+
+    def test_10_AsyncGenericQueryProcessor(self):
+        rel_qp = AsyncRelationalQueryProcessor()
+        rel_qp.setDbPathOrUrl(self.relational)
+        grp_qp = AsyncTriplestoreQueryProcessor()
+        grp_qp.setDbPathOrUrl(self.graph)
+        generic = AsyncGenericQueryProcessor()
+        generic.cleanQueryProcessors()
+        generic.addQueryProcessor(rel_qp)
+        generic.addQueryProcessor(grp_qp)
+
+        async def run():
+            self.assertIsNone(await generic.getEntityById("just_a_test"))
+            manifest = await generic.getEntityById("https://dl.ficlit.unibo.it/iiif/2/28429/manifest")
+            self.assertIsInstance(manifest, Manifest)
+            # the get methods can run at the same time
+            collections, annotations, canvases = await asyncio.gather(
+                generic.getAllCollections(),
+                generic.getAnnotationsToCanvas("https://dl.ficlit.unibo.it/iiif/2/28429/canvas/p1"),
+                generic.getCanvasesInManifest("https://dl.ficlit.unibo.it/iiif/2/28429/manifest"))
+            for c in collections:
+                self.assertIsInstance(c, Collection)
+                self.assertIsInstance(c.getItems()[0], Manifest)
+            for a in annotations:
+                self.assertEqual(a.target.id, "https://dl.ficlit.unibo.it/iiif/2/28429/canvas/p1")
+            for c in canvases:
+                self.assertIsInstance(c, Canvas)
+
+            request = asyncio.ensure_future(generic.getAllAnnotations())
+            await asyncio.sleep(0)
+            request.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await request
+
+        asyncio.run(run())
+
+    def test_11_EntityView(self):
+        view = EntityViewProcessor()
+        view.setDbPathOrUrl(self.relational)
+        self.assertFalse(view.refreshEntities())
+        self.assertTrue(view.setTriplestorePathOrUrl(self.graph))
+        self.assertTrue(view.refreshEntities())
+
+        rel_qp = RelationalQueryProcessor()
+        rel_qp.setDbPathOrUrl(self.relational)
+        grp_qp = TriplestoreQueryProcessor()
+        grp_qp.setDbPathOrUrl(self.graph)
+        generic = GenericQueryProcessor()
+        generic.cleanQueryProcessors()
+        generic.addQueryProcessor(rel_qp)
+        generic.addQueryProcessor(grp_qp)
+
+        def describe(entities):
+            return sorted((e.getId(), type(e).__name__, e.getLabel(), e.getTitle(), e.getCreators()) for e in entities)
+
+        joined = [describe(generic.getEntitiesWithTitle("Il Canzoniere")),
+                  describe(generic.getEntitiesWithLabel("Il Canzoniere")),
+                  describe(generic.getEntitiesWithCreator("Alighieri, Dante")),
+                  describe([generic.getEntityById("https://dl.ficlit.unibo.it/iiif/2/28429/manifest")])]
+        self.assertTrue(generic.setUseEntityView(True))
+        self.assertEqual(joined, [describe(generic.getEntitiesWithTitle("Il Canzoniere")),
+                                  describe(generic.getEntitiesWithLabel("Il Canzoniere")),
+                                  describe(generic.getEntitiesWithCreator("Alighieri, Dante")),
+                                  describe([generic.getEntityById("https://dl.ficlit.unibo.it/iiif/2/28429/manifest")])])
+        self.assertIsInstance(generic.getEntityById("https://dl.ficlit.unibo.it/iiif/2/28429/annotation/p0001-image"), Annotation)
+
+        # the uploads refresh the rows of the entities they upload
+        met_dp = MetadataProcessor()
+        met_dp.setDbPathOrUrl(self.relational)
+        met_dp.setConflictPolicy("insert-or-replace")
+        self.assertTrue(met_dp.setEntityView(view))
+        met_dp.uploadData(self.metadata)
+        self.assertEqual(joined[0], describe(generic.getEntitiesWithTitle("Il Canzoniere")))
+        manifest = rel_qp.getViewEntityById("https://dl.ficlit.unibo.it/iiif/2/28429/manifest")
+        self.assertEqual(manifest["parent"][0], "https://dl.ficlit.unibo.it/iiif/28429/collection")
+        self.assertEqual(manifest["children"][0], len(generic.getCanvasesInManifest(manifest["id"][0])))
+
+    def test_12_ContainmentIndex(self):
+        rel_qp = RelationalQueryProcessor()
+        rel_qp.setDbPathOrUrl(self.relational)
+        grp_qp = TriplestoreQueryProcessor()
+        grp_qp.setDbPathOrUrl(self.graph)
+        generic = GenericQueryProcessor()
+        generic.cleanQueryProcessors()
+        generic.addQueryProcessor(rel_qp)
+        generic.addQueryProcessor(grp_qp)
+
+        collection = "https://dl.ficlit.unibo.it/iiif/28429/collection"
+        manifest = "https://dl.ficlit.unibo.it/iiif/2/28429/manifest"
+        canvas = "https://dl.ficlit.unibo.it/iiif/2/28429/canvas/p1"
+        queried = [sorted(grp_qp.getCanvasesInCollection(collection)["id"]),
+                   sorted(grp_qp.getCanvasesInManifest(manifest)["id"]),
+                   sorted(grp_qp.getManifestsInCollection(collection)["id"]),
+                   sorted(grp_qp.getAncestors(canvas)["id"])]
+        self.assertTrue(grp_qp.setUseContainmentIndex(True))
+        self.assertEqual(queried, [sorted(grp_qp.getCanvasesInCollection(collection)["id"]),
+                                   sorted(grp_qp.getCanvasesInManifest(manifest)["id"]),
+                                   sorted(grp_qp.getManifestsInCollection(collection)["id"]),
+                                   sorted(grp_qp.getAncestors(canvas)["id"])])
+
+        ancestors = generic.getAncestors(canvas)
+        self.assertEqual([type(a) for a in ancestors], [Manifest, Collection])
+        self.assertEqual([a.getId() for a in ancestors], [manifest, collection])
+        self.assertEqual(generic.getAncestors("just_a_test"), [])
+
+        # an upload in the triplestore loads the index again
+        index = grp_qp.getContainmentIndex()
+        col_dp = CollectionProcessor()
+        col_dp.setDbPathOrUrl(self.graph)
+        col_dp.uploadData(self.collections[0])
+        self.assertIsNot(index, grp_qp.getContainmentIndex())
+
+    def test_13_Instrumentation(self):
+        metrics = MetricsCollector(slow_query_threshold=0)
+        rel_qp = RelationalQueryProcessor()
+        rel_qp.setDbPathOrUrl(self.relational)
+        grp_qp = TriplestoreQueryProcessor()
+        grp_qp.setDbPathOrUrl(self.graph)
+        generic = GenericQueryProcessor()
+        generic.cleanQueryProcessors()
+        self.assertTrue(generic.setInstrumentation(metrics))
+        generic.addQueryProcessor(rel_qp)
+        generic.addQueryProcessor(grp_qp)
+
+        generic.getAllCollections(prefetch=True)
+        generic.getAnnotationsToCanvas("https://dl.ficlit.unibo.it/iiif/2/28429/canvas/p1")
+        records = metrics.getRecords("getAllCollections")
+        self.assertEqual(sorted({record.backend for record in records}), ["rdflib", "sqlite"])
+        self.assertTrue(all(record.seconds >= 0 and record.rows is not None for record in records))
+        self.assertTrue(all(record.size > 0 for record in records if record.backend == "rdflib"))
+        self.assertEqual([record.backend for record in metrics.getRecords("getAnnotationsToCanvas")], ["sqlite"])
+        self.assertEqual(metrics.getRecords("getAnnotationsWithTarget"), [])
+
+        summary = metrics.getSummary()
+        self.assertEqual(list(summary["operation"]), ["getAllCollections", "getAllCollections", "getAnnotationsToCanvas"])
+        self.assertEqual(summary["queries"].sum(), len(metrics.getRecords()))
+        self.assertTrue((summary["p50"] <= summary["p99"]).all() and (summary["p99"] <= summary["max"]).all())
+        self.assertEqual(len(metrics.getSlowQueries()), len(metrics.getRecords()))
+
+        ann_dp = AnnotationProcessor()
+        ann_dp.setDbPathOrUrl(self.relational)
+        self.assertTrue(ann_dp.setConflictPolicy("insert-or-ignore"))
+        self.assertTrue(ann_dp.setInstrumentation(metrics))
+        ann_dp.uploadData(self.annotations)
+        uploads = metrics.getUploadStatistics()["sqlite"]
+        self.assertEqual(uploads["uploads"], 1)
+        self.assertEqual(uploads["rows"], ann_dp.getUploadReport().rows)
+        self.assertTrue(metrics.clear())
+        self.assertEqual(metrics.getRecords(), [])
+
+    def test_14_Snapshot(self):
+        rel_qp = RelationalQueryProcessor()
+        rel_qp.setDbPathOrUrl(self.relational)
+        snapshot = self.directory + sep + "snapshot"
+        annotations = rel_qp.getAllAnnotations()
+        images = rel_qp.getAllImages()
+        self.assertTrue(rel_qp.exportSnapshot(snapshot))
+
+        worker = RelationalQueryProcessor()
+        worker.setDbPathOrUrl(self.relational)
+        metrics = MetricsCollector()
+        worker.setInstrumentation(metrics)
+        self.assertFalse(worker.loadSnapshot(self.directory + sep + "just_a_test"))
+        # the files are not compressed by default, so that their tables are read from the memory map, not copied
+        allocated = pyarrow.total_allocated_bytes()
+        self.assertTrue(worker.loadSnapshot(snapshot))
+        self.assertEqual(pyarrow.total_allocated_bytes(), allocated)
+        compressed = RelationalQueryProcessor()
+        compressed.setDbPathOrUrl(self.relational)
+        self.assertTrue(rel_qp.exportSnapshot(snapshot + "-lz4", compression="lz4"))
+        allocated = pyarrow.total_allocated_bytes()
+        self.assertTrue(compressed.loadSnapshot(snapshot + "-lz4"))
+        self.assertGreater(pyarrow.total_allocated_bytes(), allocated)
+        self.assertTrue(compressed.getAllAnnotations().equals(annotations))
+        self.assertTrue(worker.getAllAnnotations().equals(annotations))
+        self.assertEqual(sorted(worker.getAllImages()["body"]), sorted(images["body"]))
+        self.assertEqual(metrics.getRecords(), [])
+
+        # an upload makes the snapshot stale, so that the scans read the database again
+        change_counter = worker.getChangeCounter()
+        ann_dp = AnnotationProcessor()
+        ann_dp.setDbPathOrUrl(self.relational)
+        ann_dp.setConflictPolicy("insert-or-ignore")
+        ann_dp.uploadData(self.annotations)
+        self.assertEqual(worker.getChangeCounter(), change_counter + 1)
+        self.assertTrue(worker.getAllAnnotations().equals(annotations))
+        self.assertEqual(len(metrics.getRecords()), 1)
+        self.assertIsNone(worker.snapshot)
+        self.assertFalse(worker.loadSnapshot(snapshot))
+
+    def test_15_Iterators(self):
+        rel_qp = RelationalQueryProcessor()
+        rel_qp.setDbPathOrUrl(self.relational)
+        grp_qp = TriplestoreQueryProcessor()
+        grp_qp.setDbPathOrUrl(self.graph)
+        generic = GenericQueryProcessor()
+        generic.cleanQueryProcessors()
+        generic.addQueryProcessor(rel_qp)
+        generic.addQueryProcessor(grp_qp)
+        self.assertFalse(generic.setChunkSize(0))
+        self.assertTrue(generic.setChunkSize(100))
+
+        annotations = rel_qp.getAllAnnotations()
+        chunks = list(rel_qp.iterAllAnnotations(100))
+        self.assertTrue(all(len(chunk) <= 100 for chunk in chunks))
+        self.assertTrue(pd.concat(chunks, ignore_index=True).equals(annotations))
+        self.assertEqual(sorted(pd.concat(rel_qp.iterAllImages(100))["body"]), sorted(rel_qp.getAllImages()["body"]))
+
+        columns = ["id", "label", "title"]
+        pages = list(grp_qp.iterAllCanvases(50))
+        self.assertGreater(len(pages), 1)
+        self.assertTrue(all(page["id"].nunique() <= 50 for page in pages))
+        self.assertTrue(pd.concat(pages).sort_values(columns).reset_index(drop=True).equals(
+            grp_qp.getAllCanvases().sort_values(columns).reset_index(drop=True)))
+
+        batches = list(generic.iterAllAnnotations())
+        self.assertTrue(all(len(batch) <= 100 and all(isinstance(a, Annotation) for a in batch) for batch in batches))
+        self.assertEqual([a.getId() for batch in batches for a in batch], list(annotations["id"]))
+        self.assertEqual(sorted(i.getId() for batch in generic.iterAllImages() for i in batch),
+                         sorted(i.getId() for i in generic.getAllImages()))
+        self.assertEqual(sorted(c.getId() for batch in generic.iterAllCanvas(chunk_size=50) for c in batch),
+                         sorted(c.getId() for c in generic.getAllCanvas()))
+        self.assertIsInstance(next(generic.iterAllCanvas(mode="dataframe")), DataFrame)
+
+        # the queries of the chunks are recorded under the iterator, even if it is not consumed to the end
+        metrics = MetricsCollector()
+        generic.setInstrumentation(metrics)
+        next(generic.iterAllAnnotations())
+        rel_qp.getAllImages()
+        self.assertEqual([record.operation for record in metrics.getRecords()], ["iterAllAnnotations", None])
+
+    def test_16_CompactResults(self):
+        rel_qp = RelationalQueryProcessor()
+        rel_qp.setDbPathOrUrl(self.relational)
+        grp_qp = TriplestoreQueryProcessor()
+        grp_qp.setDbPathOrUrl(self.graph)
+        generic = GenericQueryProcessor()
+        generic.cleanQueryProcessors()
+        generic.addQueryProcessor(rel_qp)
+        generic.addQueryProcessor(grp_qp)
+        annotations = rel_qp.getAllAnnotations()
+        canvases = grp_qp.getAllCanvases()
+        collections = [(c.getId(), len(c.getItems())) for c in generic.getAllCollections()]
+
+        self.assertTrue(rel_qp.setCompactResults(True))
+        self.assertTrue(grp_qp.setCompactResults(True))
+        compact = rel_qp.getAllAnnotations()
+        self.assertEqual(compact["motivation"].dtype, "category")
+        self.assertNotEqual(compact["id"].dtype, object)
+        self.assertLess(compact.memory_usage(deep=True).sum(), annotations.memory_usage(deep=True).sum())
+        self.assertTrue(compact.astype(object).equals(annotations))
+        self.assertEqual(grp_qp.getAllCanvases().astype(object).values.tolist(), canvases.values.tolist())
+        self.assertEqual([(c.getId(), len(c.getItems())) for c in generic.getAllCollections()], collections)
+
+        encoded = encode_prefixes(annotations["id"])
+        self.assertEqual(encoded["prefix"].dtype, "category")
+        self.assertTrue(decode_prefixes(encoded).equals(annotations["id"]))
+
+    def test_17_ResultDecoding(self):
+        # the values are kept as strings, even the ones pandas would read as numbers or missing values
+        results = decode_csv(BytesIO(b'id,label\r\nhttps://example.org/1,1\r\nhttps://example.org/2,NA\r\n'
+                                     b'https://example.org/3,"two\r\nlines"\r\nhttps://example.org/4,\r\n'))
+        self.assertEqual(list(results.columns), ["id", "label"])
+        self.assertEqual(list(results["label"][:3]), ["1", "NA", "two\r\nlines"])
+        self.assertTrue(results["label"].isna()[3])
+        self.assertEqual(decode_csv(BytesIO(b'id,label\r\n')).shape, (0, 2))
+
+        grp_qp = TriplestoreQueryProcessor()
+        grp_qp.setDbPathOrUrl(self.graph)
+        query = grp_qp.prefix_sc + "SELECT (COUNT(?id) AS ?canvases) WHERE { ?id rdf:type sc:Canvas . }"
+        canvases = grp_qp.query(query, typed=True)["canvases"][0]
+        self.assertIsInstance(canvases, (int, numpy.integer))
+        self.assertEqual(str(canvases), grp_qp.query(query)["canvases"][0])
+        self.assertEqual(canvases, grp_qp.getAllCanvases()["id"].nunique())
+
+    def test_18_ExactCreators(self):
+        relational = self.directory + sep + "creators.db"
+        metadata = self.directory + sep + "creators.csv"
+        with open(metadata, "w", encoding="utf-8") as file:
+            file.write('id,title,creator\n'
+                       'https://example.org/1,First,"Doe, John; Doe, Jane"\n'
+                       'https://example.org/2,Second,"Doe, Johnny"\n'
+                       'https://example.org/3,Third,"Doe, Jane"\n')
+        met_dp = MetadataProcessor()
+        met_dp.setDbPathOrUrl(relational)
+        self.assertTrue(met_dp.uploadData(metadata))
+        rel_qp = RelationalQueryProcessor()
+        rel_qp.setDbPathOrUrl(relational)
+
+        # "Doe, John" is a substring of "Doe, Johnny", but not one of its creators
+        self.assertEqual(list(rel_qp.getEntitiesWithCreator("Doe, John")["id"]), ["https://example.org/1"])
+        self.assertEqual(list(rel_qp.getEntitiesWithCreator("Doe, Johnny")["id"]), ["https://example.org/2"])
+        self.assertEqual(rel_qp.getEntitiesWithCreator("Doe").shape, (0, 3))
+        self.assertEqual(rel_qp.getAllCreators().values.tolist(),
+                         [["Doe, Jane", 2], ["Doe, John", 1], ["Doe, Johnny", 1]])
+        rel_qp.close()
+        met_dp.close()
+
+    def test_19_ConflictPolicies(self):
+        annotations = self.directory + sep + "conflicts.csv"
+        # the third row repeats the identifier of the first one, and the fourth one misses two columns
+        with open(annotations, "w", encoding="utf-8") as file:
+            file.write("id,body,target,motivation\n"
+                       "a1,b1,t1,painting\n"
+                       "a2,b2,t2,painting\n"
+                       "a1,b3,t3,painting\n"
+                       "a3,b4\n"
+                       "a4,b5,t5,painting\n")
+        expected = {
+            # the batch with the duplicate is rolled back and the upload stops
+            "abort": ((5, 2, 3, 1), [("a1", "b1"), ("a2", "b2")]),
+            "insert-or-replace": ((5, 4, 1, 2), [("a1", "b3"), ("a2", "b2"), ("a4", "b5")]),
+            "insert-or-ignore": ((5, 3, 2, 2), [("a1", "b1"), ("a2", "b2"), ("a4", "b5")]),
+        }
+        for policy, (counts, rows) in expected.items():
+            ann_dp = AnnotationProcessor()
+            ann_dp.setDbPathOrUrl(self.directory + sep + f"{policy}.db")
+            self.assertFalse(ann_dp.setBatchSize(0))
+            self.assertTrue(ann_dp.setBatchSize(2))
+            self.assertTrue(ann_dp.setConflictPolicy(policy))
+            self.assertTrue(ann_dp.uploadData(annotations))
+            report = ann_dp.getUploadReport()
+            self.assertEqual((report.rows, report.inserted, report.rejected, report.batches), counts, policy)
+            stored = ann_dp.getConnection().execute("SELECT id, body FROM annotations ORDER BY id").fetchall()
+            self.assertEqual(stored, rows, policy)
+            ann_dp.close()
+        self.assertFalse(AnnotationProcessor().setConflictPolicy("just_a_test"))
+
+    def test_20_UploadRetries(self):
+        def triples(count: int):
+            for number in range(count):
+                yield URIRef(f"https://example.org/{number}"), RDFS.label, Literal(str(number))
+
+        class FlakyProcessor(CollectionProcessor):
+            retryDelay = 0
+
+            def __init__(self, failures: list):
+                self.failures = failures
+                self.sent = []
+
+            def store(self, data: str):
+                failure = self.failures.pop(0) if self.failures else None
+                if failure is not None:
+                    raise failure
+                self.sent.append(data)
+
+        # a 5xx answer and a dropped connection are retried, and the batches already stored are not sent again
+        col_dp = FlakyProcessor([None, HTTPError("https://example.org", 503, "Unavailable", None, None),
+                                 ConnectionResetError()])
+        col_dp.setBatchSize(2)
+        report = col_dp.uploadTriples("just_a_test", triples(5))
+        self.assertIsNone(report.error)
+        self.assertEqual((report.rows, report.inserted, report.batches, report.retries), (5, 5, 3, 2))
+        self.assertEqual(len(col_dp.sent), 3)
+        self.assertEqual(len(set(col_dp.sent)), 3)
+
+        # a 4xx answer is not retried
+        col_dp = FlakyProcessor([None, HTTPError("https://example.org", 400, "Bad Request", None, None)])
+        col_dp.setBatchSize(2)
+        report = col_dp.uploadTriples("just_a_test", triples(5))
+        self.assertEqual((report.rows, report.inserted, report.rejected, report.retries), (4, 2, 2, 0))
+        self.assertIn("400", report.error)
+        self.assertEqual(col_dp.failures, [])
+
+        # the retries are given up after maxRetries attempts
+        col_dp = FlakyProcessor([OSError()] * 5)
+        col_dp.maxRetries = 2
+        report = col_dp.uploadTriples("just_a_test", triples(1))
+        self.assertEqual((report.inserted, report.rejected), (0, 1))
+        self.assertEqual(len(col_dp.failures), 2)
+
+    def test_21_JsonEvents(self):
+        def events(value, prefix=""):
+            # the events of ijson.parse for a value decoded by json.loads
+            child = f"{prefix}." if prefix else ""
+            if isinstance(value, dict):
+                yield prefix, "start_map", None
+                for key, item in value.items():
+                    yield prefix, "map_key", key
+                    yield from events(item, child + key)
+                yield prefix, "end_map", None
+            elif isinstance(value, list):
+                yield prefix, "start_array", None
+                for item in value:
+                    yield from events(item, child + "item")
+                yield prefix, "end_array", None
+            elif isinstance(value, str):
+                yield prefix, "string", value
+            elif isinstance(value, bool):
+                yield prefix, "boolean", value
+            elif value is None:
+                yield prefix, "null", None
+            else:
+                yield prefix, "number", value
+
+        # long strings with escapes and multi-byte characters, so that tokens are split across the chunks
+        document = json.dumps({
+            "id": "https://example.org/collection",
+            "label": {"it": ["Àèìòù \"citazione\" \\ tab\t newline\n ☃ " * 5]},
+            "items": [{"id": "x" * 200, "n": -12.5e-3, "m": 1234567890, "ok": True, "no": False, "none": None},
+                      [], {}, "😀" * 40],
+            "last": 7,
+        }, ensure_ascii=False)
+        expected = list(events(json.loads(document)))
+        with patch.object(iiif, "ijson", None):
+            for chunk_size in (1, 2, 3, 7, 64, 65536):
+                parsed = list(iiif.iter_json_events(BytesIO(document.encode("utf-8")), chunk_size))
+                self.assertEqual(parsed, expected, chunk_size)
+            # escapes written as \\uXXXX and a truncated file
+            escaped = json.dumps({"label": ["è☃😀" * 30]})
+            parsed = list(iiif.iter_json_events(BytesIO(escaped.encode("ascii")), 1))
+            self.assertEqual(parsed, list(events(json.loads(escaped))))
+            with self.assertRaises(json.JSONDecodeError):
+                list(iiif.iter_json_events(BytesIO(document[:-20].encode("utf-8")), 3))
+
+    def test_22_UploadFiles(self):
+        graph = self.directory + sep + "files.nt"
+        missing = self.directory + sep + "just_a_test.json"
+        broken = self.directory + sep + "broken.json"
+        with open(self.collections[0], encoding="utf-8") as file:
+            # a file cut in the middle, whose first triples are uploaded before the error
+            broken_text = file.read()[:5000]
+        with open(broken, "w", encoding="utf-8") as file:
+            file.write(broken_text)
+        col_dp = CollectionProcessor()
+        col_dp.setDbPathOrUrl(graph)
+        col_dp.setBatchSize(100)
+        reports = col_dp.uploadFiles(self.collections + [missing, broken], processes=2, http_workers=2)
+
+        self.assertEqual(list(reports), self.collections + [missing, broken])
+        for collection in self.collections:
+            report = reports[collection]
+            self.assertIsNone(report.error)
+            self.assertGreater(report.rows, 100)
+            self.assertEqual((report.inserted, report.rejected), (report.rows, 0))
+            self.assertEqual(report.batches, -(-report.rows // 100))
+        self.assertIn("FileNotFoundError", reports[missing].error)
+        self.assertEqual(reports[missing].rows, 0)
+        self.assertIn("JSONDecodeError", reports[broken].error)
+        self.assertEqual(reports[broken].inserted, reports[broken].rows)
+        total = col_dp.getUploadReport()
+        self.assertEqual(total.rows, sum(report.rows for report in reports.values()))
+
+        grp_qp = TriplestoreQueryProcessor()
+        grp_qp.setDbPathOrUrl(graph)
+        self.assertEqual(grp_qp.getAllCanvases().shape, (271, 3))
+        self.assertEqual(grp_qp.getAllCollections().shape, (2, 2))
+
+    def test_23_LocalTriplestoreDuplicates(self):
+        graph = self.directory + sep + "duplicates.nt"
+        col_dp = CollectionProcessor()
+        col_dp.setDbPathOrUrl(graph)
+        self.assertTrue(col_dp.uploadData(self.collections[0]))
+        with open(graph, encoding="utf-8") as file:
+            lines = file.readlines()
+        # the triples already stored are not appended again
+        self.assertTrue(col_dp.uploadData(self.collections[0]))
+        with open(graph, encoding="utf-8") as file:
+            self.assertEqual(file.readlines(), lines)
+        self.assertEqual(len(set(lines)), len(lines))
+        self.assertEqual(len(LocalTriplestore(graph).query("SELECT * WHERE { ?s ?p ?o . }")), len(lines))
+
+        # the literals with line breaks are written on a single line
+        triple = (URIRef("https://example.org/1"), RDFS.label, Literal('two\nlines "quoted" \\', lang="it"))
+        self.assertEqual(ntriples([triple]).count("\n"), 1)
+        LocalTriplestore(graph).add(ntriples([triple]))
+        labels = LocalTriplestore(graph).query("SELECT ?label WHERE { <https://example.org/1> ?p ?label . }")
+        self.assertEqual(list(labels["label"]), [str(triple[2])])
+
+    def test_24_MissingQueryProcessors(self):
+        rel_qp = RelationalQueryProcessor()
+        rel_qp.setDbPathOrUrl(self.relational)
+        grp_qp = TriplestoreQueryProcessor()
+        grp_qp.setDbPathOrUrl(self.graph)
+
+        # the results that only the other database could give are empty
+        relational_only = GenericQueryProcessor()
+        relational_only.cleanQueryProcessors()
+        relational_only.addQueryProcessor(rel_qp)
+        self.assertEqual(relational_only.getAllCanvas(), [])
+        self.assertEqual(relational_only.getCanvasesInCollection("https://dl.ficlit.unibo.it/iiif/28429/collection"), [])
+        self.assertEqual(relational_only.getCanvasesInManifest("https://dl.ficlit.unibo.it/iiif/2/28429/manifest"), [])
+        self.assertEqual(list(relational_only.iterAllCanvas()), [])
+        self.assertEqual(relational_only.getAllCanvas(mode="dataframe").columns.to_list(), ["id", "label", "title"])
+        self.assertEqual(len(relational_only.getAllImages()), 271)
+
+        triplestore_only = GenericQueryProcessor()
+        triplestore_only.cleanQueryProcessors()
+        triplestore_only.addQueryProcessor(grp_qp)
+        self.assertEqual(triplestore_only.getAllAnnotations(), [])
+        self.assertEqual(triplestore_only.getAllImages(), [])
+        self.assertEqual(triplestore_only.getImagesAnnotatingCanvas("https://dl.ficlit.unibo.it/iiif/2/28429/canvas/p1"), [])
+        self.assertEqual(list(triplestore_only.iterAllAnnotations()), [])
+        self.assertEqual(len(triplestore_only.getAllCanvas()), 271)
+
+        asynchronous = AsyncGenericQueryProcessor()
+        asynchronous.cleanQueryProcessors()
+        asynchronous.addQueryProcessor(rel_qp)
+        self.assertEqual(asyncio.run(asynchronous.getAllCanvas()), [])
+        self.assertEqual(asyncio.run(asynchronous.getCanvasesInManifest("https://dl.ficlit.unibo.it/iiif/2/28429/manifest")), [])
+
+    def test_25_PerDatabaseLimit(self):
+        rel_qp = RelationalQueryProcessor()
+        rel_qp.setDbPathOrUrl(self.relational)
+        grp_qp = TriplestoreQueryProcessor()
+        grp_qp.setDbPathOrUrl(self.graph)
+        generic = GenericQueryProcessor()
+        generic.cleanQueryProcessors()
+        generic.addQueryProcessor(rel_qp)
+        generic.addQueryProcessor(grp_qp)
+
+        # every sub-query waits for its turn on its database
+        with patch.object(generic, "run_query", wraps=generic.run_query) as run_query:
+            self.assertEqual(len(generic.getEntitiesWithLabel("Il Canzoniere")), 1)
+        self.assertEqual([call.args[:2] for call in run_query.call_args_list],
+                         [(grp_qp, "getEntitiesWithLabel"), (rel_qp, "getEntitiesByIds")])
+
+    def test_26_AsyncCancelledQueries(self):
+        rel_qp = AsyncRelationalQueryProcessor()
+        rel_qp.setDbPathOrUrl(self.relational)
+        count = "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 3000000) SELECT COUNT(*) FROM n"
+
+        async def run():
+            finished = threading.Event()
+            connections = []
+
+            def query(self):
+                connections.append(self.getConnection())
+                finished.set()
+
+            request = asyncio.ensure_future(rel_qp.run(query))
+            await asyncio.sleep(0)
+            # the query of the coroutine has already ended when it is cancelled,
+            # and its thread has started another query on the same connection
+            finished.wait()
+            time.sleep(0.05)
+            other = ThreadPoolExecutor(1).submit(lambda: connections[0].execute(count).fetchone()[0])
+            time.sleep(0.05)
+            request.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await request
+            self.assertEqual(other.result(), 3000000)
+
+        asyncio.run(run())
+        rel_qp.close()
+
+    def test_27_Indexes(self):
+        rel_qp = RelationalQueryProcessor()
+        rel_qp.setDbPathOrUrl(self.relational)
+        connection = rel_qp.getConnection()
+        indexes = {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        self.assertTrue({"idx_annotations_target", "idx_annotations_body", "idx_annotations_body_target",
+                         "idx_metadata_title", "idx_metadata_creators_creator"} <= indexes)
+
+        def plan(query: str, *args) -> str:
+            return " ".join(row[-1] for row in connection.execute("EXPLAIN QUERY PLAN " + query, args))
+
+        self.assertIn("USING INDEX idx_annotations_target",
+                      plan("SELECT * FROM annotations WHERE target = ?", "just_a_test"))
+        self.assertIn("USING INDEX idx_annotations_body_target",
+                      plan("SELECT * FROM annotations WHERE body = ? AND target = ?", "just_a_test", "just_a_test"))
+        self.assertIn("USING INDEX idx_metadata_title", plan("SELECT * FROM metadata WHERE title = ?", "just_a_test"))
+        # the query of getEntitiesWithCreator
+        self.assertRegex(plan("SELECT * FROM metadata WHERE id IN (SELECT entity_id FROM metadata_creators WHERE creator = ?)",
+                              "just_a_test"), "USING (COVERING )?INDEX idx_metadata_creators_creator")
+        rel_qp.close()
+
+    def test_28_Connections(self):
+        rel_qp = RelationalQueryProcessor()
+        rel_qp.setDbPathOrUrl(self.relational)
+        connection = rel_qp.getConnection()
+        self.assertEqual(connection.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+        # every thread keeps its own connection
+        self.assertIs(rel_qp.getConnection(), connection)
+        with ThreadPoolExecutor(1) as thread:
+            other = thread.submit(rel_qp.getConnection).result()
+            self.assertIs(thread.submit(rel_qp.getConnection).result(), other)
+        self.assertIsNot(other, connection)
+        self.assertTrue(rel_qp.close())
+        self.assertIsNot(rel_qp.getConnection(), connection)
+        rel_qp.close()
+
+    def test_29_LocalTriplestoreProcesses(self):
+        graph = self.directory + sep + "processes.nt"
+        count = "SELECT (COUNT(*) AS ?triples) WHERE { ?s ?p ?o . }"
+        first, second = LocalTriplestore(graph), LocalTriplestore(graph)
+
+        def label(number: int) -> str:
+            return ntriples([(URIRef(f"https://example.org/{number}"), RDFS.label, Literal(f"Label {number}"))])
+
+        # the other instance appends its triples after the first one has read the file, but before it appends its own
+        refresh = first.refresh
+        injected = []
+
+        def refresh_then_append():
+            refresh()
+            if not injected:
+                injected.append(second.add(label(1)))
+
+        with patch.object(triplestore, "fcntl", None), patch.object(first, "refresh", refresh_then_append):
+            first.add(label(0))
+        self.assertEqual(first.loaded, os.path.getsize(graph))
+        self.assertEqual(first.query(count)["triples"][0], "2")
+        self.assertEqual(second.query(count)["triples"][0], "2")
+
+        # two processes appending at the same time
+        with ProcessPoolExecutor(2) as processes:
+            added = [processes.submit(add_labels, graph, start, 200) for start in (100, 300)]
+            self.assertTrue(all(request.result() >= 200 for request in added))
+        self.assertEqual(first.query(count)["triples"][0], "402")
+        with open(graph, encoding="utf-8") as file:
+            self.assertEqual(len(file.readlines()), 402)
+
+    def test_30_SPARQLEndpointConnections(self):
+        connections = []
+
+        class StandIn(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                connections.append(self.connection)
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                content = b"id,label\r\nhttps://example.org/1,One\r\n"
+                self.send_response(200)
+                self.send_header("Content-Type", "text/csv")
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        endpoint = SPARQLEndpoint(f"http://127.0.0.1:{server.server_address[1]}/sparql")
+        try:
+            query = "SELECT ?id ?label WHERE { ?id rdfs:label ?label . }"
+            # the second query reuses the connection of the first one
+            for _ in range(2):
+                self.assertEqual(endpoint.query(query).values.tolist(), [["https://example.org/1", "One"]])
+            self.assertEqual(len(connections), 1)
+
+            # the endpoint closes the idle connection, and the query is sent again on a new one
+            connections[0].shutdown(socket.SHUT_RDWR)
+            time.sleep(0.05)
+            self.assertEqual(endpoint.query(query).values.tolist(), [["https://example.org/1", "One"]])
+            self.assertEqual(len(connections), 2)
+            self.assertEqual(len(endpoint._idle), 1)
+        finally:
+            endpoint.close()
+            server.shutdown()
+            server.server_close()
+
+    def test_31_SingleBackendTrees(self):
+        rel_qp = RelationalQueryProcessor()
+        rel_qp.setDbPathOrUrl(self.relational)
+        grp_qp = TriplestoreQueryProcessor()
+        grp_qp.setDbPathOrUrl(self.graph)
+        collection_id = "https://dl.ficlit.unibo.it/iiif/28429/collection"
+
+        for processor in (GenericQueryProcessor, AsyncGenericQueryProcessor):
+            def call(method, *args, **kwargs):
+                result = getattr(generic, method)(*args, **kwargs)
+                return asyncio.run(result) if asyncio.iscoroutine(result) else result
+
+            # without the relational database, the manifests and the collections have no title and creators
+            generic = processor()
+            generic.cleanQueryProcessors()
+            generic.addQueryProcessor(grp_qp)
+            manifests = call("getAllManifests")
+            self.assertEqual(len(manifests), 3)
+            self.assertTrue(all(m.getTitle() is None and m.getCreators() == [] for m in manifests))
+            self.assertTrue(any(m.getItems() for m in manifests))
+            collections = call("getAllCollections")
+            self.assertEqual(len(collections), 2)
+            self.assertTrue(all(c.getTitle() is None and c.getItems() for c in collections))
+            manifests = call("getManifestsInCollection", collection_id)
+            self.assertEqual(len(manifests), 1)
+            self.assertIsNone(manifests[0].getTitle())
+            self.assertEqual(call("getAllManifests", mode="dataframe")["title"].isna().sum(), 3)
+            self.assertEqual(call("getAllCollections", mode="dataframe").shape, (2, 4))
+
+            # without the triplestore, there are no manifests and collections
+            generic = processor()
+            generic.cleanQueryProcessors()
+            generic.addQueryProcessor(rel_qp)
+            self.assertEqual(call("getAllManifests"), [])
+            self.assertEqual(call("getAllCollections"), [])
+            self.assertEqual(call("getManifestsInCollection", collection_id), [])
+            self.assertEqual(call("getAllManifests", mode="dataframe").columns.to_list(), ["id", "label", "title", "creator"])
+            self.assertEqual(call("getAllCollections", mode="dataframe").shape, (0, 4))
+            self.assertEqual(call("getManifestsInCollection", collection_id, mode="dataframe").shape, (0, 5))
+
+    def test_32_SingleBackendEntities(self):
+        rel_qp = RelationalQueryProcessor()
+        rel_qp.setDbPathOrUrl(self.relational)
+        grp_qp = TriplestoreQueryProcessor()
+        grp_qp.setDbPathOrUrl(self.graph)
+        canvas = "https://dl.ficlit.unibo.it/iiif/2/28429/canvas/p1"
+        generic = GenericQueryProcessor()
+        generic.cleanQueryProcessors()
+        generic.addQueryProcessor(rel_qp)
+        generic.addQueryProcessor(grp_qp)
+        expected = [len(generic.getEntitiesWithCreator("Alighieri, Dante")),
+                    len(generic.getEntitiesWithTitle("Il Canzoniere")),
+                    len(generic.getEntitiesWithLabel("Il Canzoniere"))]
+
+        for processor in (GenericQueryProcessor, AsyncGenericQueryProcessor):
+            def call(method, *args, **kwargs):
+                result = getattr(generic, method)(*args, **kwargs)
+                return asyncio.run(result) if asyncio.iscoroutine(result) else result
+
+            # without the triplestore, the entities of the relational database have no type and label
+            generic = processor()
+            generic.cleanQueryProcessors()
+            generic.addQueryProcessor(rel_qp)
+            entities = [call("getEntitiesWithCreator", "Alighieri, Dante"), call("getEntitiesWithTitle", "Il Canzoniere")]
+            self.assertEqual([len(e) for e in entities], expected[:2])
+            for entity in entities[0] + entities[1]:
+                self.assertIs(type(entity), EntityWithMetadata)
+                self.assertIsNone(entity.getLabel())
+                self.assertIsNotNone(entity.getTitle())
+            self.assertEqual(call("getEntitiesWithLabel", "Il Canzoniere"), [])
+            self.assertEqual(call("getAncestors", canvas), [])
+            self.assertEqual(call("getAncestors", canvas, mode="dataframe").shape, (0, 5))
+
+            # without the relational database, the entities of the triplestore have no title and creators
+            generic = processor()
+            generic.cleanQueryProcessors()
+            generic.addQueryProcessor(grp_qp)
+            self.assertEqual(call("getEntitiesWithCreator", "Alighieri, Dante"), [])
+            self.assertEqual(call("getEntitiesWithTitle", "Il Canzoniere"), [])
+            entities = call("getEntitiesWithLabel", "Il Canzoniere")
+            self.assertEqual(len(entities), expected[2])
+            self.assertTrue(all(isinstance(e, Manifest) and e.getTitle() is None for e in entities))
+            ancestors = call("getAncestors", canvas)
+            self.assertEqual([type(a) for a in ancestors], [Manifest, Collection])
+            self.assertTrue(all(a.getTitle() is None and a.getCreators() == [] for a in ancestors))
+
+    def test_33_QueryCounts(self):
+        # the number of queries does not grow with the number of entities
+        files = generate(self.directory + sep + "synthetic", 10, 3000, canvases=1)
+        relational = self.directory + sep + "synthetic" + sep + "relational.db"
+        graph = self.directory + sep + "synthetic" + sep + "graph.nt"
+        ann_dp = AnnotationProcessor()
+        ann_dp.setDbPathOrUrl(relational)
+        ann_dp.uploadData(files["annotations"])
+        met_dp = MetadataProcessor()
+        met_dp.setDbPathOrUrl(relational)
+        met_dp.uploadData(files["metadata"])
+        col_dp = CollectionProcessor()
+        col_dp.setDbPathOrUrl(graph)
+        for collection in files["collections"]:
+            col_dp.uploadData(collection)
+
+        for relational, graph, creator, title in (
+                (self.relational, self.graph, "Alighieri, Dante", "Il Canzoniere"),
+                (relational, graph, files["ids"]["creator"], files["ids"]["title"])):
+            metrics = MetricsCollector()
+            rel_qp = RelationalQueryProcessor()
+            rel_qp.setDbPathOrUrl(relational)
+            grp_qp = TriplestoreQueryProcessor()
+            grp_qp.setDbPathOrUrl(graph)
+            generic = GenericQueryProcessor()
+            generic.cleanQueryProcessors()
+            generic.setInstrumentation(metrics)
+            generic.addQueryProcessor(rel_qp)
+            generic.addQueryProcessor(grp_qp)
+
+            self.assertTrue(generic.getAllManifests(prefetch=True))
+            self.assertTrue(generic.getAllCollections(prefetch=True))
+            self.assertTrue(generic.getEntitiesWithCreator(creator))
+            self.assertTrue(generic.getEntitiesWithTitle(title))
+            self.assertTrue(generic.getEntitiesWithLabel(title))
+            queries = {operation: sorted(record.backend for record in metrics.getRecords(operation))
+                       for operation in ("getAllManifests", "getAllCollections", "getEntitiesWithCreator",
+                                         "getEntitiesWithTitle", "getEntitiesWithLabel")}
+            self.assertEqual(queries, {
+                "getAllManifests": ["rdflib", "rdflib", "sqlite"],
+                "getAllCollections": ["rdflib", "rdflib", "rdflib", "sqlite"],
+                "getEntitiesWithCreator": ["rdflib", "sqlite"],
+                "getEntitiesWithTitle": ["rdflib", "sqlite"],
+                "getEntitiesWithLabel": ["rdflib", "sqlite"],
+            })
+        self.assertGreater(len(generic.getEntitiesWithCreator(files["ids"]["creator"])), 500)
+
+    def test_34_ModelSlots(self):
+        image = Image("https://example.org/image.jpg")
+        canvas = Canvas("https://example.org/canvas", "Canvas", "Title", "Doe, John; Doe, Jane")
+        entities = [IdentifiableEntity("https://example.org/entity"), image, canvas,
+                    EntityWithMetadata("https://example.org/entity", "Entity"),
+                    Manifest("https://example.org/manifest", "Manifest", list_of_canvas=[canvas]),
+                    Collection("https://example.org/collection", "Collection", items_loader=lambda id: []),
+                    Annotation("https://example.org/annotation", "painting", image, canvas)]
+        for entity in entities:
+            self.assertFalse(hasattr(entity, "__dict__"), type(entity).__name__)
+            with self.assertRaises(AttributeError):
+                entity.not_a_slot = None
+
+        # the body and the target are stored as identifiers, and read back as entities
+        annotation = entities[-1]
+        self.assertEqual((annotation.body_id, annotation.target_id), (image.id, canvas.id))
+        self.assertIsInstance(annotation.getBody(), Image)
+        self.assertEqual(annotation.getBody().getId(), image.id)
+        self.assertIsInstance(annotation.getTarget(), IdentifiableEntity)
+        self.assertEqual(annotation.getTarget().getId(), canvas.id)
+        annotation = Annotation("https://example.org/annotation", "painting", image.id, canvas.id)
+        self.assertEqual((annotation.body.id, annotation.target.id), (image.id, canvas.id))
+        annotation.body = Image("https://example.org/other.jpg")
+        annotation.target = "https://example.org/manifest"
+        self.assertEqual((annotation.body_id, annotation.target_id), ("https://example.org/other.jpg", "https://example.org/manifest"))
+        self.assertEqual(annotation.getTarget().getId(), "https://example.org/manifest")
@@ -0,0 +1,335 @@
+# the backends of the triplestore: the HTTP client of a SPARQL endpoint, and the embedded triplestore
+# used when the processors are given a file path instead of the URL of a SPARQL endpoint
+# LocalTriplestore, SPARQLEndpoint, decode_csv, decode_json, get_local_triplestore, is_endpoint_url, ntriples,
+# sparql_string
+
+import csv
+import json
+import os
+import threading
+from http.client import HTTPConnection, HTTPSConnection, RemoteDisconnected
+from io import BytesIO
+from urllib.error import HTTPError
+from urllib.parse import urlsplit
+
+import pandas as pd
+from rdflib import Graph, Literal
+from rdflib.plugins.parsers.ntriples import W3CNTriplesParser
+
+try:
+    import fcntl
+except ImportError:
+    # e.g. on Windows, where the appends of the processes are not serialized, but still read back from the file
+    fcntl = None
+
+
+all = [
+    "LocalTriplestore",
+    "SPARQLEndpoint",
+    "decode_csv",
+    "decode_json",
+    "get_local_triplestore",
+    "is_endpoint_url",
+    "ntriples",
+    "sparql_string",
+]
+
+# the bytes of the CSV results parsed at a time, while the rest of the response is still being received
+CSV_BLOCK_SIZE = 1 << 20
+XSD = "http://www.w3.org/2001/XMLSchema#"
+# the datatypes of the literals converted to numbers, booleans and timestamps by decode_json
+NUMERIC_DATATYPES = {XSD + datatype for datatype in (
+    "integer", "int", "long", "short", "byte", "nonNegativeInteger", "positiveInteger", "negativeInteger",
+    "nonPositiveInteger", "unsignedLong", "unsignedInt", "unsignedShort", "unsignedByte",
+    "decimal", "double", "float")}
+BOOLEAN_DATATYPES = {XSD + "boolean"}
+DATETIME_DATATYPES = {XSD + "dateTime", XSD + "date"}
+
+_triplestores = {}
+_triplestores_lock = threading.Lock()
+
+
+def is_endpoint_url(path_url: str) -> bool:
+    """it returns True if the input string is the URL of a SPARQL endpoint, False if it is a file path."""
+    return path_url.startswith(("http://", "https://"))
+
+
+def get_local_triplestore(path: str):
+    """it returns the LocalTriplestore stored in the input file, shared by all the processors of the process."""
+    path = os.path.abspath(path)
+    with _triplestores_lock:
+        if path not in _triplestores:
+            _triplestores[path] = LocalTriplestore(path)
+        return _triplestores[path]
+
+
+def sparql_string(value: str) -> str:
+    """it returns the input string as a SPARQL string literal, which is also its form in N-Triples."""
+    escaped = value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n").replace("\r", "\\r")
+    return f'"{escaped}"'
+
+
+def nt_term(term) -> str:
+    """it returns the input rdflib term as written in N-Triples. It is the n3 form of the term,
+    except for the literals, which n3 writes in triple quotes when they contain line breaks."""
+    if not isinstance(term, Literal):
+        return term.n3()
+    if term.language:
+        return sparql_string(str(term)) + "@" + term.language
+    if term.datatype:
+        return sparql_string(str(term)) + "^^" + term.datatype.n3()
+    return sparql_string(str(term))
+
+
+def ntriples(triples) -> str:
+    """it returns the input triples serialized as N-Triples, one triple per line."""
+    return "".join(f"{nt_term(s)} {nt_term(p)} {nt_term(o)} .\n" for s, p, o in triples)
+
+
+class CountingReader():
+    """A binary file-like object reading the input one, and counting the bytes read from it."""
+
+    def __init__(self, source):
+        self.source = source
+        self.size = 0
+        self.closed = False
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.source.read(size)
+        self.size += len(data)
+        return data
+
+    def readline(self, size: int = -1) -> bytes:
+        data = self.source.readline(size)
+        self.size += len(data)
+        return data
+
+    def close(self):
+        self.closed = True
+
+
+def decode_csv(source) -> pd.DataFrame:
+    """it returns the SPARQL results in CSV format read from the input binary file-like object as a data frame
+    whose values are all strings (NaN for the unbound variables), since the CSV format does not keep
+    the datatypes of the literals. With pyarrow, the results are parsed by blocks of CSV_BLOCK_SIZE bytes
+    while they are read (e.g. from the response of a SPARQL endpoint), by several threads, and otherwise
+    by the C parser of pandas."""
+    names = next(csv.reader([source.readline().decode("utf-8")]), [])
+    if not names:
+        return pd.DataFrame()
+    try:
+        import pyarrow
+        import pyarrow.csv
+    except ImportError:
+        # the values such as "NA" or "null" are strings, not missing values
+        return pd.read_csv(source, names=names, header=None, dtype=str, keep_default_na=False, na_values=[""])
+    try:
+        reader = pyarrow.csv.open_csv(
+            source,
+            read_options=pyarrow.csv.ReadOptions(column_names=names, block_size=CSV_BLOCK_SIZE),
+            parse_options=pyarrow.csv.ParseOptions(newlines_in_values=True),
+            convert_options=pyarrow.csv.ConvertOptions(
+                column_types={name: pyarrow.string() for name in names}, strings_can_be_null=True, null_values=[""]))
+    except pyarrow.ArrowInvalid as error:
+        if "Empty CSV" not in str(error):
+            raise
+        # there are no results, only the header
+        return pd.DataFrame({name: pd.Series(dtype=object) for name in names})
+    dataframe = reader.read_all().to_pandas()
+    # the missing values are NaN, as in the data frames read by pandas
+    return dataframe.where(dataframe.notna())
+
+
+def decode_json(content: bytes) -> pd.DataFrame:
+    """it returns the input SPARQL results in JSON format as a data frame, whose columns of literals with
+    a numeric, boolean or date datatype have the corresponding dtype, and the others have strings."""
+    results = json.loads(content)
+    names = results.get("head", {}).get("vars", [])
+    bindings = results.get("results", {}).get("bindings", [])
+    columns = {}
+    for name in names:
+        terms = [binding.get(name) for binding in bindings]
+        values = pd.Series([None if term is None else term["value"] for term in terms], dtype=object)
+        datatypes = {term.get("datatype") for term in terms if term is not None}
+        if datatypes and datatypes <= NUMERIC_DATATYPES:
+            values = pd.to_numeric(values)
+        elif datatypes and datatypes <= BOOLEAN_DATATYPES:
+            values = values.map({"true": True, "1": True, "false": False, "0": False})
+        elif datatypes and datatypes <= DATETIME_DATATYPES:
+            # the timestamps without time zone are taken as UTC
+            values = pd.to_datetime(values, format="ISO8601", utc=True)
+        else:
+            values = values.where(values.notna())
+        columns[name] = values
+    return pd.DataFrame(columns, columns=names)
+
+
+class SPARQLEndpoint():
+    """
+        The HTTP client of a SPARQL endpoint. It keeps a pool of persistent (keep-alive) connections,
+        reused by the following requests, and lets at most max_connections requests run at the same time.
+        Every request waits at most timeout seconds for the endpoint to answer.
+        """
+
+    def __init__(self, url: str, timeout: float = 60, max_connections: int = 8):
+        self.url = url
+        self.timeout = timeout
+        self.max_connections = max_connections
+        parts = urlsplit(url)
+        self._connection_class = HTTPSConnection if parts.scheme == "https" else HTTPConnection
+        self._host = parts.netloc
+        self._path = parts.path or "/"
+        if parts.query:
+            self._path += "?" + parts.query
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def request(self, body: str, headers: dict, decode=None):
+        """it POSTs the input body to the endpoint and returns the content of the response or, if decode
+        is given, what decode returns when it is given the response, which it reads while it is received.
+        It raises an HTTPError if the endpoint answers with an error status."""
+        with self._slots:
+            with self._lock:
+                connection = self._idle.pop() if self._idle else None
+            reused = connection is not None
+            if connection is None:
+                connection = self._connection_class(self._host, timeout=self.timeout)
+            try:
+                try:
+                    response = self._send(connection, body, headers)
+                except (RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                    if not reused:
+                        raise
+                    # the endpoint has closed the idle connection in the meantime
+                    connection.close()
+                    response = self._send(connection, body, headers)
+                if decode is not None and response.status < 400:
+                    content = decode(response)
+                else:
+                    content = response.read()
+            except BaseException:
+                connection.close()
+                raise
+            if response.will_close or not response.isclosed():
+                # the response has not been read to the end, so that the connection cannot be reused
+                connection.close()
+            else:
+                with self._lock:
+                    self._idle.append(connection)
+        if response.status >= 400:
+            raise HTTPError(self.url, response.status, response.reason, response.headers, BytesIO(content))
+        return content
+
+    def _send(self, connection, body: str, headers: dict):
+        connection.request("POST", self._path, body=body.encode("utf-8"), headers=headers)
+        return connection.getresponse()
+
+    def query(self, query: str, typed: bool = False) -> pd.DataFrame:
+        """it runs the input SPARQL SELECT query and returns its results as a data frame (see select)."""
+        return self.select(query, typed)[0]
+
+    def select(self, query: str, typed: bool = False) -> tuple:
+        """it runs the input SPARQL SELECT query and returns its results as a data frame, together with
+        the number of bytes of the response decoded. The results are asked in CSV format, parsed while
+        they are received (see decode_csv), unless typed is True, when the datatypes of the literals are needed:
+        then they are asked in JSON format (see decode_json)."""
+        headers = {"Content-Type": "application/sparql-query; charset=UTF-8"}
+        if typed:
+            content = self.request(query, {**headers, "Accept": "application/sparql-results+json"})
+            return decode_json(content), len(content)
+
+        def decode(response):
+            reader = CountingReader(response)
+            return decode_csv(reader), reader.size
+
+        return self.request(query, {**headers, "Accept": "text/csv"}, decode)
+
+    def update(self, update: str):
+        """it runs the input SPARQL update."""
+        self.request(update, {"Content-Type": "application/sparql-update; charset=UTF-8"})
+
+    def close(self):
+        """it closes all the idle connections to the endpoint."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
+        return True
+
+
+class TripleList(list):
+    """A list of the triples read by the N-Triples parser of rdflib, in the order they are read."""
+
+    def triple(self, s, p, o):
+        self.append((s, p, o))
+
+
+class LocalTriplestore():
+    """
+        A triplestore kept in memory by rdflib and persisted in a N-Triples file, which is only ever appended to.
+        The SPARQL queries are run in-process, and their results are returned as the data frames
+        built from the CSV results of a SPARQL endpoint.
+        The triples appended to the file by other processes are loaded before running a query.
+        """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.graph = Graph()
+        # the number of bytes of the file already loaded in the graph
+        self.loaded = 0
+        self._lock = threading.RLock()
+
+    def refresh(self):
+        """it loads in the graph the triples appended to the file since the last time it has been read."""
+        with self._lock:
+            if not os.path.exists(self.path) or os.path.getsize(self.path) <= self.loaded:
+                return
+            with open(self.path, "rb") as file:
+                file.seek(self.loaded)
+                data = file.read()
+            # a triple being written by another process is loaded at the next refresh
+            complete = data.rfind(b"\n") + 1
+            if complete:
+                self.graph.parse(data=data[:complete].decode("utf-8"), format="nt")
+                self.loaded += complete
+
+    def add(self, data: str):
+        """it stores the input triples, serialized as N-Triples (one triple per line).
+        The triples already in the triplestore are skipped, so that uploading a file again does not grow the file.
+        The file is locked while the triples are appended, and they are loaded back from the file
+        together with the ones appended by other processes, if any."""
+        if not data:
+            return
+        with self._lock, open(self.path, "ab") as file:
+            if fcntl is not None:
+                # released when the file is closed
+                fcntl.flock(file, fcntl.LOCK_EX)
+            self.refresh()
+            triples = TripleList()
+            W3CNTriplesParser(triples).parsestring(data)
+            # the triples are stored in the order they are given, as when the file is loaded
+            triples = [triple for triple in dict.fromkeys(triples) if triple not in self.graph]
+            if not triples:
+                return
+            file.write(ntriples(triples).encode("utf-8"))
+            file.flush()
+            self.refresh()
+
+    def query(self, query: str, typed: bool = False) -> pd.DataFrame:
+        """it runs the input SPARQL SELECT query and returns its results as a data frame (see select)."""
+        return self.select(query, typed)[0]
+
+    def select(self, query: str, typed: bool = False) -> tuple:
+        """it runs the input SPARQL SELECT query and returns its results as a data frame, decoded as the ones
+        of a SPARQL endpoint (see SPARQLEndpoint.select), together with the number of bytes of their serialization."""
+        with self._lock:
+            self.refresh()
+            results = self.graph.query(query)
+            content = results.serialize(format="json" if typed else "csv")
+        if typed:
+            return decode_json(content), len(content)
+        return decode_csv(BytesIO(content)), len(content)
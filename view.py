@@ -0,0 +1,80 @@
+# the materialized view joining the data of the relational database and of the triplestore
+# EntityViewProcessor
+
+import sqlite3
+
+from rdf import TriplestoreQueryProcessor
+from relational import ENTITY_VIEW, ENTITY_VIEW_COLUMNS, SQLITE_MAX_PARAMETERS, RelationalProcessor
+
+
+all = [
+    "EntityViewProcessor",
+]
+
+
+class EntityViewProcessor(RelationalProcessor):
+    """
+        The processor filling the entity view, a table of the relational database with a row for every collection,
+        manifest and canvas of the triplestore: its type and label, its title and creators in the metadata,
+        the identifier of the entity containing it (parent) and the number of entities it contains (children).
+        The view is refreshed by the MetadataProcessor and CollectionProcessor objects it is given to
+        (see their method setEntityView), for the entities they upload, so that the GenericQueryProcessor
+        can answer the queries on titles, labels and creators with a single query (see setUseEntityView).
+        """
+    triplestorePathOrUrl = ""
+    triplestoreQueryProcessor = None
+
+    def setTriplestorePathOrUrl(self, path_url: str) -> bool:
+        """it sets the path or URL of the triplestore whose entities are included in the view."""
+        if self.triplestoreQueryProcessor is not None:
+            self.triplestoreQueryProcessor.close()
+        self.triplestorePathOrUrl = path_url
+        self.triplestoreQueryProcessor = TriplestoreQueryProcessor()
+        self.triplestoreQueryProcessor.setDbPathOrUrl(path_url)
+        return True
+
+    def refreshEntities(self, ids=None) -> bool:
+        """it rebuilds the rows of the view of the entities with the input identifiers, or the whole view
+        if ids is None. The entities that are not in the triplestore are removed from the view."""
+        if self.triplestoreQueryProcessor is None:
+            return False
+        entities = self.triplestoreQueryProcessor.getEntitiesWithContainment(None if ids is None else list(ids))
+        entities = entities.astype(object).where(entities.notna(), None)
+        connection = self.getConnection()
+        cursor = connection.cursor()
+        connection.commit()
+        for statement in ENTITY_VIEW:
+            cursor.execute(statement)
+        metadata = self.getMetadata(cursor, entities["id"].tolist())
+        cursor.execute("BEGIN;")
+        try:
+            if ids is None:
+                cursor.execute("DELETE FROM entity_view")
+            else:
+                cursor.executemany("DELETE FROM entity_view WHERE id = ?", [(id,) for id in ids])
+            cursor.executemany(
+                f"INSERT OR REPLACE INTO entity_view ({ENTITY_VIEW_COLUMNS}) VALUES(?, ?, ?, ?, ?, ?, ?)", [
+                    (id, type, label, *metadata.get(id, (None, None)), parent, int(children))
+                    for id, type, label, parent, children in zip(
+                        entities["id"], entities["type"], entities["label"], entities["parent"], entities["children"])
+                ])
+            connection.commit()
+        except sqlite3.Error:
+            connection.rollback()
+            raise
+        # the results read from the view before the refresh are no longer valid
+        self.bumpGeneration()
+        return True
+
+    @staticmethod
+    def getMetadata(cursor: sqlite3.Cursor, ids: list) -> dict:
+        """it returns a dictionary mapping the input identifiers to their title and creators in the metadata."""
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'metadata'")
+        if cursor.fetchone() is None:
+            return {}
+        metadata = {}
+        for start in range(0, len(ids), SQLITE_MAX_PARAMETERS):
+            chunk = ids[start:start + SQLITE_MAX_PARAMETERS]
+            select = f"SELECT id, title, creator FROM metadata WHERE id IN ({', '.join('?' * len(chunk))})"
+            metadata.update((id, (title, creator)) for id, title, creator in cursor.execute(select, chunk))
+        return metadata